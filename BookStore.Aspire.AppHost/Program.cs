@@ -17,14 +17,17 @@ var redis = builder.AddRedis("redis")
 
 // Prometheus
 var prometheusConfigPath = Path.GetFullPath(Path.Combine(builder.AppHostDirectory, "../monitoring/prometheus"));
-var prometheus = builder.AddContainer("prometheus", "prom/prometheus", "v2.48.0")
+var prometheus = builder.AddContainer("prometheus", "prom/prometheus", "v2.54.1")
     .WithBindMount(prometheusConfigPath, "/etc/prometheus", isReadOnly: true)
     .WithHttpEndpoint(port: 9090, targetPort: 9090, name: "http")
     .WithArgs("--config.file=/etc/prometheus/prometheus.yml",
               "--storage.tsdb.path=/prometheus",
+              // Keep the 30d SLO period (slo-targets.yml) the error budget rules average over
+              "--storage.tsdb.retention.time=35d",
               "--web.console.libraries=/usr/share/prometheus/console_libraries",
               "--web.console.templates=/usr/share/prometheus/consoles",
-              "--web.enable-lifecycle");
+              "--web.enable-lifecycle",
+              "--enable-feature=otlp-write-receiver,native-histograms");
 
 // Grafana
 var grafanaDatasourcesPath = Path.GetFullPath(Path.Combine(builder.AppHostDirectory, "../monitoring/grafana/datasources"));
@@ -0,0 +1,85 @@
+using Microsoft.Extensions.Hosting;
+using OpenTelemetry;
+using OpenTelemetry.Exporter;
+using OpenTelemetry.Metrics;
+using OpenTelemetry.Resources;
+using System.Diagnostics.Metrics;
+
+namespace BookStore.Common.Instrumentation;
+
+/// <summary>
+/// Pushes every histogram with base-2 exponential buckets to Prometheus' OTLP receiver, which stores
+/// each label set as one native-histogram series instead of one series per bucket.
+/// It runs a meter provider of its own that drops everything but histograms: the scraped counters
+/// and gauges would otherwise reach Prometheus twice, under different job and instance labels.
+/// </summary>
+internal sealed class NativeHistogramExporter : IHostedService, IDisposable
+{
+    private readonly TelemetrySettings _settings;
+    private MeterProvider? _meterProvider;
+
+    public NativeHistogramExporter(TelemetrySettings settings)
+    {
+        _settings = settings;
+    }
+
+    public Task StartAsync(CancellationToken cancellationToken)
+    {
+        var native = _settings.Metrics.NativeHistograms;
+        var job = string.IsNullOrEmpty(native.Job) ? _settings.ServiceName : native.Job;
+
+        var builder = Sdk.CreateMeterProviderBuilder()
+            .SetResourceBuilder(ResourceBuilder.CreateEmpty()
+                .AddService(job, serviceVersion: _settings.ServiceVersion,
+                    autoGenerateServiceInstanceId: string.IsNullOrEmpty(native.Instance),
+                    serviceInstanceId: string.IsNullOrEmpty(native.Instance) ? null : native.Instance)
+                // The scrape config's target labels, promoted to labels by prometheus.yml
+                .AddAttributes(new[]
+                {
+                    new KeyValuePair<string, object>("service", job),
+                    new KeyValuePair<string, object>("environment", Environment.GetEnvironmentVariable("ENVIRONMENT") ?? "development")
+                }));
+
+        foreach (var meter in _settings.Metrics.Meters)
+        {
+            builder.AddMeter(meter);
+        }
+
+        builder.AddMeter("BookStore.*")
+            .AddAspNetCoreInstrumentation()
+            .AddHttpClientInstrumentation()
+            .AddView(instrument => IsHistogram(instrument)
+                ? new Base2ExponentialBucketHistogramConfiguration { MaxScale = native.MaxScale, MaxSize = native.MaxSize }
+                : MetricStreamConfiguration.Drop)
+            .AddOtlpExporter((exporterOptions, readerOptions) =>
+            {
+                exporterOptions.Endpoint = new Uri(native.Endpoint);
+                exporterOptions.Protocol = OtlpExportProtocol.HttpProtobuf;
+                readerOptions.PeriodicExportingMetricReaderOptions.ExportIntervalMilliseconds = native.ExportIntervalMilliseconds;
+                // Prometheus only ingests cumulative histograms
+                readerOptions.TemporalityPreference = MetricReaderTemporalityPreference.Cumulative;
+            });
+
+        _meterProvider = builder.Build();
+        return Task.CompletedTask;
+    }
+
+    public Task StopAsync(CancellationToken cancellationToken)
+    {
+        // Disposing exports what was recorded since the last interval
+        _meterProvider?.Dispose();
+        _meterProvider = null;
+        return Task.CompletedTask;
+    }
+
+    public void Dispose()
+    {
+        _meterProvider?.Dispose();
+    }
+
+    internal static bool IsHistogram(Instrument instrument)
+    {
+        var type = instrument.GetType();
+        return type.IsGenericType && type.GetGenericTypeDefinition() == typeof(Histogram<>);
+    }
+}
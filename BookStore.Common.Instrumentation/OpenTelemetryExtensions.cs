@@ -64,6 +64,12 @@ public static class OpenTelemetryExtensions
                 .WithMetrics(metrics => ConfigureMetrics(metrics, telemetrySettings, resourceBuilder));
         }
 
+        // Native histograms are pushed over OTLP by a meter provider of their own
+        if (telemetrySettings.Metrics.Enabled && telemetrySettings.Metrics.NativeHistograms.Enabled)
+        {
+            services.AddHostedService(_ => new NativeHistogramExporter(telemetrySettings));
+        }
+
         // Add logging if enabled
         if (telemetrySettings.Logging.Enabled)
         {
@@ -156,6 +162,14 @@ public static class OpenTelemetryExtensions
             metrics.AddProcessInstrumentation();
         }
 
+        // Native histograms reach Prometheus through NativeHistogramExporter; with KeepClassicHistograms
+        // off the classic histograms (_bucket, _count and _sum) are no longer scraped at all
+        if (settings.Metrics.NativeHistograms.Enabled && !settings.Metrics.NativeHistograms.KeepClassicHistograms)
+        {
+            metrics.AddView(instrument =>
+                NativeHistogramExporter.IsHistogram(instrument) ? MetricStreamConfiguration.Drop : null);
+        }
+
         // Add exporters
         ConfigureMetricsExporters(metrics, settings);
 
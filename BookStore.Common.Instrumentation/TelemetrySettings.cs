@@ -43,6 +43,24 @@ public class MetricsSettings
     public List<string> Meters { get; set; } = new();
     public bool EnableRuntimeInstrumentation { get; set; } = true;
     public bool EnableProcessInstrumentation { get; set; } = true;
+    public NativeHistogramSettings NativeHistograms { get; set; } = new();
+}
+
+public class NativeHistogramSettings
+{
+    public bool Enabled { get; set; } = false;
+    // Prometheus OTLP receiver (--enable-feature=otlp-write-receiver,native-histograms)
+    public string Endpoint { get; set; } = "http://localhost:9090/api/v1/otlp/v1/metrics";
+    // Scrape job and target in prometheus.yml; the receiver turns them into the job and instance labels
+    public string Job { get; set; } = string.Empty;
+    public string Instance { get; set; } = string.Empty;
+    // Prometheus stores schemas up to 8 (buckets ~2.7% wide); coarser scales keep fewer buckets
+    public int MaxScale { get; set; } = 8;
+    public int MaxSize { get; set; } = 160;
+    public int ExportIntervalMilliseconds { get; set; } = 15000;
+    // Keep scraping the classic _bucket/_sum/_count series: the SLO and dashboard recording rules read them.
+    // Turning it off drops every classic histogram series, so only do that once nothing reads them
+    public bool KeepClassicHistograms { get; set; } = true;
 }
 
 public class LoggingSettings
@@ -0,0 +1,102 @@
+using System.Diagnostics.Metrics;
+using System.Globalization;
+using System.Text.RegularExpressions;
+using BookStore.Common.Instrumentation;
+using FluentAssertions;
+using Microsoft.AspNetCore.Hosting;
+using Microsoft.Extensions.DependencyInjection;
+using Microsoft.Extensions.Hosting;
+using Xunit;
+
+namespace BookStore.Service.Tests.Integration.Telemetry;
+
+// Scrapes /metrics, so every factory here turns the Prometheus exporter on
+public class ClassicHistogramApiFactory : BookStoreApiFactory
+{
+    protected override void ConfigureWebHost(IWebHostBuilder builder)
+    {
+        base.ConfigureWebHost(builder);
+        builder.UseSetting("Telemetry:Exporters:Prometheus:Enabled", "true");
+    }
+}
+
+public class NativeHistogramApiFactory : ClassicHistogramApiFactory
+{
+    protected override void ConfigureWebHost(IWebHostBuilder builder)
+    {
+        base.ConfigureWebHost(builder);
+        builder.UseSetting("Telemetry:Metrics:NativeHistograms:Enabled", "true");
+        // Nothing listens here: a failing push must not affect the service or the scraped series
+        builder.UseSetting("Telemetry:Metrics:NativeHistograms:Endpoint", "http://localhost:1/api/v1/otlp/v1/metrics");
+    }
+}
+
+internal static class HistogramScrape
+{
+    public const int Recordings = 5;
+
+    // Records a histogram on a BookStore.* meter and returns the _count lines /metrics reports for it
+    public static async Task<List<double>> RecordAndScrapeAsync(HttpClient client, string name)
+    {
+        using var meter = new Meter($"BookStore.Tests.{name}");
+        var histogram = meter.CreateHistogram<double>($"bookstore.tests.{name}.duration", unit: "s");
+        for (int i = 0; i < Recordings; i++)
+        {
+            histogram.Record(0.05 * (i + 1));
+        }
+
+        var metrics = await client.GetStringAsync("/metrics");
+        var count = new Regex($@"^bookstore_tests_{name}_duration_seconds_count(\{{[^}}]*\}})? (\S+)", RegexOptions.Multiline);
+        return count.Matches(metrics).Select(m => double.Parse(m.Groups[2].Value, CultureInfo.InvariantCulture)).ToList();
+    }
+}
+
+[Collection("Sequential")]
+public class ClassicHistogramTests : IClassFixture<ClassicHistogramApiFactory>
+{
+    private readonly ClassicHistogramApiFactory _factory;
+
+    public ClassicHistogramTests(ClassicHistogramApiFactory factory)
+    {
+        _factory = factory;
+    }
+
+    [Fact]
+    public async Task NativeHistogramsOff_RegistersNoExporterAndCountsEachRecordingOnce()
+    {
+        // Act
+        var counts = await HistogramScrape.RecordAndScrapeAsync(_factory.CreateClient(), "classic");
+
+        // Assert
+        _factory.Services.GetServices<IHostedService>().OfType<NativeHistogramExporter>().Should().BeEmpty();
+        counts.Should().ContainSingle().Which.Should().Be(HistogramScrape.Recordings);
+    }
+}
+
+[Collection("Sequential")]
+public class NativeHistogramTests : IClassFixture<NativeHistogramApiFactory>
+{
+    private readonly NativeHistogramApiFactory _factory;
+
+    public NativeHistogramTests(NativeHistogramApiFactory factory)
+    {
+        _factory = factory;
+    }
+
+    [Fact]
+    public void NativeHistogramsOn_RegistersExporter()
+    {
+        // Assert
+        _factory.Services.GetServices<IHostedService>().OfType<NativeHistogramExporter>().Should().ContainSingle();
+    }
+
+    [Fact]
+    public async Task NativeHistogramsOn_KeepsClassicHistogramsScrapedOnce()
+    {
+        // Act
+        var counts = await HistogramScrape.RecordAndScrapeAsync(_factory.CreateClient(), "native");
+
+        // Assert - KeepClassicHistograms defaults to true; the OTLP pipeline must not add to the scraped series
+        counts.Should().ContainSingle().Which.Should().Be(HistogramScrape.Recordings);
+    }
+}
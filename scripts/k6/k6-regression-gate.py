@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Compare k6 runs with earlier runs of the same scenario and fail on latency regressions.
+
+For each result file: aggregate it per endpoint, test every endpoint's
+latency against the last --baseline-runs runs in the history file
+(Mann-Whitney U plus a bootstrap interval on the p95 ratio, see
+k6_regression.py), report regressions with their effect size, optionally
+mark them on a Grafana dashboard, then append the run to the history.
+Exits 1 when any endpoint regressed.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+from k6_regression import (ALPHA, BASELINE_RUNS, BOOTSTRAP_ITERATIONS, HISTORY_FILE, KEEP_RUNS,
+                           MIN_BASELINE_RUNS, MIN_CHANGE, MIN_SAMPLES, annotate, baseline_runs, compare,
+                           load_history, run_record, save_history)
+from k6_results import aggregate_files
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('files', nargs='+', type=Path, help='k6 JSON result files, one run (scenario) each')
+parser.add_argument('--history', type=Path, default=HISTORY_FILE,
+                    help="History file (default: BookStore.Performance.Tests/history/k6-history.jsonl)")
+parser.add_argument('--scenario', help='Scenario name (default: the file name without its -YYYYMMDD-HHMMSS suffix)')
+parser.add_argument('--run-id', default=os.environ.get('GITHUB_RUN_ID') or time.strftime('%Y%m%d-%H%M%S'),
+                    help='Identifies this run in the history (default: $GITHUB_RUN_ID or the current time)')
+parser.add_argument('--commit', default=os.environ.get('GITHUB_SHA'), help='Commit under test (default: $GITHUB_SHA)')
+parser.add_argument('--baseline-runs', type=int, default=BASELINE_RUNS,
+                    help=f"Earlier runs to compare with (default: {BASELINE_RUNS})")
+parser.add_argument('--min-baseline-runs', type=int, default=MIN_BASELINE_RUNS,
+                    help=f"Skip endpoints seen in fewer earlier runs (default: {MIN_BASELINE_RUNS})")
+parser.add_argument('--min-samples', type=int, default=MIN_SAMPLES,
+                    help=f"Skip endpoints with fewer requests (default: {MIN_SAMPLES})")
+parser.add_argument('--alpha', type=float, default=ALPHA, help=f"Significance level (default: {ALPHA})")
+parser.add_argument('--min-change', type=float, default=MIN_CHANGE,
+                    help=f"Smallest p95 increase that counts as a regression (default: {MIN_CHANGE:.0%})")
+parser.add_argument('--iterations', type=int, default=BOOTSTRAP_ITERATIONS,
+                    help=f"Bootstrap iterations (default: {BOOTSTRAP_ITERATIONS})")
+parser.add_argument('--keep-runs', type=int, default=KEEP_RUNS,
+                    help=f"Runs kept per scenario in the history (default: {KEEP_RUNS})")
+parser.add_argument('--no-record', action='store_true', help='Compare only; do not add the runs to the history')
+parser.add_argument('--report-only', action='store_true', help='Exit 0 even when endpoints regressed')
+parser.add_argument('--json', dest='json_out', type=Path, help='Write the comparison as JSON to this path')
+parser.add_argument('--markdown', action='store_true', help='Print a Markdown report (for $GITHUB_STEP_SUMMARY)')
+parser.add_argument('--annotate', action='store_true', help='Add a Grafana annotation for every regression')
+parser.add_argument('--grafana-url', default=os.environ.get('GRAFANA_URL', 'http://localhost:3333'),
+                    help='Grafana base URL (default: $GRAFANA_URL or http://localhost:3333)')
+parser.add_argument('--grafana-user', default=os.environ.get('GRAFANA_USER', 'admin'))
+parser.add_argument('--grafana-password', default=os.environ.get('GRAFANA_PASSWORD', 'admin123'))
+parser.add_argument('--dashboard-uid', default='bookstore-performance',
+                    help='Dashboard the annotations go on (default: bookstore-performance)')
+args = parser.parse_args()
+
+missing = [str(p) for p in args.files if not p.is_file()]
+if missing:
+    print(f"❌ No such file: {', '.join(missing)}")
+    sys.exit(1)
+
+
+def scenario_of(path):
+    name = path.name.split('.')[0]
+    return re.sub(r'-\d{8}-\d{6}$', '', name)
+
+
+def fmt(value, spec, missing='-'):
+    return missing if value is None else format(value, spec)
+
+
+history = load_history(args.history)
+report = []
+regressions = 0
+for path in args.files:
+    scenario = args.scenario or scenario_of(path)
+    run = run_record(aggregate_files([path], group_tags=('endpoint',)), scenario, args.run_id, args.commit)
+    baseline = baseline_runs(history, scenario, args.baseline_runs, exclude_run=run['run_id'])
+    results = compare(run, baseline, alpha=args.alpha, min_change=args.min_change, min_samples=args.min_samples,
+                      min_runs=args.min_baseline_runs, iterations=args.iterations)
+    regressed = [r for r in results if r['verdict'] == 'regression']
+    regressions += len(regressed)
+    report.append({"file": str(path), "scenario": scenario, "run_id": run['run_id'],
+                   "baseline_runs": [r['run_id'] for r in baseline], "results": results})
+
+    if args.markdown:
+        print(f"### k6 regression check: {scenario} ({len(baseline)} baseline runs)\n")
+        print("| Endpoint | requests | p95 ms | baseline p95 | p95 ratio (95% CI) | Cliff's δ | p-value | rps Δ | verdict |")
+        print("|---|---:|---:|---:|---|---:|---:|---:|---|")
+        for r in results:
+            ci = f"{fmt(r.get('p95_ratio'), '.2f')} ({fmt(r.get('p95_ratio_low'), '.2f')}-{fmt(r.get('p95_ratio_high'), '.2f')})"
+            verdict = ("🔴 " if r['verdict'] == 'regression' else "") + r['verdict']
+            if r.get('throughput') == 'drop':
+                verdict += ", throughput drop"
+            print(f"| `{r['endpoint']}` | {r['count']:,} | {fmt(r['p95'], ',.1f')} | {fmt(r['baseline_p95'], ',.1f')} "
+                  f"| {ci} | {fmt(r.get('cliffs_delta'), '+.2f')} | {fmt(r.get('p_value'), '.1e')} "
+                  f"| {fmt(r.get('rps_change'), '+.0%')} | {verdict} |")
+        print()
+    else:
+        print("=" * 70)
+        print(f"📁 {path.name}: scenario '{scenario}', {len(run['endpoints'])} endpoints, "
+              f"{len(baseline)} baseline runs")
+        print("=" * 70)
+        for r in results:
+            if r['verdict'] == 'insufficient data':
+                print(f"   ·  {r['endpoint']}: insufficient data ({r['baseline_runs']} baseline runs, "
+                      f"{r['count']:,} requests)")
+                continue
+            icon = {"regression": "❌", "improvement": "✓ ", "ok": "✓ "}[r['verdict']]
+            print(f"   {icon} {r['endpoint']}: p95 {fmt(r['baseline_p95'], ',.1f')} → {fmt(r['p95'], ',.1f')} ms "
+                  f"(x{fmt(r['p95_ratio'], '.2f')}, CI {fmt(r['p95_ratio_low'], '.2f')}-"
+                  f"{fmt(r['p95_ratio_high'], '.2f')}, δ {fmt(r['cliffs_delta'], '+.2f')}, "
+                  f"p={fmt(r['p_value'], '.1e')}) {r['verdict'] if r['verdict'] != 'ok' else ''}".rstrip())
+            if r.get('throughput') == 'drop':
+                print(f"   ⚠️  {r['endpoint']}: throughput {r['rps_change']:+.0%} vs. the baseline median")
+
+    if args.annotate and regressed and run['start']:
+        errors = annotate(args.grafana_url, args.grafana_user, args.grafana_password, args.dashboard_uid, run, regressed)
+        for error in errors:
+            print(f"⚠️  Annotation failed: {error}", file=sys.stderr)
+        if len(errors) < len(regressed):
+            print(f"💡 {len(regressed) - len(errors)} regression(s) annotated on dashboard '{args.dashboard_uid}'",
+                  file=sys.stderr if args.markdown else sys.stdout)
+
+    if not args.no_record and run['endpoints']:
+        history = [r for r in history if not (r['scenario'] == scenario and r['run_id'] == run['run_id'])] + [run]
+
+if not args.no_record:
+    kept = save_history(history, args.history, args.keep_runs)
+    if not args.markdown:
+        print(f"\n✓ History: {kept} runs in {args.history}")
+
+if args.json_out:
+    args.json_out.parent.mkdir(parents=True, exist_ok=True)
+    args.json_out.write_text(json.dumps(report, indent=2) + "\n")
+
+if regressions:
+    print(f"\n❌ {regressions} endpoint latency regression(s)", file=sys.stderr if args.markdown else sys.stdout)
+    sys.exit(0 if args.report_only else 1)
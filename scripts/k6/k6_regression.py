@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Nightly k6 regression detection against a history of earlier runs.
+
+Every run is reduced to one history record per scenario: per endpoint the
+request count, error rate, throughput, p50/p95/p99 and the serialized
+latency sketch (k6_results.QuantileSketch buckets, a 1%-resolution
+histogram). Records are appended to a JSON-lines history file.
+
+A new run is compared per endpoint with the last few runs of the same
+scenario (the baseline window) by two tests, both of which must agree:
+
+- Mann-Whitney U on the request latencies (one-sided, new slower than the
+  pooled baseline), computed exactly from the histograms with values in one
+  bucket as ties. Its effect size is Cliff's delta, P(new > base) -
+  P(new < base).
+- A bootstrap confidence interval for p95(new) / p95(baseline) that
+  resamples whole baseline runs as well as requests, so night-to-night
+  variation widens the interval instead of showing up as a regression; with
+  hundreds of thousands of requests a rank test alone flags every harmless
+  1% wobble.
+
+An endpoint regresses when the test is significant, the interval lies
+above 1 and the estimated p95 increase is at least min_change.
+"""
+
+import base64
+import json
+import math
+import random
+import urllib.request
+from pathlib import Path
+
+from k6_results import QuantileSketch, parse_time
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent.parent
+HISTORY_FILE = REPO_ROOT / "BookStore.Performance.Tests/history/k6-history.jsonl"
+
+DURATION_METRIC = 'http_req_duration'
+FAILED_METRIC = 'http_req_failed'
+BASELINE_RUNS = 7               # a week of nightly runs
+MIN_BASELINE_RUNS = 3           # fewer runs cannot tell a regression from a noisy night
+MIN_SAMPLES = 100               # requests per endpoint in the new run and in the baseline
+ALPHA = 0.01
+MIN_CHANGE = 0.10               # smallest p95 increase worth failing a build for
+MAX_THROUGHPUT_DROP = 0.20
+BOOTSTRAP_ITERATIONS = 1000
+CONFIDENCE = 0.95
+KEEP_RUNS = 90                  # per scenario in the history file
+
+
+def run_record(aggregate, scenario, run_id, commit=None):
+    """History record for one aggregated k6 result (k6_results.ResultAggregate grouped by 'endpoint')"""
+    duration = aggregate.duration_seconds() or None
+    latency = aggregate.metrics.get(DURATION_METRIC)
+    failed = aggregate.metrics.get(FAILED_METRIC)
+    endpoints = {}
+    for endpoint, summary in sorted((latency.tags.get('endpoint', {}) if latency else {}).items()):
+        if summary.sketch is None or not summary.count:
+            continue
+        errors = failed.tags.get('endpoint', {}).get(endpoint) if failed else None
+        endpoints[endpoint] = {
+            "count": summary.count,
+            "error_rate": errors.nonzero / errors.count if errors and errors.count else None,
+            "rps": summary.count / duration if duration else None,
+            **{f"p{q}": summary.quantile(q / 100) for q in (50, 95, 99)},
+            "sketch": summary.sketch.to_dict(),
+        }
+    return {"run_id": str(run_id), "scenario": scenario, "commit": commit, "start": aggregate.first_time,
+            "end": aggregate.last_time, "duration_seconds": duration, "endpoints": endpoints}
+
+
+def load_history(path=HISTORY_FILE):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_history(records, path=HISTORY_FILE, keep_runs=KEEP_RUNS):
+    """Rewrite the history keeping the newest keep_runs records per scenario"""
+    kept, seen = [], {}
+    for record in reversed(records):
+        seen[record['scenario']] = seen.get(record['scenario'], 0) + 1
+        if seen[record['scenario']] <= keep_runs:
+            kept.append(record)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        for record in reversed(kept):
+            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+    return len(kept)
+
+
+def baseline_runs(history, scenario, window=BASELINE_RUNS, exclude_run=None):
+    """The newest `window` earlier records of a scenario"""
+    runs = [r for r in history if r['scenario'] == scenario and r['run_id'] != exclude_run]
+    return runs[-window:]
+
+
+def _normal_sf(z):
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def mann_whitney(baseline, new):
+    """One-sided Mann-Whitney U for `new` being slower than `baseline`, from two bucket lists.
+
+    Returns (p-value, Cliff's delta). Values sharing a bucket are ties; the
+    normal approximation with tie correction is exact enough at k6 sample sizes.
+    """
+    counts = {}
+    for values, side in ((baseline, 0), (new, 1)):
+        for value, n in values:
+            counts.setdefault(value, [0, 0])[side] += n
+    n_base = sum(c[0] for c in counts.values())
+    n_new = sum(c[1] for c in counts.values())
+    if not n_base or not n_new:
+        return None, None
+    u = 0.0                     # pairs where new > base, ties counted half
+    below = 0
+    tie_term = 0
+    for value in sorted(counts):
+        base, fresh = counts[value]
+        u += fresh * (below + base / 2)
+        below += base
+        tie_term += (base + fresh) ** 3 - (base + fresh)
+    total = n_base + n_new
+    mean = n_base * n_new / 2
+    variance = n_base * n_new / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    z = (u - mean - 0.5) / math.sqrt(variance) if variance > 0 else 0.0
+    return _normal_sf(z), 2 * u / (n_base * n_new) - 1
+
+
+def _poisson(rng, mean):
+    if mean > 30:
+        return max(0, round(rng.gauss(mean, math.sqrt(mean))))
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def _weighted_quantile(weighted, q):
+    """q-quantile of {value: weight}"""
+    total = sum(weighted.values())
+    if not total:
+        return None
+    rank, seen = q * (total - 1), 0
+    for value in sorted(weighted):
+        seen += weighted[value]
+        if seen > rank:
+            return value
+    return max(weighted)
+
+
+def bootstrap_ratio(baseline_runs_buckets, new_buckets, q=0.95, iterations=BOOTSTRAP_ITERATIONS,
+                    confidence=CONFIDENCE, seed=0):
+    """(estimate, low, high) of quantile(new) / quantile(baseline).
+
+    The estimate uses the pooled baseline. Each bootstrap iteration compares
+    the new run with one baseline run drawn at random, both with Poisson
+    weights on their requests, so the interval spans the spread between
+    single nights and not just the sampling error of the pooled week.
+    """
+    rng = random.Random(seed)
+
+    def pooled(runs):
+        weighted = {}
+        for buckets in runs:
+            for value, n in buckets:
+                weighted[value] = weighted.get(value, 0) + n
+        return weighted
+
+    def resampled(buckets, weighted):
+        for value, n in buckets:
+            weighted[value] = weighted.get(value, 0) + _poisson(rng, n)
+        return weighted
+
+    base_q = _weighted_quantile(pooled(baseline_runs_buckets), q)
+    new_q = _weighted_quantile(pooled([new_buckets]), q)
+    if not base_q or new_q is None:
+        return None, None, None
+    ratios = []
+    for _ in range(iterations):
+        base = resampled(rng.choice(baseline_runs_buckets), {})
+        b, n = _weighted_quantile(base, q), _weighted_quantile(resampled(new_buckets, {}), q)
+        if b and n is not None:
+            ratios.append(n / b)
+    if not ratios:
+        return new_q / base_q, None, None
+    ratios.sort()
+    tail = (1 - confidence) / 2
+    return new_q / base_q, ratios[int(tail * (len(ratios) - 1))], ratios[int((1 - tail) * (len(ratios) - 1))]
+
+
+def compare(run, baseline, alpha=ALPHA, min_change=MIN_CHANGE, min_samples=MIN_SAMPLES,
+            min_runs=MIN_BASELINE_RUNS, max_throughput_drop=MAX_THROUGHPUT_DROP, iterations=BOOTSTRAP_ITERATIONS):
+    """Per-endpoint comparison of a run record with baseline records. Returns a list of result dicts.
+
+    verdict is 'regression', 'improvement', 'ok' or 'insufficient data'; a
+    throughput drop beyond max_throughput_drop (and below every baseline run)
+    is reported in 'throughput' but only fails when latency regressed too,
+    since a closed-model k6 run slows down for reasons outside the API.
+    """
+    results = []
+    for endpoint, current in sorted(run['endpoints'].items()):
+        history = [r['endpoints'][endpoint] for r in baseline if endpoint in r['endpoints']]
+        result = {"endpoint": endpoint, "count": current['count'], "p95": current['p95'],
+                  "baseline_runs": len(history),
+                  "baseline_p95": _median([h['p95'] for h in history]) if history else None}
+        if len(history) < min_runs or current['count'] < min_samples \
+                or sum(h['count'] for h in history) < min_samples:
+            results.append(dict(result, verdict='insufficient data'))
+            continue
+
+        new_buckets = QuantileSketch.from_dict(current['sketch']).buckets()
+        base_buckets = [QuantileSketch.from_dict(h['sketch']).buckets() for h in history]
+        p_value, delta = mann_whitney([b for run_buckets in base_buckets for b in run_buckets], new_buckets)
+        ratio, low, high = bootstrap_ratio(base_buckets, new_buckets, iterations=iterations)
+        result.update(p_value=p_value, cliffs_delta=delta, p95_ratio=ratio, p95_ratio_low=low, p95_ratio_high=high)
+
+        if p_value is not None and low is not None and p_value < alpha and low > 1 and ratio >= 1 + min_change:
+            result['verdict'] = 'regression'
+        elif high is not None and high < 1 and ratio <= 1 - min_change:
+            result['verdict'] = 'improvement'
+        else:
+            result['verdict'] = 'ok'
+
+        rates = [h['rps'] for h in history if h.get('rps')]
+        if current.get('rps') and rates:
+            change = current['rps'] / _median(rates) - 1
+            result['rps'], result['rps_change'] = current['rps'], change
+            result['throughput'] = 'drop' if change < -max_throughput_drop and current['rps'] < min(rates) else 'ok'
+        results.append(result)
+    return results
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def _epoch_ms(timestamp):
+    return int(parse_time(timestamp).timestamp() * 1000)
+
+
+def annotate(url, user, password, dashboard_uid, run, regressions, timeout=10):
+    """Mark each regressed endpoint on a Grafana dashboard over the run's time range. Returns errors."""
+    token = base64.b64encode(f"{user}:{password}".encode('utf-8')).decode('ascii')
+    headers = {"Authorization": f"Basic {token}", "Content-Type": "application/json"}
+    errors = []
+    for result in regressions:
+        text = (f"k6 {run['scenario']}: {result['endpoint']} p95 {result['baseline_p95']:.0f} → {result['p95']:.0f} ms "
+                f"(x{result['p95_ratio']:.2f}, {CONFIDENCE:.0%} CI {result['p95_ratio_low']:.2f}-"
+                f"{result['p95_ratio_high']:.2f}, Cliff's δ {result['cliffs_delta']:.2f}, p={result['p_value']:.1e})")
+        if run.get('commit'):
+            text += f" at {run['commit'][:12]}"
+        body = {"dashboardUID": dashboard_uid, "time": _epoch_ms(run['start']), "timeEnd": _epoch_ms(run['end']),
+                "tags": ["k6", "regression", run['scenario'], result['endpoint']], "text": text}
+        request = urllib.request.Request(url.rstrip('/') + "/api/annotations", data=json.dumps(body).encode('utf-8'),
+                                         headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout):
+                pass
+        except OSError as e:
+            errors.append(f"{result['endpoint']}: {e}")
+    return errors
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""Streaming aggregation of k6 `--out json=...` result files in constant memory.
+
+k6 writes one JSON object per line: a `Metric` line declaring each metric's
+type, then a `Point` line per sample. Points are folded into per-metric
+Summary objects as they are read, so memory depends on the number of metrics
+and tag values, not on the file size:
+
+- exact count, sum, min, max (and for rates, the number of non-zero samples)
+- a QuantileSketch (log-bucketed, 1% relative error, fixed bucket budget)
+  for approximate p50/p90/p95/p99 of trend metrics
+- the same per scenario and per value of a few tags (name, status, check,
+  method, and `endpoint`: the method plus the name with query strings and
+  ids dropped, e.g. `GET /api/v1/books/{id}`), with at most MAX_TAG_VALUES values per tag; further values are
+  counted under OTHER (which values get a row of their own then depends on
+  read order, so parallel and serial runs only agree below the cap)
+
+Summaries and sketches merge exactly, so a large file is split into byte
+ranges aggregated on a process pool, and several runs can be combined.
+"""
+
+import gzip
+import json
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+RELATIVE_ACCURACY = 0.01        # quantiles within 1% of the true value
+MAX_BUCKETS = 2048              # per sketch; covers 1µs..1 day at 1% before any collapsing
+MAX_TAG_VALUES = 200            # per metric and tag, beyond that values count as OTHER
+OTHER = '(other)'
+DEFAULT_TAGS = ('endpoint', 'name', 'status', 'check', 'method')
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+CHUNK_BYTES = 64 * 1024 ** 2    # smallest byte range worth a worker of its own
+
+# Path segments that are ids: numbers, GUIDs, Mongo ObjectIds
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|[0-9a-fA-F]{24})$')
+
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch (DDSketch-style logarithmic buckets).
+
+    A positive value v goes to bucket ceil(log_gamma(v)); every value in a
+    bucket is within RELATIVE_ACCURACY of the bucket's midpoint. Negative
+    values mirror the positive side and zeros are counted apart. When a side
+    exceeds MAX_BUCKETS its lowest buckets are folded together, which only
+    costs accuracy for the smallest magnitudes.
+    """
+
+    __slots__ = ('gamma', 'log_gamma', 'positive', 'negative', 'zeros', 'count', 'max_buckets')
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, max_buckets=MAX_BUCKETS):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zeros = 0
+        self.count = 0
+        self.max_buckets = max_buckets
+
+    def add(self, value):
+        self.count += 1
+        if value > 0:
+            store = self.positive
+        elif value < 0:
+            store, value = self.negative, -value
+        else:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        store[key] = store.get(key, 0) + 1
+        if len(store) > self.max_buckets:
+            self._collapse(store)
+
+    def _collapse(self, store):
+        keys = sorted(store)
+        excess = len(keys) - self.max_buckets
+        folded = sum(store.pop(k) for k in keys[:excess])
+        store[keys[excess]] += folded
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, n in theirs.items():
+                mine[key] = mine.get(key, 0) + n
+            if len(mine) > self.max_buckets:
+                self._collapse(mine)
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Approximate q-quantile (nearest rank), or None when empty"""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self):
+        return {"gamma": self.gamma, "zeros": self.zeros,
+                "positive": {str(k): n for k, n in sorted(self.positive.items())},
+                "negative": {str(k): n for k, n in sorted(self.negative.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.gamma = data["gamma"]
+        sketch.log_gamma = math.log(sketch.gamma)
+        sketch.zeros = data.get("zeros", 0)
+        sketch.positive = {int(k): n for k, n in data.get("positive", {}).items()}
+        sketch.negative = {int(k): n for k, n in data.get("negative", {}).items()}
+        sketch.count = sketch.zeros + sum(sketch.positive.values()) + sum(sketch.negative.values())
+        return sketch
+
+    def buckets(self):
+        """(representative value, count) pairs in ascending value order"""
+        values = [(-self._value(k), self.negative[k]) for k in sorted(self.negative, reverse=True)]
+        if self.zeros:
+            values.append((0.0, self.zeros))
+        values.extend((self._value(k), self.positive[k]) for k in sorted(self.positive))
+        return values
+
+
+class Summary:
+    """Exact count/sum/min/max of one metric (or one scenario or tag value of it), plus a sketch for trends"""
+
+    __slots__ = ('count', 'total', 'nonzero', 'minimum', 'maximum', 'last', 'sketch')
+
+    def __init__(self, trend=False):
+        self.count = 0
+        self.total = 0.0
+        self.nonzero = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.last = None
+        self.sketch = QuantileSketch() if trend else None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value:
+            self.nonzero += 1
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.last = value
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.nonzero += other.nonzero
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.last = other.last if other.last is not None else self.last
+        if other.sketch is not None:
+            if self.sketch is None:
+                self.sketch = QuantileSketch()
+            self.sketch.merge(other.sketch)
+        return self
+
+    def quantile(self, q):
+        """Sketch estimate clamped to the exact min/max"""
+        if self.sketch is None or not self.count:
+            return None
+        return min(self.maximum, max(self.minimum, self.sketch.quantile(q)))
+
+    def to_dict(self, metric_type):
+        if not self.count:
+            return {"count": 0}
+        result = {"count": self.count}
+        if metric_type == 'rate':
+            result.update(passes=self.nonzero, fails=self.count - self.nonzero, rate=self.nonzero / self.count)
+        elif metric_type == 'counter':
+            result.update(sum=self.total)
+        elif metric_type == 'gauge':
+            result.update(last=self.last, min=self.minimum, max=self.maximum)
+        else:
+            result.update(min=self.minimum, max=self.maximum, mean=self.total / self.count)
+            result.update({f"p{q * 100:g}": self.quantile(q) for q in QUANTILES})
+        return result
+
+
+class MetricAggregate:
+    """Everything kept for one metric: overall, per scenario and per value of each grouping tag"""
+
+    __slots__ = ('type', 'contains', 'overall', 'scenarios', 'tags')
+
+    def __init__(self, metric_type=None, contains=None):
+        self.type = metric_type         # None until the Metric line is seen (not in every byte range)
+        self.contains = contains
+        self.overall = Summary(self._trend)
+        self.scenarios = {}
+        self.tags = {}
+
+    @property
+    def _trend(self):
+        return self.type in (None, 'trend')
+
+    def _summary(self, groups, value):
+        summary = groups.get(value)
+        if summary is None:
+            if len(groups) >= MAX_TAG_VALUES and value != OTHER:
+                return self._summary(groups, OTHER)
+            summary = groups[value] = Summary(self._trend)
+        return summary
+
+    def add(self, value, tags, group_tags):
+        self.overall.add(value)
+        if not tags:
+            return
+        scenario = tags.get('scenario')
+        if scenario is not None:
+            self._summary(self.scenarios, scenario).add(value)
+        for tag in group_tags:
+            tag_value = tags.get(tag)
+            if tag_value is not None:
+                self._summary(self.tags.setdefault(tag, {}), str(tag_value)).add(value)
+
+    def merge(self, other):
+        self.type = self.type or other.type
+        self.contains = self.contains or other.contains
+        self.overall.merge(other.overall)
+        for value, summary in other.scenarios.items():
+            self._summary(self.scenarios, value).merge(summary)
+        for tag, groups in other.tags.items():
+            mine = self.tags.setdefault(tag, {})
+            for value, summary in groups.items():
+                self._summary(mine, value).merge(summary)
+        return self
+
+    def to_dict(self):
+        metric_type = self.type or 'trend'
+        result = {"type": metric_type, **self.overall.to_dict(metric_type)}
+        if self.contains:
+            result["contains"] = self.contains
+        if self.scenarios:
+            result["scenarios"] = {s: v.to_dict(metric_type) for s, v in sorted(self.scenarios.items())}
+        if self.tags:
+            result["tags"] = {t: {v: s.to_dict(metric_type) for v, s in sorted(groups.items())}
+                              for t, groups in sorted(self.tags.items())}
+        return result
+
+
+class ResultAggregate:
+    """A whole k6 result stream (or any number of them, merged)"""
+
+    def __init__(self, group_tags=DEFAULT_TAGS):
+        self.group_tags = tuple(group_tags)
+        self.metrics = {}
+        self.points = 0
+        self.bad_lines = 0
+        self.first_time = None
+        self.last_time = None
+
+    def metric(self, name, metric_type=None, contains=None):
+        aggregate = self.metrics.get(name)
+        if aggregate is None:
+            aggregate = self.metrics[name] = MetricAggregate(metric_type, contains)
+        elif metric_type and aggregate.type is None:
+            if aggregate.overall.count:
+                aggregate.type, aggregate.contains = metric_type, contains
+            else:
+                self.metrics[name] = aggregate = MetricAggregate(metric_type, contains)
+        return aggregate
+
+    def add_line(self, line):
+        try:
+            entry = json.loads(line)
+            kind, data = entry['type'], entry['data']
+        except (ValueError, KeyError, TypeError):
+            if line.strip():
+                self.bad_lines += 1
+            return
+        if kind == 'Point':
+            value = data.get('value')
+            if not isinstance(value, (int, float)):
+                self.bad_lines += 1
+                return
+            tags = data.get('tags')
+            if tags and 'endpoint' in self.group_tags:
+                tags = dict(tags, endpoint=endpoint_of(tags))
+            self.metric(entry['metric']).add(value, tags, self.group_tags)
+            self.points += 1
+            # RFC 3339 strings of one run share a format and offset, so they order as text
+            time = data.get('time')
+            if time:
+                if self.first_time is None or time < self.first_time:
+                    self.first_time = time
+                if self.last_time is None or time > self.last_time:
+                    self.last_time = time
+        elif kind == 'Metric':
+            self.metric(data.get('name') or entry['metric'], data.get('type'), data.get('contains'))
+
+    def merge(self, other):
+        for name, aggregate in other.metrics.items():
+            mine = self.metrics.get(name)
+            if mine is None:
+                self.metrics[name] = aggregate
+            else:
+                mine.merge(aggregate)
+        self.points += other.points
+        self.bad_lines += other.bad_lines
+        for time in (other.first_time, other.last_time):
+            if time is not None:
+                self.first_time = time if self.first_time is None else min(self.first_time, time)
+                self.last_time = time if self.last_time is None else max(self.last_time, time)
+        return self
+
+    def duration_seconds(self):
+        try:
+            start, end = (parse_time(t) for t in (self.first_time, self.last_time))
+        except (TypeError, ValueError):
+            return None
+        return (end - start).total_seconds()
+
+    def to_dict(self):
+        return {
+            "points": self.points,
+            "bad_lines": self.bad_lines,
+            "start": self.first_time,
+            "end": self.last_time,
+            "duration_seconds": self.duration_seconds(),
+            "metrics": {name: m.to_dict() for name, m in sorted(self.metrics.items())},
+        }
+
+
+def endpoint_of(tags):
+    """'GET /api/v1/books/{id}' for a request tagged name=http://host/api/v1/books/42?x=1, method=GET"""
+    name = tags.get('name')
+    if not name:
+        return None
+    path = (urlsplit(name).path or '/') if '://' in name else name.split('?', 1)[0]
+    if path.startswith('/'):
+        path = '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+    method = tags.get('method')
+    return f"{method} {path}" if method else path
+
+
+def _trim_nanos(timestamp):
+    """k6 writes nanosecond fractions and a Z suffix; datetime.fromisoformat takes microseconds and +00:00"""
+    timestamp = timestamp.replace('Z', '+00:00')
+    if '.' not in timestamp:
+        return timestamp
+    head, tail = timestamp.split('.', 1)
+    digits = len(tail) - len(tail.lstrip('0123456789'))
+    return f"{head}.{tail[:min(digits, 6)].ljust(6, '0')}{tail[digits:]}"
+
+
+def parse_time(timestamp):
+    """datetime of a k6 RFC 3339 timestamp"""
+    return datetime.fromisoformat(_trim_nanos(timestamp))
+
+
+def _open(path):
+    return gzip.open(path, 'rb') if str(path).endswith('.gz') else open(path, 'rb')
+
+
+def aggregate_range(path, start, end, group_tags=DEFAULT_TAGS):
+    """Aggregate the lines that start inside [start, end) of an uncompressed file"""
+    result = ResultAggregate(group_tags)
+    with open(path, 'rb') as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()    # finish the line that straddles the boundary; the previous range owns it
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            result.add_line(line)
+    return result
+
+
+def aggregate_stream(lines, group_tags=DEFAULT_TAGS):
+    result = ResultAggregate(group_tags)
+    for line in lines:
+        result.add_line(line)
+    return result
+
+
+def _aggregate_range(job):
+    return aggregate_range(*job)
+
+
+def aggregate_files(paths, workers=None, group_tags=DEFAULT_TAGS):
+    """Aggregate and merge k6 JSON result files (.json or .json.gz).
+
+    Uncompressed files are cut into byte ranges of at least CHUNK_BYTES that
+    are aggregated in parallel; gzip files are streamed in this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = []
+    total = ResultAggregate(group_tags)
+    for path in paths:
+        if str(path).endswith('.gz'):
+            with _open(path) as f:
+                total.merge(aggregate_stream(f, group_tags))
+            continue
+        size = os.path.getsize(path)
+        parts = max(1, min(workers, size // CHUNK_BYTES))
+        bounds = [size * i // parts for i in range(parts + 1)]
+        jobs.extend((str(path), bounds[i], bounds[i + 1], tuple(group_tags)) for i in range(parts))
+
+    if len(jobs) == 1 or workers == 1:
+        results = map(_aggregate_range, jobs)
+        for result in results:
+            total.merge(result)
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(_aggregate_range, jobs):
+                total.merge(result)
+    return total
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Summarize k6 `--out json=...` result files in constant memory.
+
+Prints exact counts and approximate p50/p90/p95/p99 (1% relative error) for
+http_req_duration and every other trend metric, per scenario and per endpoint
+(method and request name with ids dropped), plus rates and counters. Files of any size work: memory is bounded by
+the number of metrics and tag values, and uncompressed files are split across
+--workers processes.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+from k6_results import DEFAULT_TAGS, QUANTILES, aggregate_files
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('files', nargs='+', type=Path, help='k6 JSON result files (.json or .json.gz); several are merged')
+parser.add_argument('--workers', type=int, default=None, help='Processes for uncompressed files (default: CPU count)')
+parser.add_argument('--tags', default=','.join(DEFAULT_TAGS),
+                    help=f"Tags to break metrics down by (default: {','.join(DEFAULT_TAGS)})")
+parser.add_argument('--by', default='endpoint',
+                    help='Tag shown under each trend in the table (default: endpoint, "" for none)')
+parser.add_argument('--top', type=int, default=10, help='Most frequent --by values shown per trend (default: 10)')
+parser.add_argument('--json', dest='json_out', type=Path, help='Also write the full summary as JSON to this path')
+parser.add_argument('--markdown', action='store_true', help='Print Markdown tables (for $GITHUB_STEP_SUMMARY)')
+args = parser.parse_args()
+
+missing = [str(p) for p in args.files if not p.is_file()]
+if missing:
+    print(f"❌ No such file: {', '.join(missing)}")
+    sys.exit(1)
+
+group_tags = [t for t in args.tags.split(',') if t]
+started = time.perf_counter()
+result = aggregate_files(args.files, args.workers, group_tags)
+elapsed = time.perf_counter() - started
+summary = result.to_dict()
+summary["files"] = [str(p) for p in args.files]
+
+if args.json_out:
+    args.json_out.parent.mkdir(parents=True, exist_ok=True)
+    args.json_out.write_text(json.dumps(summary, indent=2) + "\n")
+
+metrics = summary["metrics"]
+columns = ["count"] + [f"p{q * 100:g}" for q in QUANTILES] + ["max"]
+
+
+def ms(value):
+    return "-" if value is None else f"{value:,.1f}"
+
+
+def trend_rows(name, stats):
+    yield name, stats
+    for scenario, group in stats.get("scenarios", {}).items():
+        yield f"  scenario={scenario}", group
+    groups = stats.get("tags", {}).get(args.by, {})
+    for value in sorted(groups, key=lambda v: -groups[v]["count"])[:args.top]:
+        yield f"  {args.by}={value}", groups[value]
+
+
+def trend_cells(stats):
+    return [f"{stats['count']:,}"] + [ms(stats.get(c)) for c in columns[1:]]
+
+
+# http_req_duration first, then the custom trends, then k6's other built-in timings
+trends = sorted((n for n, m in metrics.items() if m["type"] == "trend" and m["count"]),
+                key=lambda n: (n != "http_req_duration", n.startswith(("http_req_", "iteration_", "group_")), n))
+rates = [n for n, m in metrics.items() if m["type"] == "rate" and m["count"]]
+counters = [n for n, m in metrics.items() if m["type"] == "counter" and m["count"]]
+
+duration = summary["duration_seconds"]
+if args.markdown:
+    print(f"### k6 results ({summary['points']:,} points"
+          + (f", {duration:,.0f}s" if duration else "") + ")\n")
+    print("| Trend (ms) | " + " | ".join(columns) + " |")
+    print("|---|" + "---:|" * len(columns))
+    for name in trends:
+        for label, stats in trend_rows(name, metrics[name]):
+            print(f"| `{label.strip()}` | " + " | ".join(trend_cells(stats)) + " |")
+    if rates:
+        print("\n| Rate | rate | passes | fails |\n|---|---:|---:|---:|")
+        for name in rates:
+            m = metrics[name]
+            print(f"| `{name}` | {m['rate']:.2%} | {m['passes']:,} | {m['fails']:,} |")
+    sys.exit(0)
+
+print("=" * 70)
+print(f"📁 {len(args.files)} file(s): {summary['points']:,} points in {elapsed:.1f}s"
+      + (f", run length {duration:,.0f}s" if duration else ""))
+if summary["bad_lines"]:
+    print(f"⚠️  {summary['bad_lines']:,} unreadable lines skipped")
+print("=" * 70)
+
+width = max([len(label) for name in trends for label, _ in trend_rows(name, metrics[name])] + [20])
+print(f"\n{'Trend (ms)':<{width}} " + " ".join(f"{c:>10}" for c in columns))
+for name in trends:
+    for label, stats in trend_rows(name, metrics[name]):
+        print(f"{label:<{width}} " + " ".join(f"{cell:>10}" for cell in trend_cells(stats)))
+
+if rates:
+    print(f"\n{'Rate':<{width}} {'rate':>10} {'passes':>10} {'fails':>10}")
+    for name in rates:
+        m = metrics[name]
+        print(f"{name:<{width}} {m['rate']:>10.2%} {m['passes']:>10,} {m['fails']:>10,}")
+
+if counters:
+    print(f"\n{'Counter':<{width}} {'sum':>10} {'per sec':>10}")
+    for name in counters:
+        per_second = f"{metrics[name]['sum'] / duration:,.1f}" if duration else "-"
+        print(f"{name:<{width}} {metrics[name]['sum']:>10,.0f} {per_second:>10}")
+
+if args.json_out:
+    print(f"\n✓ Summary written to {args.json_out}")
@@ -1,384 +1,83 @@
 #!/usr/bin/env python3
 """Add MongoDB and Redis panels to the dependencies dashboard."""
 
-import json
 import sys
-from pathlib import Path
 
-# Get the script directory and navigate to dashboard
-script_dir = Path(__file__).parent
-dashboard_path = script_dir / "../../monitoring/grafana/dashboards/bookstore-dependencies.json"
+from dashboard_layout import place_in_row
+from dashboard_utils import DASHBOARDS_DIR, load_dashboard, save_dashboard
+from latency_quantiles import QUANTILE_RULES_FILE, latency_panels, write_quantile_rules
+from panel_builder import Target, Threshold, gauge, layout, timeseries
+from recording_rules import load_rules, recorded_expr
+
+dashboard_path = DASHBOARDS_DIR / "bookstore-dependencies.json"
+DATABASE_PANEL_IDS = range(100, 108)
+LATENCY_HISTOGRAMS = ['mongodb_operation_duration', 'redis_operation_duration']
+MONGODB_ROW_TITLE = "MongoDB"
+REDIS_ROW_TITLE = "Redis"
 
 # Load the dashboard
-with open(dashboard_path, 'r') as f:
-    dashboard = json.load(f)
+dashboard = load_dashboard(dashboard_path)
+
+# Line style shared by every timeseries panel on this dashboard
+LINES = dict(fillOpacity=10, lineWidth=2, showPoints="never")
+LEGEND = dict(legend_table=True, tooltip="multi")
+
 
-# Find the last panel to determine next Y position
-last_panel = max(dashboard['panels'], key=lambda p: p['gridPos']['y'] + p['gridPos']['h'])
-next_y = last_panel['gridPos']['y'] + last_panel['gridPos']['h']
+# Each latency histogram is read once, by its heatmap; the percentile lines read recorded quantiles
+mongodb_latency, mongodb_distribution = latency_panels(
+    "MongoDB Operation Duration", "mongodb_operation_duration", "{{operation}}",
+    unit="ms", legend_calcs=["mean", "p95", "max"], **LEGEND, **LINES)
+redis_latency, redis_distribution = latency_panels(
+    "Redis Operation Duration", "redis_operation_duration", "{{operation}}",
+    unit="ms", legend_calcs=["mean", "p95", "max"], **LEGEND, **LINES)
 
 # MongoDB panels
 mongodb_panels = [
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "palette-classic"},
-                "custom": {
-                    "axisCenteredZero": False,
-                    "axisColorMode": "text",
-                    "axisLabel": "",
-                    "axisPlacement": "auto",
-                    "barAlignment": 0,
-                    "drawStyle": "line",
-                    "fillOpacity": 10,
-                    "gradientMode": "none",
-                    "hideFrom": {"tooltip": False, "viz": False, "legend": False},
-                    "lineInterpolation": "linear",
-                    "lineWidth": 2,
-                    "pointSize": 5,
-                    "scaleDistribution": {"type": "linear"},
-                    "showPoints": "never",
-                    "spanNulls": False,
-                    "stacking": {"group": "A", "mode": "none"},
-                    "thresholdsStyle": {"mode": "off"}
-                },
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [{"color": "green", "value": None}]
-                },
-                "unit": "ops"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 0, "y": next_y},
-        "id": 100,
-        "options": {
-            "legend": {
-                "calcs": ["mean", "lastNotNull", "max"],
-                "displayMode": "table",
-                "placement": "bottom",
-                "showLegend": True
-            },
-            "tooltip": {"mode": "multi", "sort": "none"}
-        },
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "rate(mongodb_operations_count[1m])",
-                "legendFormat": "{{operation}}",
-                "refId": "A"
-            }
-        ],
-        "title": "MongoDB Operations/sec",
-        "type": "timeseries"
-    },
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "palette-classic"},
-                "custom": {
-                    "axisCenteredZero": False,
-                    "axisColorMode": "text",
-                    "axisLabel": "",
-                    "axisPlacement": "auto",
-                    "barAlignment": 0,
-                    "drawStyle": "line",
-                    "fillOpacity": 10,
-                    "gradientMode": "none",
-                    "hideFrom": {"tooltip": False, "viz": False, "legend": False},
-                    "lineInterpolation": "linear",
-                    "lineWidth": 2,
-                    "pointSize": 5,
-                    "scaleDistribution": {"type": "linear"},
-                    "showPoints": "never",
-                    "spanNulls": False,
-                    "stacking": {"group": "A", "mode": "none"},
-                    "thresholdsStyle": {"mode": "off"}
-                },
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [{"color": "green", "value": None}]
-                },
-                "unit": "ms"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 12, "y": next_y},
-        "id": 101,
-        "options": {
-            "legend": {
-                "calcs": ["mean", "p95", "max"],
-                "displayMode": "table",
-                "placement": "bottom",
-                "showLegend": True
-            },
-            "tooltip": {"mode": "multi", "sort": "none"}
-        },
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.50, rate(mongodb_operation_duration_bucket[1m]))",
-                "legendFormat": "P50 - {{operation}}",
-                "refId": "A"
-            },
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.95, rate(mongodb_operation_duration_bucket[1m]))",
-                "legendFormat": "P95 - {{operation}}",
-                "refId": "B"
-            },
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.99, rate(mongodb_operation_duration_bucket[1m]))",
-                "legendFormat": "P99 - {{operation}}",
-                "refId": "C"
-            }
-        ],
-        "title": "MongoDB Operation Duration (Percentiles)",
-        "type": "timeseries"
-    }
+    timeseries("MongoDB Operations/sec", [Target("rate(mongodb_operations_count[1m])", "{{operation}}")],
+               unit="ops", legend_calcs=["mean", "lastNotNull", "max"], **LEGEND, **LINES),
+    mongodb_latency,
 ]
 
 # Redis panels
 redis_panels = [
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "palette-classic"},
-                "custom": {
-                    "axisCenteredZero": False,
-                    "axisColorMode": "text",
-                    "axisLabel": "",
-                    "axisPlacement": "auto",
-                    "barAlignment": 0,
-                    "drawStyle": "line",
-                    "fillOpacity": 10,
-                    "gradientMode": "none",
-                    "hideFrom": {"tooltip": False, "viz": False, "legend": False},
-                    "lineInterpolation": "linear",
-                    "lineWidth": 2,
-                    "pointSize": 5,
-                    "scaleDistribution": {"type": "linear"},
-                    "showPoints": "never",
-                    "spanNulls": False,
-                    "stacking": {"group": "A", "mode": "none"},
-                    "thresholdsStyle": {"mode": "off"}
-                },
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [{"color": "green", "value": None}]
-                },
-                "unit": "ops"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 0, "y": next_y + 8},
-        "id": 102,
-        "options": {
-            "legend": {
-                "calcs": ["mean", "lastNotNull", "max"],
-                "displayMode": "table",
-                "placement": "bottom",
-                "showLegend": True
-            },
-            "tooltip": {"mode": "multi", "sort": "none"}
-        },
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "rate(redis_operations_count[1m])",
-                "legendFormat": "{{operation}}",
-                "refId": "A"
-            }
-        ],
-        "title": "Redis Operations/sec",
-        "type": "timeseries"
-    },
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "palette-classic"},
-                "custom": {
-                    "axisCenteredZero": False,
-                    "axisColorMode": "text",
-                    "axisLabel": "",
-                    "axisPlacement": "auto",
-                    "barAlignment": 0,
-                    "drawStyle": "line",
-                    "fillOpacity": 10,
-                    "gradientMode": "none",
-                    "hideFrom": {"tooltip": False, "viz": False, "legend": False},
-                    "lineInterpolation": "linear",
-                    "lineWidth": 2,
-                    "pointSize": 5,
-                    "scaleDistribution": {"type": "linear"},
-                    "showPoints": "never",
-                    "spanNulls": False,
-                    "stacking": {"group": "A", "mode": "normal"},
-                    "thresholdsStyle": {"mode": "off"}
-                },
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [{"color": "green", "value": None}]
-                },
-                "unit": "short"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 12, "y": next_y + 8},
-        "id": 103,
-        "options": {
-            "legend": {
-                "calcs": ["sum"],
-                "displayMode": "table",
-                "placement": "bottom",
-                "showLegend": True
-            },
-            "tooltip": {"mode": "multi", "sort": "none"}
-        },
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "rate(redis_cache_hits[1m])",
-                "legendFormat": "Cache Hits",
-                "refId": "A"
-            },
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "rate(redis_cache_misses[1m])",
-                "legendFormat": "Cache Misses",
-                "refId": "B"
-            }
-        ],
-        "title": "Redis Cache Hit Rate",
-        "type": "timeseries"
-    },
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "thresholds"},
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [
-                        {"color": "red", "value": None},
-                        {"color": "yellow", "value": 50},
-                        {"color": "green", "value": 80}
-                    ]
-                },
-                "unit": "percent"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 0, "y": next_y + 16},
-        "id": 104,
-        "options": {
-            "orientation": "auto",
-            "reduceOptions": {
-                "values": False,
-                "calcs": ["lastNotNull"],
-                "fields": ""
-            },
-            "showThresholdLabels": False,
-            "showThresholdMarkers": True
-        },
-        "pluginVersion": "10.2.0",
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "(rate(redis_cache_hits[1m]) / (rate(redis_cache_hits[1m]) + rate(redis_cache_misses[1m]))) * 100",
-                "legendFormat": "Hit Ratio",
-                "refId": "A"
-            }
-        ],
-        "title": "Cache Hit Ratio %",
-        "type": "gauge"
-    },
-    {
-        "datasource": {"type": "prometheus"},
-        "fieldConfig": {
-            "defaults": {
-                "color": {"mode": "palette-classic"},
-                "custom": {
-                    "axisCenteredZero": False,
-                    "axisColorMode": "text",
-                    "axisLabel": "",
-                    "axisPlacement": "auto",
-                    "barAlignment": 0,
-                    "drawStyle": "line",
-                    "fillOpacity": 10,
-                    "gradientMode": "none",
-                    "hideFrom": {"tooltip": False, "viz": False, "legend": False},
-                    "lineInterpolation": "linear",
-                    "lineWidth": 2,
-                    "pointSize": 5,
-                    "scaleDistribution": {"type": "linear"},
-                    "showPoints": "never",
-                    "spanNulls": False,
-                    "stacking": {"group": "A", "mode": "none"},
-                    "thresholdsStyle": {"mode": "off"}
-                },
-                "mappings": [],
-                "thresholds": {
-                    "mode": "absolute",
-                    "steps": [{"color": "green", "value": None}]
-                },
-                "unit": "ms"
-            },
-            "overrides": []
-        },
-        "gridPos": {"h": 8, "w": 12, "x": 12, "y": next_y + 16},
-        "id": 105,
-        "options": {
-            "legend": {
-                "calcs": ["mean", "p95", "max"],
-                "displayMode": "table",
-                "placement": "bottom",
-                "showLegend": True
-            },
-            "tooltip": {"mode": "multi", "sort": "none"}
-        },
-        "targets": [
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.50, rate(redis_operation_duration_bucket[1m]))",
-                "legendFormat": "P50 - {{operation}}",
-                "refId": "A"
-            },
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.95, rate(redis_operation_duration_bucket[1m]))",
-                "legendFormat": "P95 - {{operation}}",
-                "refId": "B"
-            },
-            {
-                "datasource": {"type": "prometheus"},
-                "expr": "histogram_quantile(0.99, rate(redis_operation_duration_bucket[1m]))",
-                "legendFormat": "P99 - {{operation}}",
-                "refId": "C"
-            }
-        ],
-        "title": "Redis Operation Duration (Percentiles)",
-        "type": "timeseries"
-    }
+    timeseries("Redis Operations/sec", [Target("rate(redis_operations_count[1m])", "{{operation}}")],
+               unit="ops", legend_calcs=["mean", "lastNotNull", "max"], **LEGEND, **LINES),
+    timeseries("Redis Cache Hit Rate", [Target("rate(redis_cache_hits[1m])", "Cache Hits"),
+                                        Target("rate(redis_cache_misses[1m])", "Cache Misses")],
+               unit="short", legend_calcs=["sum"], stacking={"group": "A", "mode": "normal"}, **LEGEND, **LINES),
+    gauge("Cache Hit Ratio %",
+          [Target("(rate(redis_cache_hits[1m]) / (rate(redis_cache_hits[1m]) + rate(redis_cache_misses[1m]))) * 100",
+                  "Hit Ratio")],
+          unit="percent", thresholds=[Threshold("red"), Threshold("yellow", 50), Threshold("green", 80)],
+          plugin_version="10.2.0"),
+    redis_latency,
 ]
 
-# Add all new panels
-dashboard['panels'].extend(mongodb_panels)
-dashboard['panels'].extend(redis_panels)
+# Ids 100-107; the heatmaps come last so the other panels keep their ids (and library panel uids)
+new_panels = layout(mongodb_panels + redis_panels + [mongodb_distribution, redis_distribution], 0,
+                    DATABASE_PANEL_IDS.start)
+# Read the series compile-recording-rules.py records, as it would rewrite these queries
+rules = load_rules()
+for panel in new_panels:
+    for target in panel['targets']:
+        target['expr'] = recorded_expr(target['expr'], rules)
+
+# Two panels per line at the top of each database's row, replacing the ones from a previous run
+mongodb_ids = {p['id'] for p in new_panels[:len(mongodb_panels)]} | {new_panels[-2]['id']}
+sections = [
+    (MONGODB_ROW_TITLE, [p for p in new_panels if p['id'] in mongodb_ids]),
+    (REDIS_ROW_TITLE, [p for p in new_panels if p['id'] not in mongodb_ids]),
+]
+for title, panels in sections:
+    ids = {p['id'] for p in panels}
+    if not place_in_row(dashboard, title, panels, lambda p: p.get('type') != 'row' and p.get('id') in ids):
+        print(f"❌ {dashboard_path.name} has no '{title}' row")
+        sys.exit(1)
 
-# Save the updated dashboard
-with open(dashboard_path, 'w') as f:
-    json.dump(dashboard, f, indent=4)
+# Save the updated dashboard and the quantile rules its percentile panels read
+save_dashboard(dashboard, dashboard_path)
+rule_count = write_quantile_rules(LATENCY_HISTOGRAMS, rules=rules)
 
-print(f"✅ Added {len(mongodb_panels)} MongoDB panels and {len(redis_panels)} Redis panels")
+print(f"✅ Added {len(mongodb_panels) + 1} MongoDB panels and {len(redis_panels) + 1} Redis panels")
 print(f"   Total panels now: {len(dashboard['panels'])}")
+print(f"   Quantile rules: {rule_count} in {QUANTILE_RULES_FILE.name}")
@@ -1,37 +1,36 @@
 #!/usr/bin/env python3
 """Add HTTP status code panels to the Errors & Diagnostics dashboard"""
 
-import json
+import sys
 
-# Read the dashboard
-with open('../../monitoring/grafana/dashboards/bookstore-errors-diagnostics.json', 'r') as f:
-    dashboard = json.load(f)
+from dashboard_layout import place_in_row
+from dashboard_utils import DASHBOARDS_DIR, load_dashboard, save_dashboard
+from query_consolidation import consolidate_panels
+from recording_rules import load_rules, recorded_expr
+from status_codes import STATUS_CODES, is_server_error
+
+DASHBOARD_PATH = DASHBOARDS_DIR / 'bookstore-errors-diagnostics.json'
+STATUS_PANEL_IDS = range(11, 19)
+STATUS_ROW_TITLE = 'HTTP Error Codes (Detailed)'
 
-# Status codes to add
-status_codes = [
-    {"code": "400", "title": "400 Bad Request", "desc": "Invalid request syntax or validation errors", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "401", "title": "401 Unauthorized", "desc": "Authentication required or failed", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "404", "title": "404 Not Found", "desc": "Resource doesn't exist", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "409", "title": "409 Conflict", "desc": "Resource already exists or conflicting state", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "410", "title": "410 Gone", "desc": "Resource permanently deleted", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "422", "title": "422 Validation Error", "desc": "Validation failed", "threshold_yellow": 1, "threshold_orange": 10, "row": 12},
-    {"code": "500", "title": "500 Internal Server Error", "desc": "Unhandled exceptions", "threshold_orange": 1, "threshold_red": 5, "row": 16},
-    {"code": "503", "title": "503 Service Unavailable", "desc": "Dependencies down or overloaded", "threshold_orange": 1, "threshold_red": 5, "row": 16},
-]
+# Read the dashboard
+dashboard = load_dashboard(DASHBOARD_PATH)
+rules = load_rules()
 
-# Remove existing status code panels (id 11-18 if they exist)
-dashboard['panels'] = [p for p in dashboard['panels'] if p['id'] not in range(11, 19)]
+# Panels from a previous run are replaced (matched by id, or by title for files from
+# before the ids were fixed), so running this again leaves the dashboard as it was
+status_titles = {status['title'] for status in STATUS_CODES}
 
-# Get max ID to start from
-max_id = max(p['id'] for p in dashboard['panels'])
+def is_status_panel(panel):
+    return panel.get('type') != 'row' and (panel.get('id') in STATUS_PANEL_IDS or panel.get('title') in status_titles)
 
 # Add new status code panels
-x_position = 0
-for idx, status in enumerate(status_codes):
-    panel_id = max_id + idx + 1
+status_panels = []
+for idx, status in enumerate(STATUS_CODES):
+    panel_id = STATUS_PANEL_IDS.start + idx
 
     # 4xx codes get yellow/orange thresholds, 5xx get orange/red
-    if status['code'].startswith('5'):
+    if is_server_error(status):
         thresholds = [
             {"color": "green", "value": None},
             {"color": "orange", "value": status.get('threshold_orange', 1)},
@@ -44,13 +43,8 @@ for idx, status in enumerate(status_codes):
             {"color": "orange", "value": status.get('threshold_orange', 10)}
         ]
 
-    # Calculate grid position - 6 panels per row for 4xx, 2 large panels for 5xx
-    if status['code'].startswith('5'):
-        width = 6
-        x = (idx - 6) * 6  # 500 and 503 on second row
-    else:
-        width = 4
-        x = (idx % 6) * 4
+    # 6 panels on the first line for 4xx, 2 larger ones for 5xx (place_in_row packs them)
+    width = 6 if is_server_error(status) else 4
 
     panel = {
         "datasource": {"type": "prometheus"},
@@ -70,8 +64,8 @@ for idx, status in enumerate(status_codes):
         "gridPos": {
             "h": 4,
             "w": width,
-            "x": x,
-            "y": status['row']
+            "x": 0,
+            "y": 0
         },
         "id": panel_id,
         "options": {
@@ -89,7 +83,7 @@ for idx, status in enumerate(status_codes):
         "pluginVersion": "10.0.0",
         "targets": [
             {
-                "expr": f'sum(rate(http_server_request_duration_seconds_count{{http_response_status_code="{status["code"]}"}}[1m])) or vector(0)',
+                "expr": recorded_expr(f'sum(rate(http_server_request_duration_seconds_count{{http_response_status_code="{status["code"]}"}}[1m])) or vector(0)', rules),
                 "refId": "A"
             }
         ],
@@ -97,16 +91,18 @@ for idx, status in enumerate(status_codes):
         "type": "stat"
     }
 
-    dashboard['panels'].append(panel)
+    status_panels.append(panel)
 
-# Adjust y positions of existing panels that come after row 12
-for panel in dashboard['panels']:
-    if panel['id'] < 11 and panel['gridPos']['y'] >= 12:
-        panel['gridPos']['y'] += 8  # Move down by 8 to make room for new panels
+# Query all status codes once with `sum(...) by (http_response_status_code)`;
+# the other panels read that result via the -- Dashboard -- datasource
+consolidate_panels(status_panels)
+if not place_in_row(dashboard, STATUS_ROW_TITLE, status_panels, is_status_panel):
+    print(f"❌ {DASHBOARD_PATH.name} has no '{STATUS_ROW_TITLE}' row")
+    sys.exit(1)
 
 # Write back
-with open('../../monitoring/grafana/dashboards/bookstore-errors-diagnostics.json', 'w') as f:
-    json.dump(dashboard, f, indent=4)
+save_dashboard(dashboard, DASHBOARD_PATH)
 
 print("✓ Added HTTP status code panels to Errors & Diagnostics dashboard")
-print("  Added panels: 400, 401, 404, 409, 410, 422, 500, 503")
+print(f"  Added panels: {', '.join(status['code'] for status in STATUS_CODES)}")
+print(f"  Grouped query: {status_panels[0]['targets'][0]['expr']}")
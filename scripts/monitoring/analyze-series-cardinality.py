@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Report how many series each dashboard panel touches and which labels drive it, from saved Prometheus API dumps"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, RULES_DIR, dashboard_files, dump_yaml
+from metric_references import collect_references, recording_rules
+from recording_rules import load_dashboards
+from series_cardinality import (HIGH_CARDINALITY, SeriesIndex, dashboard_series, load_series, load_tsdb_status,
+                                panel_series, suggest_rules, tsdb_summary)
+
+parser = argparse.ArgumentParser(
+    description=__doc__,
+    epilog="Dump the inputs with: curl -s localhost:9090/api/v1/series --data-urlencode 'match[]={__name__=~\".+\"}' "
+           "> series.json; curl -s localhost:9090/api/v1/status/tsdb > tsdb.json")
+parser.add_argument('--series', type=Path, required=True, help='Saved /api/v1/series response')
+parser.add_argument('--tsdb', type=Path, help='Saved /api/v1/status/tsdb response')
+parser.add_argument('--baseline', type=Path,
+                    help='Older /api/v1/series response to compare against (e.g. production vs. a branch)')
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-dir', type=Path, default=RULES_DIR, help='Directory of Prometheus rule files')
+parser.add_argument('--top', type=int, default=15, help='Panels to list (default: 15)')
+parser.add_argument('--threshold', type=int, default=HIGH_CARDINALITY,
+                    help=f'Label values per metric that count as high cardinality (default: {HIGH_CARDINALITY})')
+parser.add_argument('--max-series', type=int, help='Exit 1 if any panel touches more series than this')
+args = parser.parse_args()
+
+paths = dashboard_files(args.dashboards_dir)
+dashboards = load_dashboards(paths)
+rules = {record: node for record, (node, _) in recording_rules(args.rules_dir).items()}
+index = SeriesIndex(load_series(args.series), rules)
+panels = panel_series(dashboards, index)
+totals = dashboard_series(panels)
+
+print(f"📁 {len(index):,} series ({len(index.by_metric)} metrics) against {len(paths)} dashboards")
+if args.tsdb:
+    print("\n".join(tsdb_summary(load_tsdb_status(args.tsdb))))
+
+baseline = {}
+if args.baseline:
+    baseline_panels = panel_series(dashboards, SeriesIndex(load_series(args.baseline), rules))
+    baseline = dashboard_series(baseline_panels)
+
+print("\n📊 Series touched per refresh, by dashboard")
+for name, series in totals.items():
+    line = f"   {series:>10,}  {name}"
+    if args.baseline:
+        before = baseline.get(name, 0)
+        change = f"{(series - before) / before * 100:+.0f}%" if before else "new"
+        line += f"   (was {before:,}, {change})"
+    print(line)
+
+print(f"\n📊 Top {args.top} panels by series touched")
+for panel in panels[:args.top]:
+    drivers = ', '.join(f"{label}×{values}" for label, values in panel.drivers) or '-'
+    print(f"   {panel.series:>8,}  {panel.dashboard}: {panel.title} [{panel.panel_id}]")
+    print(f"             labels: {drivers}   metrics: {', '.join(panel.metrics)}")
+
+suggestions = suggest_rules(index, collect_references(dashboards, args.rules_dir), args.threshold)
+if suggestions:
+    print(f"\n💡 {len(suggestions)} suggestions for labels with ≥{args.threshold} values")
+    for s in suggestions:
+        print(f"   {s.kind:<11} {s.metric} / {s.label} ({s.values:,} values, {s.series:,} series): {s.reason}")
+    drops = [s.rule for s in suggestions if s.kind == 'drop-label']
+    aggregations = [s.rule for s in suggestions if s.kind == 'aggregate']
+    if drops:
+        print("\n   metric_relabel_configs (prometheus.yml, per scrape job):")
+        print(''.join(f"       {line}\n" for line in dump_yaml(drops).splitlines()), end='')
+    sources = [s for s in suggestions if s.kind == 'drop-at-source']
+    if sources:
+        print("\n   exporter changes (OpenTelemetry view keeping only these tags, e.g. AddView(..., TagKeys = ...)):")
+        for s in sources:
+            print(f"       {s.metric}: {', '.join(s.rule['keep_tags']) or '-'}")
+    if aggregations:
+        print("\n   recording rules (monitoring/prometheus/rules/):")
+        print(''.join(f"       {line}\n" for line in dump_yaml(aggregations).splitlines()), end='')
+else:
+    print(f"\n✓ No label has ≥{args.threshold} values on one metric")
+
+if args.max_series is not None:
+    over = [p for p in panels if p.series > args.max_series]
+    if over:
+        print(f"\n❌ {len(over)} panels touch more than {args.max_series:,} series")
+        sys.exit(1)
+    print(f"\n✓ Every panel touches at most {args.max_series:,} series")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Rebuild the generated dashboards whose inputs changed (panel additions, then DEMO and MEGA)"""
+
+import argparse
+import os
+import sys
+import time
+
+from dashboard_build import BUILD_STEPS, CACHE_FILE, build, watch
+from dashboard_utils import REPO_ROOT
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('steps', nargs='*', metavar='STEP',
+                    help=f"Steps to consider (default: all): {', '.join(s.name for s in BUILD_STEPS)}")
+parser.add_argument('--force', action='store_true', help='Run every step even if nothing changed')
+parser.add_argument('--clean', action='store_true', help=f'Delete the build cache ({CACHE_FILE.name}) first')
+parser.add_argument('--watch', action='store_true',
+                    help='Keep running and rebuild as soon as a source dashboard or script changes')
+parser.add_argument('--interval', type=float, default=0.2, help='Seconds between change checks in --watch (default: 0.2)')
+parser.add_argument('--verbose', '-v', action='store_true', help="Show each step's own output")
+args = parser.parse_args()
+
+unknown = set(args.steps) - {s.name for s in BUILD_STEPS}
+if unknown:
+    parser.error(f"unknown step(s): {', '.join(sorted(unknown))}")
+steps = [s for s in BUILD_STEPS if not args.steps or s.name in args.steps]
+
+if args.clean and CACHE_FILE.exists():
+    CACHE_FILE.unlink()
+
+
+def report(results):
+    failed = False
+    for result in results:
+        if not result.ran:
+            print(f"   · {result.step.name}: up to date")
+            continue
+        if not result.ok:
+            failed = True
+            print(f"   ❌ {result.step.name} failed ({result.reason}):")
+            print(''.join(f"      {line}\n" for line in result.output.rstrip().splitlines()), end='')
+            continue
+        written = ', '.join(os.path.relpath(p, REPO_ROOT) for p in result.writes) or 'nothing written'
+        print(f"   ✓ {result.step.name} ({result.reason}) in {result.seconds * 1000:.0f} ms → {written}")
+        if args.verbose:
+            print(''.join(f"      {line}\n" for line in result.output.rstrip().splitlines()), end='')
+    return failed
+
+
+if args.watch:
+    print(f"👀 Watching {len(steps)} build steps (Ctrl+C to stop)")
+
+    def on_build(results):
+        print(f"\n🔄 {time.strftime('%H:%M:%S')}")
+        report(results)
+
+    try:
+        watch(steps, args.interval, on_build)
+    except KeyboardInterrupt:
+        print("\n✓ Stopped watching")
+    sys.exit(0)
+
+started = time.perf_counter()
+print(f"📁 Building {len(steps)} steps")
+failed = report(build(steps, force=args.force))
+print("\n" + "=" * 70)
+print("❌ BUILD FAILED" if failed else f"✓ DASHBOARDS UP TO DATE ({(time.perf_counter() - started) * 1000:.0f} ms)")
+print("=" * 70)
+sys.exit(1 if failed else 0)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Write the downsampled recording rules the long-range (-24h, -7d) dashboard variants read"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, dashboard_files
+from long_range import EVALUATION_INTERVAL, LONG_RANGE_RULES_FILE, collect_rules, is_long_range, write_long_range_rules
+from recording_rules import load_dashboards
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-file', type=Path, default=LONG_RANGE_RULES_FILE, help='Recording rules file to write')
+parser.add_argument('--dry-run', action='store_true', help='Report the rules without writing the file')
+args = parser.parse_args()
+
+dashboards = {name: d for name, d in load_dashboards(dashboard_files(args.dashboards_dir)).items() if is_long_range(d)}
+if not dashboards:
+    print(f"❌ No long-range dashboards in {args.dashboards_dir} - run create-demo-dashboard.py / create-mega-dashboard.py first")
+    sys.exit(1)
+
+print(f"📁 Collecting downsampled series from {len(dashboards)} long-range dashboards")
+rules = collect_rules(dashboards.values())
+if not args.dry_run:
+    write_long_range_rules(rules, args.rules_file)
+
+print("\n" + "=" * 70)
+print("✓ LONG-RANGE RULES COMPILED" + (" (dry run)" if args.dry_run else ""))
+print("=" * 70)
+print(f"  Dashboards: {', '.join(sorted(name[:-len('.json')] for name in dashboards))}")
+print(f"  Recording rules: {len(rules)} (evaluated every {EVALUATION_INTERVAL})")
+print(f"  Rules file: {args.rules_file}")
+for rule in sorted(rules.values(), key=lambda r: -r.occurrences):
+    print(f"   {rule.occurrences:>3}x  {rule.record}")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Compile repeated dashboard subexpressions into Prometheus recording rules and rewrite the panels"""
+
+import argparse
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, dashboard_files, rewrite_exprs_in_place
+from recording_rules import RULES_FILE, compile_rules, load_dashboards, load_rules, referenced_metrics, write_rules
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-file', type=Path, default=RULES_FILE, help='Recording rules file to write')
+parser.add_argument('--min-occurrences', type=int, default=2,
+                    help='Only record subexpressions used at least this many times (default: 2)')
+parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing files')
+args = parser.parse_args()
+
+paths = dashboard_files(args.dashboards_dir)
+dashboards = load_dashboards(paths)
+existing = load_rules(args.rules_file)
+
+print(f"📁 Compiling {len(paths)} dashboards ({len(existing)} existing rules)")
+rules, rewrites = compile_rules(
+    dashboards,
+    existing=existing,
+    min_occurrences=args.min_occurrences,
+    extra_references=referenced_metrics(args.rules_file.parent, exclude=args.rules_file),
+)
+
+total_rewritten = 0
+for path in paths:
+    mapping = rewrites.get(path.name, {})
+    if not mapping:
+        continue
+    count = sum(1 for _ in mapping) if args.dry_run else rewrite_exprs_in_place(path, mapping)
+    total_rewritten += count
+    print(f"   ✓ {path.name}: {count} expressions rewritten")
+
+if not args.dry_run:
+    write_rules(rules, args.rules_file)
+
+print("\n" + "=" * 70)
+print("✓ RECORDING RULES COMPILED" + (" (dry run)" if args.dry_run else ""))
+print("=" * 70)
+print(f"  Recording rules: {len(rules)}")
+print(f"  Expressions rewritten: {total_rewritten}")
+print(f"  Rules file: {args.rules_file}")
+for rule in sorted(rules.values(), key=lambda r: -r.occurrences):
+    print(f"   {rule.occurrences:>3}x  {rule.record}")
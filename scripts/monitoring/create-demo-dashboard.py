@@ -1,26 +1,105 @@
 #!/usr/bin/env python3
 """Create a comprehensive demo dashboard with all widgets organized into sections"""
 
-import json
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_fleet import FleetTarget, retarget_dashboards
+from dashboard_layout import above_the_fold, arrange_by_cost, collapse_sections
+from dashboard_utils import DASHBOARDS_DIR, load_dashboard, save_dashboard
+from dashboard_variables import apply_template_variables
+from library_panels import LIBRARY_DIR, extract_library_panels, link, save_library_panels
+from long_range import link_variants, long_range_variants
+from native_histograms import NATIVE_RULES_FILE, apply_native_histograms, write_native_rules
+from panel_builder import elide_dashboard_defaults
+from query_consolidation import consolidate_queries
+from query_cost import check_budget, load_budgets
+from query_dedup import deduplicate_queries, inline_shared_queries
+from query_resolution import apply_query_resolution
+from refresh_tiers import apply_query_caching, format_query_rates, split_by_tier
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--no-dedupe', action='store_true',
+                    help='Keep duplicate queries instead of sharing results via the -- Dashboard -- datasource')
+parser.add_argument('--no-variables', action='store_true',
+                    help='Leave out the $job/$instance/$environment/$http_route variables and query scoping')
+parser.add_argument('--no-consolidate', action='store_true',
+                    help='Keep one query per status code/method instead of a single grouped query')
+parser.add_argument('--fixed-resolution', action='store_true',
+                    help='Keep the hardcoded [1m] windows and Grafana default steps instead of instant single-value '
+                         'queries, per-panel maxDataPoints and $__rate_interval')
+parser.add_argument('--native-histograms', action='store_true',
+                    help='Read latency histograms as native histograms (Telemetry:Metrics:NativeHistograms in the '
+                         'services) instead of classic _bucket/_count/_sum series')
+parser.add_argument('--keep-defaults', action='store_true',
+                    help='Write every panel field, including the ones equal to the Grafana plugin defaults')
+parser.add_argument('--ignore-budget', action='store_true',
+                    help='Write the dashboard even if it exceeds its query budget (query-budgets.yml)')
+parser.add_argument('--refresh-tiers', choices=['split', 'cache', 'off'], default='split',
+                    help='split: move warm/cold panels to linked -warm/-cold dashboards with a slower refresh; '
+                         'cache: keep them in place with per-panel query caching (Grafana Enterprise/Cloud); '
+                         'off: refresh everything at 5s (default: split)')
+parser.add_argument('--no-long-range', action='store_true',
+                    help='Skip the -24h/-7d variants that read downsampled recording rules')
+parser.add_argument('--sections', choices=['rows', 'text'], default='rows',
+                    help='rows: Grafana rows, collapsed unless expanded by default (lazily queried); '
+                         'text: markdown headers with every panel loaded (default: rows)')
+parser.add_argument('--source-layout', action='store_true',
+                    help='Keep panels in source order instead of cheapest-first within each section')
+parser.add_argument('--expand', action='append', metavar='SECTION',
+                    help='Section to keep open on the main dashboard (repeatable; overrides EXPANDED_SECTIONS)')
+parser.add_argument('--library-panels', action='store_true',
+                    help='Reference the source panels as Grafana library panels instead of copying them '
+                         '(publish them with publish-library-panels.py)')
+parser.add_argument('--library-dir', type=Path, default=LIBRARY_DIR,
+                    help='Directory to write the library panel models to (with --library-panels)')
+parser.add_argument('--environment', help='Fleet mode: retarget the dashboards at one environment (see generate-fleet-dashboards.py)')
+parser.add_argument('--service', help='Fleet mode: retarget the dashboards at one service of --environment')
+parser.add_argument('--job', help='Fleet mode: scrape job of --service (default: the service name)')
+parser.add_argument('--output-dir', type=Path, default=DASHBOARDS_DIR, help='Directory to write the dashboards to')
+parser.add_argument('--native-rules-file', type=Path,
+                    help='Rules file for the native histogram rates (with --native-histograms; default: '
+                         'monitoring/prometheus/rules/ for the repo\'s dashboards, else next to the dashboards)')
+args = parser.parse_args()
+# Out-of-tree runs must not overwrite the rules the repo's Prometheus loads
+native_rules_file = args.native_rules_file or (
+    NATIVE_RULES_FILE if args.output_dir.resolve() == DASHBOARDS_DIR.resolve()
+    else args.output_dir / NATIVE_RULES_FILE.name)
+if args.service and not args.environment:
+    parser.error('--service needs --environment')
+
+# Sections open when each generated dashboard loads; every other section is a collapsed
+# row that sends no queries until someone expands it. Dashboards not listed keep all open.
+EXPANDED_SECTIONS = {
+    'bookstore-demo': ['Performance Testing', 'Errors & Diagnostics', 'LLM Performance'],
+}
+if args.expand:
+    EXPANDED_SECTIONS['bookstore-demo'] = args.expand
 
 # Load all existing dashboards to extract panels
 dashboards = {
-    'performance': '../../monitoring/grafana/dashboards/bookstore-performance.json',
-    'errors': '../../monitoring/grafana/dashboards/bookstore-errors-diagnostics.json',
-    'llm': '../../monitoring/grafana/dashboards/bookstore-llm-metrics.json',
-    'dotnet': '../../monitoring/grafana/dashboards/bookstore-dotnet-runtime.json',
-    'http': '../../monitoring/grafana/dashboards/bookstore-http-performance.json',
-    'threading': '../../monitoring/grafana/dashboards/bookstore-threading-concurrency.json',
-    'dependencies': '../../monitoring/grafana/dashboards/bookstore-dependencies.json',
-    'system': '../../monitoring/grafana/dashboards/bookstore-system-health.json',
+    'performance': DASHBOARDS_DIR / 'bookstore-performance.json',
+    'errors': DASHBOARDS_DIR / 'bookstore-errors-diagnostics.json',
+    'llm': DASHBOARDS_DIR / 'bookstore-llm-metrics.json',
+    'dotnet': DASHBOARDS_DIR / 'bookstore-dotnet-runtime.json',
+    'http': DASHBOARDS_DIR / 'bookstore-http-performance.json',
+    'threading': DASHBOARDS_DIR / 'bookstore-threading-concurrency.json',
+    'dependencies': DASHBOARDS_DIR / 'bookstore-dependencies.json',
+    'system': DASHBOARDS_DIR / 'bookstore-system-health.json',
 }
 
 # Read all dashboards
 all_panels = {}
 for name, path in dashboards.items():
-    with open(path, 'r') as f:
-        data = json.load(f)
-        all_panels[name] = data['panels']
+    source_dashboard = load_dashboard(path)
+    # Panels get new ids here, so readers of another panel's result run its query again
+    # until consolidate_queries/deduplicate_queries share it below
+    inline_shared_queries(source_dashboard)
+    all_panels[name] = source_dashboard['panels']
+    if args.library_panels:
+        for panel in all_panels[name]:
+            link(panel, source_dashboard)
 
 # Create demo dashboard
 demo_dashboard = {
@@ -287,12 +366,121 @@ if sys_mem_chart:
     panel_id += 1
     demo_dashboard['panels'].append(sys_mem_chart)
 
-# Write dashboard
-with open('../../monitoring/grafana/../../monitoring/grafana/dashboards/bookstore-demo.json', 'w') as f:
-    json.dump(demo_dashboard, f, indent=4)
+# Let viewers narrow every query to one job, instance, environment or route
+scoped_queries = 0 if args.no_variables else apply_template_variables(demo_dashboard)
+
+# Native-histogram mode: one series per label set instead of one per bucket
+native_queries, classic_queries = apply_native_histograms(demo_dashboard) if args.native_histograms else (0, 0)
+
+# Copies for 24h/7d views that read downsampled recording rules instead of raw 15s samples
+long_range = [] if args.no_long_range else long_range_variants(demo_dashboard)
+
+# Give slow-changing panels (1h costs, 5m trends, tables) a slower refresh than the live panels
+cached_panels = 0
+if args.refresh_tiers == 'split':
+    output_dashboards = split_by_tier(demo_dashboard)
+else:
+    cached_panels = apply_query_caching(demo_dashboard) if args.refresh_tiers == 'cache' else 0
+    output_dashboards = [demo_dashboard]
+demo_dashboard = output_dashboards[0]
+live_dashboards = list(output_dashboards)
+link_variants(demo_dashboard, long_range)
+output_dashboards += long_range
+for variant in long_range:
+    EXPANDED_SECTIONS[variant['uid']] = EXPANDED_SECTIONS.get(demo_dashboard['uid'])
+
+consolidated_queries = queries_before = queries_after = reused_panels = collapsed_sections = 0
+instant_targets = capped_panels = rate_intervals = 0
+elided_fields = json_before = json_after = heavy_panels = 0
+
+# With text sections nothing is collapsed, so those dashboards have budgets of their own
+budgets = load_budgets(variant='text-sections' if args.sections == 'text' else None)
+for dashboard in output_dashboards:
+    # Real rows: collapsed sections only query once they are opened
+    if args.sections == 'rows':
+        collapsed_sections += collapse_sections(dashboard, EXPANDED_SECTIONS.get(dashboard['uid']))
+
+    # Cheap panels first in every section, heavy ones below the fold where Grafana queries them lazily
+    if not args.source_layout:
+        heavy_panels += arrange_by_cost(dashboard)
+
+    # Only the points each panel draws: instant last-value queries, maxDataPoints, $__rate_interval windows
+    if not args.fixed_resolution:
+        instant, capped, rate_interval = apply_query_resolution(dashboard)
+        instant_targets, capped_panels, rate_intervals = instant_targets + instant, capped_panels + capped, rate_intervals + rate_interval
+
+    # Replace per-label query variants (status codes, methods) with one grouped query each
+    if not args.no_consolidate:
+        consolidated_queries += consolidate_queries(dashboard)
+
+    # Run each distinct query once and let the other panels reuse its result
+    if not args.no_dedupe:
+        before, after, reused = deduplicate_queries(dashboard)
+        queries_before, queries_after, reused_panels = queries_before + before, queries_after + after, reused_panels + reused
+
+    # Refuse to write a dashboard that would cost Prometheus more than its budget
+    within_budget, cost_report = check_budget(dashboard, budgets)
+    if not within_budget:
+        print("\n" + cost_report)
+        if not args.ignore_budget:
+            print("\n❌ Query budget exceeded - dashboard not written (use --ignore-budget to override)")
+            sys.exit(1)
+
+    # Leave out fields Grafana fills in from the panel plugin defaults anyway
+    if not args.keep_defaults:
+        removed, before, after = elide_dashboard_defaults(dashboard)
+        elided_fields, json_before, json_after = elided_fields + removed, json_before + before, json_after + after
+
+# What the first viewport of the main dashboard queries before anyone scrolls
+fold_panels, fold_cost, fold_heavy = above_the_fold(output_dashboards[0])
+
+# Library-panel mode: keep only a reference to each source panel, write the models once
+query_rates = format_query_rates(live_dashboards)
+library_elements = {}
+if args.library_panels:
+    for dashboard in output_dashboards:
+        library_elements.update(extract_library_panels(dashboard))
+    save_library_panels(library_elements, args.library_dir)
+
+# Fleet mode: same dashboards, own uids and titles, variables defaulting to the target
+if args.environment:
+    retarget_dashboards(output_dashboards, FleetTarget(args.environment, args.service, args.job or args.service))
+
+# Write the demo dashboard, its linked refresh-tier dashboards and the long-range variants
+for dashboard in output_dashboards:
+    save_dashboard(dashboard, args.output_dir / f"{dashboard['uid']}.json")
+native_rule_count = write_native_rules(path=native_rules_file) if args.native_histograms else 0
 
 print("✓ Created comprehensive demo dashboard")
 print(f"  Total panels: {len(demo_dashboard['panels'])}")
+if not args.no_variables:
+    print(f"  Template variables: $job, $instance, $environment, $http_route ({scoped_queries} queries scoped)")
+if args.native_histograms:
+    print(f"  Native histograms: {native_queries} queries rewritten"
+          + (f", {classic_queries} still read classic buckets" if classic_queries else "")
+          + f" ({native_rule_count} native rates recorded in {native_rules_file})")
+if not args.fixed_resolution:
+    print(f"  Query resolution: {instant_targets} instant last-value queries, {capped_panels} panels with maxDataPoints, "
+          f"{rate_intervals} queries on $__rate_interval")
+if not args.no_consolidate:
+    print(f"  Grouped queries: {consolidated_queries} per-label queries folded into grouped ones")
+if not args.no_dedupe:
+    print(f"  Prometheus queries: {queries_before} → {queries_after} ({reused_panels} panels reuse results via -- Dashboard --)")
+if not args.keep_defaults:
+    print(f"  JSON size: {json_before / 1024:.0f} KB → {json_after / 1024:.0f} KB ({elided_fields} default fields left out)")
+if args.library_panels:
+    print(f"  Library panels: {len(library_elements)} referenced, models in {args.library_dir}")
+print(f"  Above the fold: {fold_panels} panels, ~{fold_cost:,.0f} sample reads per refresh, {fold_heavy} heavy"
+      + ("" if args.source_layout else f" ({heavy_panels} heavy panels placed last in their group)"))
+if args.sections == 'rows':
+    print(f"  Collapsed sections: {collapsed_sections} (queried only when expanded)")
+if cached_panels:
+    print(f"  Cached panels: {cached_panels} (queryCachingTTL per refresh tier)")
+for linked in output_dashboards[1:]:
+    print(f"  Linked dashboard: {linked['title']} (refresh {linked['refresh']}) - /d/{linked['uid']}")
+if long_range:
+    print("  Long-range variants read downsampled rules - run compile-long-range-rules.py after changing queries")
+print(query_rates)
 print(f"  Sections: 8 (Performance, Errors, LLM, .NET, HTTP, Threading, Dependencies, System)")
 print(f"  Dashboard height: ~{current_y + 8} pixels")
-print("  Access at: http://localhost:3000/d/bookstore-demo")
+print(f"  Access at: http://localhost:3000/d/{demo_dashboard['uid']}")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Incremental build of the generated dashboards.
+
+The build graph is source dashboards -> panel additions (add-*.py, which edit
+a source in place and emit the recorded series) -> recording rules (which
+rewrite every dashboard onto them) -> composite dashboards (create-*.py) ->
+the downsampled rules their long-range variants read. Each step runs
+in-process and its file IO is traced through dashboard_utils, so the files a
+step reads and writes are discovered rather than declared. After a step runs
+the content hash of every file it touched (plus its script and the helper
+modules it imported) is stored in the cache; a step only runs again when one
+of those hashes changes. Steps run in graph order, so an edit to a source
+dashboard rebuilds the composites that read it, and a step that rewrites a
+file in place is not re-triggered by its own output.
+"""
+
+import contextlib
+import io
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import List
+
+from dashboard_utils import SCRIPT_DIR, content_hash, trace_io
+
+CACHE_FILE = SCRIPT_DIR / ".dashboard-build-cache.json"
+
+
+@dataclass
+class BuildStep:
+    name: str
+    script: str                    # file name in scripts/monitoring
+    args: List[str] = field(default_factory=list)
+
+    @property
+    def path(self):
+        return str(SCRIPT_DIR / self.script)
+
+
+# In dependency order: panel additions edit sources before the composites read them
+BUILD_STEPS = [
+    BuildStep('status-code-panels', 'add-status-code-panels.py'),
+    BuildStep('slo', 'generate-slo-rules.py'),
+    BuildStep('database-panels', 'add-database-panels.py'),
+    BuildStep('recording-rules', 'compile-recording-rules.py'),
+    BuildStep('demo', 'create-demo-dashboard.py'),
+    BuildStep('mega', 'create-mega-dashboard.py'),
+    BuildStep('long-range-rules', 'compile-long-range-rules.py'),
+]
+
+
+@dataclass
+class StepResult:
+    step: BuildStep
+    ran: bool
+    ok: bool = True
+    seconds: float = 0.0
+    output: str = ''
+    reason: str = ''
+    writes: List[str] = field(default_factory=list)
+
+
+def load_cache(path=CACHE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_FILE):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def _hash_or_none(path):
+    try:
+        return content_hash(path)
+    except OSError:
+        return None
+
+
+def stale_reason(step, cache):
+    """Why a step has to run, or None when every file it depends on is unchanged"""
+    entry = cache.get(step.name)
+    if entry is None:
+        return 'never built'
+    if entry.get('args') != step.args:
+        return 'arguments changed'
+    for path, digest in entry['files'].items():
+        if _hash_or_none(path) != digest:
+            return f"{os.path.relpath(path, SCRIPT_DIR.parent.parent)} changed"
+    return None
+
+
+def _local_modules():
+    return {name: module for name, module in sys.modules.items()
+            if os.path.dirname(os.path.abspath(getattr(module, '__file__', None) or '')) == str(SCRIPT_DIR)}
+
+
+def forget_changed_modules(cache):
+    """Drop every helper module from sys.modules once one was edited (watch mode runs in one process).
+
+    Modules import names from each other, so reloading just the edited one
+    would leave stale references behind; the next step re-imports them all.
+    """
+    loaded = cache.setdefault('_modules', {})
+    modules = _local_modules()
+    current = {name: _hash_or_none(module.__file__) for name, module in modules.items()}
+    if any(loaded.get(name) not in (None, digest) for name, digest in current.items()):
+        for name in modules:
+            if name not in ('__main__', __name__, 'dashboard_utils'):
+                del sys.modules[name]
+    loaded.update(current)
+
+
+def run_step(step, cache):
+    """Run one step in-process with traced IO and record what it touched"""
+    argv, sys.argv = sys.argv, [step.path] + step.args
+    output = io.StringIO()
+    started = time.perf_counter()
+    ok = True
+    with trace_io() as (reads, writes), contextlib.redirect_stdout(output):
+        try:
+            runpy.run_path(step.path, run_name='__main__')
+        except SystemExit as e:
+            ok = e.code in (None, 0)
+        except Exception:
+            ok = False
+            output.write(traceback.format_exc())
+    sys.argv = argv
+    seconds = time.perf_counter() - started
+
+    if ok:
+        modules = [m.__file__ for m in _local_modules().values()]
+        files = sorted(set(reads) | set(writes) | {step.path} | set(modules))
+        cache[step.name] = {'args': step.args, 'files': {p: _hash_or_none(p) for p in files}}
+    else:
+        cache.pop(step.name, None)
+    return StepResult(step, True, ok, seconds, output.getvalue(), writes=sorted(writes))
+
+
+def build(steps=None, force=False, cache=None):
+    """Run every stale step in order. Returns a StepResult per step."""
+    steps = steps or BUILD_STEPS
+    cache = load_cache() if cache is None else cache
+    results = []
+    for step in steps:
+        reason = 'forced' if force else stale_reason(step, cache)
+        if reason is None:
+            results.append(StepResult(step, False))
+            continue
+        result = run_step(step, cache)
+        result.reason = reason
+        results.append(result)
+        if not result.ok:
+            break
+    save_cache(cache)
+    return results
+
+
+def watch(steps=None, interval=0.2, on_build=None):
+    """Poll the cached inputs and rebuild stale steps until interrupted"""
+    steps = steps or BUILD_STEPS
+    cache = load_cache()
+    while True:
+        if any(stale_reason(step, cache) for step in steps):
+            forget_changed_modules(cache)
+            results = build(steps, cache=cache)
+            if on_build:
+                on_build(results)
+        time.sleep(interval)
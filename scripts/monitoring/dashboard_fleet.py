@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Fleet mode: one dashboard set per service and environment of an inventory.
+
+Every (service, environment) pair, plus every environment on its own
+(all services), gets its own copy of each generated dashboard set. The copies
+are the generator's normal output retargeted at the end: stable uids derived
+from the names, titles naming the target, and the `$job` / `$environment`
+variables defaulting to it. Each generator runs once; the retargeting and JSON
+writing is spread over a process pool. Output does not depend on the worker
+count or scheduling, so reruns are byte-for-byte identical.
+"""
+
+import copy
+import hashlib
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from dashboard_build import BuildStep, run_step
+from dashboard_utils import DASHBOARDS_DIR, SCRIPT_DIR, load_dashboard, load_yaml, save_dashboard
+
+INVENTORY_FILE = SCRIPT_DIR / "fleet-inventory.yml"
+FLEET_DIR = DASHBOARDS_DIR / "fleet"
+
+# Generator script and the uid of the dashboard it writes
+GENERATORS = {
+    'demo': ('create-demo-dashboard.py', 'bookstore-demo'),
+    'mega': ('create-mega-dashboard.py', 'bookstore-mega'),
+}
+
+MAX_UID_LENGTH = 40     # Grafana rejects longer uids
+
+
+@dataclass(frozen=True)
+class FleetTarget:
+    environment: str
+    service: Optional[str] = None    # None: every service in the environment
+    job: Optional[str] = None
+
+    @property
+    def name(self):
+        return f"{self.service}-{self.environment}" if self.service else self.environment
+
+
+def load_inventory(path=INVENTORY_FILE):
+    """FleetTargets for an inventory file, in a stable order"""
+    config = load_yaml(path)
+    environments = list(config.get('environments') or [])
+    targets = []
+    for environment in environments:
+        targets.append(FleetTarget(environment))
+        for service in config.get('services') or []:
+            if isinstance(service, str):
+                service = {'name': service}
+            if environment in (service.get('environments') or environments):
+                targets.append(FleetTarget(environment, service['name'], service.get('job', service['name'])))
+    return targets
+
+
+def _slug(text):
+    return re.sub(r'[^a-z0-9-]+', '-', text.lower()).strip('-')
+
+
+def fleet_uid(uid, target):
+    """Stable uid for a target's copy of a dashboard, hashed down to Grafana's length limit"""
+    suffix = uid[len('bookstore-'):] if uid.startswith('bookstore-') else uid
+    full = f"{_slug(target.name)}-{suffix}"
+    if len(full) <= MAX_UID_LENGTH:
+        return full
+    digest = hashlib.sha1(full.encode('utf-8')).hexdigest()[:8]
+    return f"{full[:MAX_UID_LENGTH - 9].rstrip('-')}-{digest}"
+
+
+def _pin_variable(dashboard, name, value):
+    for variable in dashboard.get('templating', {}).get('list', []):
+        if variable.get('name') == name:
+            variable['current'] = {"selected": True, "text": [value], "value": [value]}
+
+
+def retarget_dashboards(dashboards, target):
+    """Give a generated dashboard set (main plus linked tiers) its fleet uids, titles and defaults"""
+    uids = {d['uid']: fleet_uid(d['uid'], target) for d in dashboards}
+    label = f"{target.service} ({target.environment})" if target.service else f"{target.environment} (all services)"
+    for dashboard in dashboards:
+        dashboard['uid'] = uids[dashboard['uid']]
+        dashboard['title'] = f"{dashboard['title']} - {label}"
+        dashboard['tags'] = list(dashboard.get('tags', [])) + ['fleet', f"env-{target.environment}"] + (
+            [f"service-{target.service}"] if target.service else [])
+        for link in dashboard.get('links', []):
+            old = link.get('url', '').rsplit('/', 1)[-1]
+            if old in uids:
+                link['url'] = f"/d/{uids[old]}"
+                link['tooltip'] = link.get('tooltip', '').replace(' - refreshed', f" - {label} - refreshed")
+        _pin_variable(dashboard, 'environment', target.environment)
+        if target.job:
+            _pin_variable(dashboard, 'job', target.job)
+    return uids
+
+
+def base_steps(kinds, output_dir, extra_args=()):
+    """One ordinary generator run per dashboard kind, writing the base set to output_dir"""
+    return [BuildStep(kind, GENERATORS[kind][0], ['--output-dir', str(output_dir), *extra_args]) for kind in kinds]
+
+
+def _run(step):
+    return run_step(step, {})
+
+
+# Base dashboard sets loaded once per worker process: {kind: [dashboards]}
+_BASE_SETS = {}
+
+
+def _load_base_sets(paths_by_kind):
+    for kind, paths in paths_by_kind.items():
+        _BASE_SETS[kind] = [load_dashboard(path) for path in paths]
+
+
+def _write_target(job):
+    target, output_dir = job
+    written = []
+    for kind in sorted(_BASE_SETS):
+        dashboards = [copy.deepcopy(d) for d in _BASE_SETS[kind]]
+        retarget_dashboards(dashboards, target)
+        for dashboard in dashboards:
+            path = os.path.join(output_dir, f"{dashboard['uid']}.json")
+            save_dashboard(dashboard, path)
+            written.append(path)
+    return written
+
+
+def generate_fleet(targets, kinds, output_dir, workers=None, extra_args=()):
+    """Generate each kind's base set once, then retarget it for every target on a process pool.
+
+    Returns (base StepResults, {target: written paths}, seconds). Nothing is
+    retargeted if a base run fails (e.g. over its query budget).
+    """
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory() as base_dir, ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_run, base_steps(kinds, base_dir, extra_args)))
+        if not all(r.ok for r in results):
+            return results, {}, time.perf_counter() - started
+
+        # Main dashboard first, then its linked tiers, as the generators write them
+        paths = {r.step.name: sorted(r.writes, key=lambda p: (os.path.basename(p) != f"{GENERATORS[r.step.name][1]}.json", p))
+                 for r in results}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_base_sets, initargs=(paths,)) as writers:
+            jobs = [(target, str(output_dir)) for target in targets]
+            chunk = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+            written = dict(zip(targets, writers.map(_write_target, jobs, chunksize=chunk)))
+    return results, written, time.perf_counter() - started
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Section and grid layout helpers for the generated dashboards.
+
+The generators separate sections with full-width markdown headers
+(`# 📊 Performance Testing`). These helpers split a panel list into those
+sections, turn them into real Grafana rows, and re-pack panels on the
+24-column grid after panels have been moved around. arrange_by_cost orders
+each section by estimated query cost so the first viewport stays cheap.
+"""
+
+import statistics
+
+from dashboard_utils import iter_panels
+from query_cost import panel_cost, refresh_seconds, time_range_seconds
+
+GRID_COLUMNS = 24
+FOLD_HEIGHT = 24          # grid units visible without scrolling (38 px each, 1080p screen minus Grafana's chrome)
+HEAVY_FACTOR = 4          # panels costing this many times the dashboard's median panel are "heavy"
+SINGLE_VALUE_TYPES = ('stat', 'gauge', 'bargauge', 'text')
+
+
+def is_markdown_header(panel):
+    """The full-width `# title` text panels the generators put between sections"""
+    return (panel.get('type') == 'text' and panel.get('gridPos', {}).get('w') == GRID_COLUMNS
+            and panel.get('options', {}).get('content', '').startswith('# '))
+
+
+def is_section_header(panel):
+    return panel.get('type') == 'row' or is_markdown_header(panel)
+
+
+def section_title(header):
+    if header.get('type') == 'row':
+        return header.get('title', '')
+    return header['options']['content'][2:].strip()
+
+
+def reflow(panels, y=0, line_breaks=()):
+    """Re-pack panels left to right on the 24-column grid, starting each section on a new line.
+
+    Panels whose id is in line_breaks also start a new line. Returns the y
+    coordinate below the last panel.
+    """
+    x = line_height = 0
+    for panel in panels:
+        pos = panel['gridPos']
+        header = is_section_header(panel)
+        if header or x + pos['w'] > GRID_COLUMNS or (x and panel.get('id') in line_breaks):
+            y, x, line_height = y + line_height, 0, 0
+        panel['gridPos'] = dict(pos, x=x, y=y)
+        if not header:
+            x += pos['w']
+            line_height = max(line_height, pos['h'])
+            continue
+        y += pos['h']
+        if panel.get('panels'):
+            panel['panels'] = [dict(child) for child in panel['panels']]
+            end = reflow(panel['panels'], y, line_breaks)
+            if not panel.get('collapsed'):
+                y = end
+    return y + line_height
+
+
+def sections(panels):
+    """Split a panel list into (header, members, nested) tuples.
+
+    nested is True for rows that hold their members as children (collapsed
+    rows) rather than being followed by them.
+    """
+    result = [(None, [], False)]
+    for panel in panels:
+        if is_section_header(panel):
+            children = list(panel.get('panels', []))
+            result.append((panel, children, bool(children)))
+        else:
+            result[-1][1].append(panel)
+    return result
+
+
+def place_in_row(dashboard, title, panels, replaces):
+    """Put generated panels at the top of the row whose title contains `title`.
+
+    Panels matching `replaces` (a previous run's) are removed wherever they
+    are; the new ones are packed from just below the row, among its children
+    when it is collapsed, and everything further down moves by the change in
+    height. Running a generator again therefore leaves the dashboard as it
+    was. Returns False when the dashboard has no such row.
+    """
+    top = dashboard['panels']
+    row = next((p for p in top if p.get('type') == 'row' and title in p.get('title', '')), None)
+    if row is None:
+        return False
+    start = row['gridPos']['y'] + row['gridPos']['h']
+    index = top.index(row)
+    end = next((i for i in range(index + 1, len(top)) if top[i].get('type') == 'row'), len(top))
+    members = row.get('panels', []) if row.get('collapsed') else top[index + 1:end]
+    old_bottom = max((p['gridPos']['y'] + p['gridPos']['h'] for p in members if replaces(p)), default=start)
+    shift = reflow(panels, start) - old_bottom
+
+    def keep(siblings):
+        kept = []
+        for panel in siblings:
+            if replaces(panel):
+                continue
+            if panel is not row and panel['gridPos']['y'] >= start:
+                panel['gridPos']['y'] += shift
+            if panel.get('panels'):
+                panel['panels'] = keep(panel['panels'])
+            kept.append(panel)
+        return kept
+
+    dashboard['panels'] = keep(top)
+    if row.get('collapsed'):
+        row['panels'] = panels + row['panels']
+    else:
+        index = dashboard['panels'].index(row)
+        dashboard['panels'][index + 1:index + 1] = panels
+    return True
+
+
+def _sub_heading(row):
+    """Rows copied from a source dashboard cannot nest inside a section row; keep them as markdown sub-headings"""
+    return {
+        "gridPos": {"h": 2, "w": GRID_COLUMNS, "x": 0, "y": row['gridPos']['y']},
+        "id": row['id'],
+        "options": {"content": f"## {row.get('title', '')}", "mode": "markdown"},
+        "type": "text",
+        "transparent": True,
+    }
+
+
+def is_expanded(title, expanded):
+    """Whether a section title matches one of the configured names (case-insensitive substring); None opens all"""
+    return expanded is None or any(name.lower() in title.lower() for name in expanded)
+
+
+def collapse_sections(dashboard, expanded=None):
+    """Replace markdown section headers with Grafana rows.
+
+    Sections whose title matches a name in `expanded` (all of them when it is
+    None) stay open; every other section becomes a collapsed row holding its
+    panels, which Grafana only queries once the row is opened. Returns the
+    number of collapsed sections.
+    """
+    panels = []
+    collapsed = 0
+    current = None
+    for panel in dashboard.get('panels', []):
+        if is_markdown_header(panel):
+            title = section_title(panel)
+            current = {
+                "collapsed": not is_expanded(title, expanded),
+                "gridPos": {"h": 1, "w": GRID_COLUMNS, "x": 0, "y": panel['gridPos']['y']},
+                "id": panel['id'],
+                "panels": [],
+                "title": title,
+                "type": "row",
+            }
+            collapsed += current['collapsed']
+            panels.append(current)
+            continue
+        if panel.get('type') == 'row':
+            panel = _sub_heading(panel)
+        if current is not None and current['collapsed']:
+            current['panels'].append(panel)
+        else:
+            panels.append(panel)
+
+    dashboard['panels'] = panels
+    reflow(dashboard['panels'])
+    return collapsed
+
+
+def panel_costs(dashboard):
+    """Estimated sample reads per refresh for every panel, keyed by id() of the panel dict"""
+    range_seconds, refresh = time_range_seconds(dashboard), refresh_seconds(dashboard)
+    return {id(p): panel_cost(p, range_seconds, refresh).cost for p in iter_panels(dashboard.get('panels', []))}
+
+
+def heavy_cost(costs):
+    """Cost above which a panel counts as heavy"""
+    queried = [c for c in costs.values() if c > 0]
+    return HEAVY_FACTOR * statistics.median(queried) if queried else 0.0
+
+
+def is_sub_heading(panel):
+    """The `## title` text panels that replace source-dashboard rows inside a section"""
+    return (panel.get('type') == 'text' and panel.get('gridPos', {}).get('w') == GRID_COLUMNS
+            and panel.get('options', {}).get('content', '').startswith('## '))
+
+
+def _split(panels, is_header):
+    """[(header or None, members)] split at every panel matching is_header"""
+    groups = [(None, [])]
+    for panel in panels:
+        if is_header(panel):
+            groups.append((panel, []))
+        else:
+            groups[-1][1].append(panel)
+    return [g for g in groups if g[0] is not None or g[1]]
+
+
+def arrange_by_cost(dashboard):
+    """Order every section cheap-first and re-pack it; sections keep their place and their members.
+
+    Inside a section, sub-sections (the source dashboards' own rows) made only
+    of cheap panels come first, then the others by their most expensive panel.
+    Inside each group single-value panels (stat, gauge) come first so they
+    pack into full lines, then the other cheap panels, both in source order;
+    heavy panels (quantiles over histograms, long ranges) come last, by
+    ascending cost, starting on a new grid line. The first viewport then holds
+    the cheap panels, and Grafana only queries the heavy ones once they are
+    scrolled into view. Run it after collapse_sections(). Returns the number
+    of heavy panels.
+    """
+    costs = panel_costs(dashboard)
+    limit = heavy_cost(costs)
+    line_breaks = set()
+
+    def panel_key(item):
+        index, panel = item
+        cost = costs[id(panel)]
+        heavy = cost > limit
+        return heavy, cost if heavy else 0, panel.get('type') not in SINGLE_VALUE_TYPES, index
+
+    def arrange(members):
+        result = []
+        groups = _split(members, lambda p: p.get('type') == 'row' or is_sub_heading(p))
+
+        def group_key(item):
+            index, (header, panels) = item
+            peak = max((costs[id(p)] for p in panels), default=0)
+            # Panels before the first sub-heading belong to the section itself and stay on top
+            return header is not None, peak > limit, peak if peak > limit else 0, index
+
+        for _, (header, panels) in sorted(enumerate(groups), key=group_key):
+            if header is not None:
+                result.append(header)
+            ordered = [panel for _, panel in sorted(enumerate(panels), key=panel_key)]
+            heavy = [p for p in ordered if costs[id(p)] > limit]
+            if heavy:
+                line_breaks.add(heavy[0].get('id'))
+            result.extend(ordered)
+        return result
+
+    panels = dashboard.get('panels', [])
+    markdown = any(is_markdown_header(p) for p in panels)
+    is_top = is_markdown_header if markdown else (lambda p: p.get('type') == 'row')
+    arranged = []
+    for header, members in _split(panels, is_top):
+        if header is not None:
+            arranged.append(header)
+            if header.get('panels'):
+                header['panels'] = arrange(header['panels'])
+        arranged.extend(arrange(members))
+    dashboard['panels'] = arranged
+    reflow(dashboard['panels'], line_breaks=line_breaks)
+    return sum(cost > limit for cost in costs.values())
+
+
+def above_the_fold(dashboard, fold=FOLD_HEIGHT):
+    """(panels, estimated cost, heavy panels) Grafana queries on open before anyone scrolls"""
+    costs = panel_costs(dashboard)
+    limit = heavy_cost(costs)
+    # Children of collapsed rows are nested in the row, so only top-level panels can be on screen
+    visible = [p for p in dashboard.get('panels', [])
+               if p.get('type') != 'row' and p.get('gridPos', {}).get('y', 0) < fold]
+    visible_costs = [costs[id(p)] for p in visible]
+    return len(visible), sum(visible_costs), sum(c > limit for c in visible_costs)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Shared paths and helpers for loading, walking and saving Grafana dashboards"""
+
+import glob
+import hashlib
+from contextlib import contextmanager
+import json
+import os
+import pickle
+from pathlib import Path
+
+import yaml
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPT_DIR.parent.parent
+DASHBOARDS_DIR = REPO_ROOT / "monitoring/grafana/dashboards"
+DATASOURCES_DIR = REPO_ROOT / "monitoring/grafana/datasources"
+PROMETHEUS_DIR = REPO_ROOT / "monitoring/prometheus"
+PROMETHEUS_CONFIG = PROMETHEUS_DIR / "prometheus.yml"
+RULES_DIR = PROMETHEUS_DIR / "rules"
+
+
+def dashboard_files(directory=DASHBOARDS_DIR):
+    """All dashboard JSON files in a directory, sorted by name"""
+    return [Path(p) for p in sorted(glob.glob(str(Path(directory) / "*.json")))]
+
+
+# Files read and written while trace_io() is active (see dashboard_build.py)
+_TRACES = []
+
+
+@contextmanager
+def trace_io():
+    """Record the files loaded and saved through these helpers: yields (reads, writes) sets of paths"""
+    trace = (set(), set())
+    _TRACES.append(trace)
+    try:
+        yield trace
+    finally:
+        _TRACES.remove(trace)
+
+
+def _traced(path, index):
+    for trace in _TRACES:
+        trace[index].add(os.path.abspath(path))
+
+
+# Content hashes keyed by path, reused while (mtime, size) is unchanged
+_HASHES = {}
+# Parsed dashboards keyed by content hash, stored pickled so every caller gets its own copy
+_PARSED = {}
+
+
+def content_hash(path):
+    """SHA-256 of a file's bytes; only re-read when its mtime or size changes"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cached = _HASHES.get(path)
+    if cached and cached[0] == (st.st_mtime_ns, st.st_size):
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _HASHES[path] = ((st.st_mtime_ns, st.st_size), digest)
+    return digest
+
+
+def load_dashboard(path):
+    """Parse a dashboard file; unchanged content is served from a cache by content hash"""
+    _traced(path, 0)
+    digest = content_hash(path)
+    if digest not in _PARSED:
+        with open(path, 'r', encoding='utf-8') as f:
+            _PARSED[digest] = pickle.dumps(json.load(f), pickle.HIGHEST_PROTOCOL)
+    return pickle.loads(_PARSED[digest])
+
+
+def save_dashboard(dashboard, path):
+    _traced(path, 1)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dashboard, f, indent=2)
+
+
+def iter_panels(panels):
+    """Yield every panel, including the ones nested inside collapsed rows"""
+    for panel in panels:
+        yield panel
+        yield from iter_panels(panel.get('panels', []))
+
+
+def iter_targets(dashboard):
+    """Yield (panel, target) for every PromQL target in a dashboard"""
+    for panel in iter_panels(dashboard.get('panels', [])):
+        for target in panel.get('targets', []):
+            if target.get('expr'):
+                yield panel, target
+
+
+def rewrite_exprs_in_place(path, replacements):
+    """Replace target expressions in a dashboard file without reformatting it.
+
+    The provisioned dashboards are a mix of hand-edited and generated files with
+    different indentation, so this swaps only the encoded `expr` strings instead
+    of re-serialising the whole document. Returns the number of replacements.
+    """
+    _traced(path, 0)
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    count = 0
+    for old, new in replacements.items():
+        if old == new:
+            continue
+        for ensure_ascii in (True, False):
+            for sep in (': ', ':'):
+                needle = f'"expr"{sep}{json.dumps(old, ensure_ascii=ensure_ascii)}'
+                hits = text.count(needle)
+                if hits:
+                    text = text.replace(needle, f'"expr"{sep}{json.dumps(new, ensure_ascii=ensure_ascii)}')
+                    count += hits
+
+    if count:
+        _traced(path, 1)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return count
+
+
+class _NoAliasDumper(yaml.SafeDumper):
+    """SafeDumper writing shared objects (e.g. one labels dict on several rules) out in full, never as &id001/*id001"""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+def dump_yaml(data, header=None):
+    """Render YAML in document order, long PromQL strings on one line"""
+    text = yaml.dump(data, Dumper=_NoAliasDumper, sort_keys=False, indent=2, width=float('inf'), allow_unicode=True)
+    if header:
+        text = ''.join(f'# {line}\n' if line else '#\n' for line in header.splitlines()) + text
+    return text
+
+
+def load_yaml(path):
+    _traced(path, 0)
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or {}
+
+
+def write_yaml(data, path, header=None):
+    _traced(path, 1)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(dump_yaml(data, header))
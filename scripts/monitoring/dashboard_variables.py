@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Template variables that scope every panel query to the series a viewer picked.
+
+The generated dashboards get `$job`, `$instance`, `$environment` and
+`$http_route` variables, and each PromQL selector gets a `label=~"$var"`
+matcher for every variable whose label the series carries. With "All"
+selected the matcher is `=~".*"`, which Prometheus drops without touching
+the index, so the default view costs the same as before.
+
+Recorded series only carry the labels their rule keeps, so a variable is only
+injected where the recording rule's `by (...)` clause preserves its label;
+elsewhere a filter would silently return nothing.
+"""
+
+import promql
+from dashboard_utils import RULES_DIR, iter_targets
+from metric_references import recording_rules
+
+PROMETHEUS_DATASOURCE = {"type": "prometheus"}
+
+# (variable name, label, display name, label_values() query)
+VARIABLES = [
+    ('job', 'job', 'Job', 'label_values(up, job)'),
+    ('instance', 'instance', 'Instance', 'label_values(up{job=~"$job"}, instance)'),
+    ('environment', 'environment', 'Environment', 'label_values(up{job=~"$job"}, environment)'),
+    ('http_route', 'http_route', 'Route',
+     'label_values(http_server_request_duration_seconds_count{job=~"$job", instance=~"$instance"}, http_route)'),
+]
+
+# Scrape labels every raw series carries
+TARGET_VARIABLES = ['job', 'instance', 'environment']
+
+# Raw metrics that carry an http_route label (ASP.NET Core server metrics)
+ROUTE_METRIC_PREFIXES = ('http_server_request_', 'aspnetcore_routing_')
+
+
+def template_variables():
+    """Grafana templating list for VARIABLES, each multi-value with an "All" option"""
+    variables = []
+    for name, _, label, query in VARIABLES:
+        variables.append({
+            "allValue": ".*",
+            "current": {"selected": True, "text": ["All"], "value": ["$__all"]},
+            "datasource": dict(PROMETHEUS_DATASOURCE),
+            "definition": query,
+            "hide": 0,
+            "includeAll": True,
+            "label": label,
+            "multi": True,
+            "name": name,
+            "options": [],
+            "query": {"query": query, "refId": "PrometheusVariableQueryEditor-VariableQuery"},
+            "refresh": 1,
+            "regex": "",
+            "skipUrlSync": False,
+            "sort": 1,
+            "type": "query",
+        })
+    return variables
+
+
+def _output_labels(node, labels):
+    """Labels an expression's result can carry (None: every label of its input)"""
+    node = promql.strip_parens(node)
+    if isinstance(node, promql.Aggregation):
+        return None if node.without else set(node.grouping or [])
+    if isinstance(node, promql.Number) or (isinstance(node, promql.Call) and node.func == 'vector'):
+        return set()
+    if isinstance(node, promql.Selector):
+        return labels.get(node.metric)
+    if isinstance(node, promql.Call) and node.args and node.func in promql.RANGE_FUNCTIONS:
+        return _output_labels(node.args[0], labels)
+    if isinstance(node, promql.BinaryOp):
+        lhs, rhs = (_output_labels(side, labels) for side in (node.lhs, node.rhs))
+        if node.op == 'or':
+            return None if lhs is None or rhs is None else lhs | rhs
+        # Against a number the vector side's labels survive; otherwise the "one" side of the match
+        if isinstance(promql.strip_parens(node.lhs), promql.Number):
+            return rhs
+        return rhs if node.group == 'group_right' else lhs
+    return None
+
+
+def recorded_labels(rules_dir=RULES_DIR):
+    """{recorded series: labels it keeps, or None when the rule keeps every label}"""
+    rules = recording_rules(rules_dir)
+    labels = {}
+    # Rules may read other recorded series; resolve until nothing changes
+    for _ in range(len(rules) + 1):
+        resolved = {record: _output_labels(node, labels) for record, (node, _) in rules.items()}
+        if resolved == labels:
+            break
+        labels = resolved
+    return labels
+
+
+def selector_variables(metric, recorded):
+    """Variables that apply to a selector reading `metric`"""
+    names = list(TARGET_VARIABLES)
+    if metric and metric.startswith(ROUTE_METRIC_PREFIXES):
+        names.append('http_route')
+    if metric in recorded:
+        kept = recorded[metric]
+        if kept is None:
+            source = metric.split(':')[1] if metric.count(':') == 2 else ''
+            return names + (['http_route'] if source.startswith(ROUTE_METRIC_PREFIXES) else [])
+        return [name for name in names + ['http_route'] if name in kept]
+    return names
+
+
+def scope_expression(expr, recorded):
+    """Add `label=~"$var"` matchers to every selector of an expression; returns the new text"""
+    node = promql.parse(expr)
+    labels = {name: label for name, label, _, _ in VARIABLES}
+
+    def scope(n):
+        if not isinstance(n, promql.Selector):
+            return None
+        present = {m.name for m in n.matchers}
+        for name in dict.fromkeys(selector_variables(n.metric, recorded)):
+            if labels[name] not in present:
+                n.matchers.append(promql.Matcher(labels[name], '=~', f'${name}'))
+        return n
+
+    return promql.format_expr(promql.transform(node, scope))
+
+
+def apply_template_variables(dashboard, rules_dir=RULES_DIR):
+    """Add the VARIABLES to a dashboard and scope every panel query with them.
+
+    Returns the number of expressions rewritten; unparsable ones are left alone.
+    """
+    existing = {v.get('name') for v in dashboard.setdefault('templating', {}).setdefault('list', [])}
+    dashboard['templating']['list'].extend(v for v in template_variables() if v['name'] not in existing)
+
+    recorded = recorded_labels(rules_dir)
+    scoped = 0
+    for _, target in iter_targets(dashboard):
+        try:
+            expr = scope_expression(target['expr'], recorded)
+        except promql.PromQLError:
+            continue
+        if expr != target['expr']:
+            target['expr'] = expr
+            scoped += 1
+    return scoped
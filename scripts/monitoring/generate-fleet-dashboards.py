@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Generate DEMO/MEGA dashboard sets for every service and environment in a fleet inventory, in parallel"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from dashboard_fleet import FLEET_DIR, GENERATORS, INVENTORY_FILE, generate_fleet, load_inventory
+from dashboard_utils import REPO_ROOT
+
+# Workers of a spawn-based process pool (macOS, Windows) re-import this script; only the parent runs it
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inventory', type=Path, default=INVENTORY_FILE,
+                        help='Services and environments (default: fleet-inventory.yml)')
+    parser.add_argument('--output-dir', type=Path, default=FLEET_DIR,
+                        help='Directory to write the dashboards to (default: monitoring/grafana/dashboards/fleet)')
+    parser.add_argument('--kind', action='append', choices=sorted(GENERATORS),
+                        help='Dashboard sets to generate (repeatable; default: all)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help=f'Parallel generator processes (default: {os.cpu_count()})')
+    parser.add_argument('--ignore-budget', action='store_true', help='Write dashboards that exceed their query budget')
+    parser.add_argument('--verbose', '-v', action='store_true', help="Show each generator run's own output")
+    args = parser.parse_args()
+
+    targets = load_inventory(args.inventory)
+    kinds = args.kind or sorted(GENERATORS)
+    extra = ['--ignore-budget'] if args.ignore_budget else []
+    print(f"📁 {len(targets)} fleet targets × {len(kinds)} dashboard sets on {args.workers} workers")
+
+    results, written, seconds = generate_fleet(targets, kinds, args.output_dir.resolve(), args.workers, extra)
+    failed = [r for r in results if not r.ok]
+    for result in results:
+        if args.verbose or not result.ok:
+            print(f"\n{'❌' if not result.ok else '✓'} {result.step.name}")
+            print(''.join(f"   {line}\n" for line in result.output.rstrip().splitlines()), end='')
+    if args.verbose:
+        for target, paths in written.items():
+            print(f"   ✓ {target.name}: {len(paths)} dashboards")
+    total = sum(len(paths) for paths in written.values())
+
+    print("\n" + "=" * 70)
+    print("❌ FLEET GENERATION FAILED" if failed else "✓ FLEET DASHBOARDS GENERATED")
+    print("=" * 70)
+    print(f"  Dashboards: {total} in {seconds:.1f}s ({total / seconds:.0f}/s)")
+    print(f"  Directory: {os.path.relpath(args.output_dir.resolve(), REPO_ROOT)}")
+    for result in failed:
+        print(f"  Failed: {result.step.name}")
+    sys.exit(1 if failed else 0)
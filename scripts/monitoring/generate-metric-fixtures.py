@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Generate synthetic OpenMetrics history for every metric the dashboards read (for promtool backfill)"""
+
+import argparse
+import os
+import random
+import time
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, RULES_DIR, dashboard_files
+from metric_fixtures import Scale, label_sets, plan_families, scrape_targets, series_count, write_family
+from metric_references import collect_references
+from recording_rules import load_dashboards
+
+defaults = Scale()
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--output', '-o', type=Path, default=Path('bookstore-fixtures.om'),
+                    help='OpenMetrics file to write (default: bookstore-fixtures.om)')
+parser.add_argument('--routes', type=int, default=defaults.routes, help=f'HTTP routes (default: {defaults.routes})')
+parser.add_argument('--status-codes', type=int, default=defaults.status_codes,
+                    help=f'Status codes per route (default: {defaults.status_codes})')
+parser.add_argument('--instances', type=int, default=defaults.instances,
+                    help=f'Instances per scrape job (default: {defaults.instances})')
+parser.add_argument('--hours', type=float, default=defaults.hours, help=f'Hours of history (default: {defaults.hours:g})')
+parser.add_argument('--interval', type=int, default=defaults.interval,
+                    help=f'Seconds between samples (default: {defaults.interval})')
+parser.add_argument('--label-values', type=int, default=defaults.label_values,
+                    help=f'Values for labels without known values (default: {defaults.label_values})')
+parser.add_argument('--multiply', type=int, default=1, help='Multiply routes and instances, e.g. 10 or 100')
+parser.add_argument('--end', type=int, help='Unix time of the last sample (default: now)')
+parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same file')
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-dir', type=Path, default=RULES_DIR, help='Directory of Prometheus rule files')
+parser.add_argument('--dry-run', action='store_true', help='Only print the metric families and series counts')
+args = parser.parse_args()
+
+scale = Scale(
+    routes=args.routes * args.multiply,
+    status_codes=args.status_codes,
+    instances=args.instances * args.multiply,
+    hours=args.hours,
+    interval=args.interval,
+    label_values=args.label_values,
+)
+end = args.end or int(time.time()) // scale.interval * scale.interval
+start = end - int(scale.hours * 3600 // scale.interval) * scale.interval
+
+references = collect_references(load_dashboards(dashboard_files(args.dashboards_dir)), args.rules_dir)
+families = plan_families(references)
+targets = scrape_targets(scale)
+total_series = series_count(families, targets, scale)
+samples_per_series = int(scale.hours * 3600 // scale.interval) + 1
+
+print(f"📁 {len(references)} metrics referenced by dashboards and rules → {len(families)} OpenMetrics families")
+print(f"   Scale: {scale.routes} routes × {scale.status_codes} status codes × {scale.instances} instances/job, "
+      f"{scale.hours:g}h at {scale.interval}s")
+for family in families.values():
+    combos = len(label_sets(family, scale)) * len(targets.get(family.job, []))
+    labels = ', '.join(family.labels) or '-'
+    print(f"   {combos:>8,}  {family.kind:<9} {family.name}  [{labels}]")
+print(f"   Series: {total_series:,}   Samples: {total_series * samples_per_series:,}")
+
+if args.dry_run:
+    raise SystemExit(0)
+
+rng = random.Random(args.seed)
+written = 0
+with open(args.output, 'w', encoding='utf-8', buffering=1 << 20) as out:
+    for family in families.values():
+        written += write_family(out, family, targets, scale, end, rng)
+    out.write("# EOF\n")
+
+print("\n" + "=" * 70)
+print("✓ FIXTURES WRITTEN")
+print("=" * 70)
+print(f"  File: {args.output} ({os.path.getsize(args.output) / 1e6:,.1f} MB, {written:,} samples)")
+print(f"  Time range: {start} → {end}")
+print("\n  Load into a TSDB, then backfill the recording rules the dashboards read:")
+print(f"    promtool tsdb create-blocks-from openmetrics {args.output} ./data")
+print(f"    promtool tsdb create-blocks-from rules --start {start} --end {end} "
+      f"--url http://localhost:9090 {args.rules_dir}/*.yml")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Write hashmod-sharded Prometheus configs, their rule split and the compose override for a target inventory"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, PROMETHEUS_CONFIG, REPO_ROOT, RULES_DIR, dashboard_files, dump_yaml, write_yaml
+from recording_rules import load_dashboards
+from scrape_sharding import INVENTORY_FILE, SHARDS_DIR, shard_documents
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--shards', type=int, help='Number of Prometheus shards (default: scrape-inventory.yml)')
+parser.add_argument('--inventory', type=Path, default=INVENTORY_FILE,
+                    help='Targets per scrape job (default: scrape-inventory.yml)')
+parser.add_argument('--config', type=Path, default=PROMETHEUS_CONFIG,
+                    help='Single-instance prometheus.yml the jobs and keep rules come from')
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-dir', type=Path, default=RULES_DIR, help='Directory of Prometheus rule files')
+parser.add_argument('--check', action='store_true', help='Exit 1 if the generated files are out of date instead of writing them')
+args = parser.parse_args()
+
+if args.shards is not None and args.shards < 1:
+    parser.error('--shards must be at least 1')
+
+dashboards = load_dashboards(dashboard_files(args.dashboards_dir))
+documents, assigned, metrics = shard_documents(dashboards, args.inventory, args.config, args.rules_dir, args.shards)
+shards = len(assigned)
+
+print(f"📁 {sum(len(targets) for targets in assigned.values())} targets over {shards} shards")
+for shard, targets in assigned.items():
+    print(f"   {'✓' if targets else '⚠️ '} shard {shard}: {len(targets)} targets")
+    for job, address in targets:
+        print(f"       {job}  {address}")
+rules = {path.name: sum(len(group['rules']) for group in document['groups'])
+         for path, (document, _) in documents.items() if 'groups' in document}
+
+stale = [path for path, (document, header) in documents.items()
+         if not path.exists() or path.read_text(encoding='utf-8') != dump_yaml(document, header)]
+# Shards dropped since the last run
+stale_shards = [path for path in SHARDS_DIR.glob('prometheus-shard-*.yml') if path not in documents]
+if args.check:
+    if stale or stale_shards:
+        for path in stale + stale_shards:
+            print(f"   ✗ {os.path.relpath(path, REPO_ROOT)}")
+        print("\n❌ Shard configs are out of date - run generate-scrape-shards.py")
+        sys.exit(1)
+    print("\n✓ Shard configs are up to date")
+    sys.exit(0)
+
+for path, (document, header) in documents.items():
+    write_yaml(document, path, header=header)
+for path in stale_shards:
+    path.unlink()
+
+print("\n" + "=" * 70)
+print("✓ SCRAPE SHARDS WRITTEN" if stale or stale_shards else "✓ SCRAPE SHARDS UNCHANGED")
+print("=" * 70)
+print(f"  Configs: {os.path.relpath(SHARDS_DIR, REPO_ROOT)}/ ({shards} shards + global)")
+print(f"  Rules: {', '.join(f'{name} {count}' for name, count in rules.items())}")
+print(f"  Federated metrics: {len(metrics)}")
+print("  Start: docker-compose -f docker-compose.perf.yml -f docker-compose.sharded.yml --profile observability up -d")
+for shard, targets in assigned.items():
+    if not targets:
+        print(f"  ⚠️  Shard {shard} has no targets - hashmod spreads few targets unevenly")
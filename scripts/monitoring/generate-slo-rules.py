@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Generate multi-window burn-rate SLO rules from slo-targets.yml and add SLO panels to the errors dashboard"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, load_dashboard, save_dashboard
+from panel_builder import layout
+from slo_rules import SLO_CONFIG, SLO_RULES_FILE, load_slos, rules_document, slo_panels, write_slo_rules
+
+SLO_PANEL_IDS = range(200, 204)     # row + 3 panels
+SLO_ROW_TITLE = "🎯 SLO Error Budget"
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--config', type=Path, default=SLO_CONFIG, help='SLO definitions (default: slo-targets.yml)')
+parser.add_argument('--rules-file', type=Path, default=SLO_RULES_FILE, help='Prometheus rules file to write')
+parser.add_argument('--dashboard', type=Path, default=DASHBOARDS_DIR / 'bookstore-errors-diagnostics.json',
+                    help='Dashboard that gets the SLO row (default: Errors & Diagnostics)')
+parser.add_argument('--no-panels', action='store_true', help='Only write the rules')
+args = parser.parse_args()
+
+try:
+    period, slos = load_slos(args.config)
+except (KeyError, ValueError) as e:
+    print(f"❌ {args.config.name}: {e}")
+    sys.exit(1)
+
+write_slo_rules(slos, period, args.rules_file)
+groups = rules_document(slos, period)['groups']
+records = sum(1 for g in groups for r in g['rules'] if 'record' in r)
+alerts = sum(1 for g in groups for r in g['rules'] if 'alert' in r)
+
+if not args.no_panels:
+    dashboard = load_dashboard(args.dashboard)
+
+    # Replace the SLO row from a previous run, and keep everything else right below it
+    dashboard['panels'] = [p for p in dashboard['panels'] if p.get('id') not in SLO_PANEL_IDS]
+    row = {"collapsed": False, "gridPos": {"h": 1, "w": 24, "x": 0, "y": 0}, "id": SLO_PANEL_IDS.start,
+           "panels": [], "title": SLO_ROW_TITLE, "type": "row"}
+    panels = layout(slo_panels(period), 1, SLO_PANEL_IDS.start + 1)
+    bottom = max(p['gridPos']['y'] + p['gridPos']['h'] for p in panels)
+    shift = bottom - min((p['gridPos']['y'] for p in dashboard['panels']), default=bottom)
+    for panel in dashboard['panels']:
+        panel['gridPos']['y'] += shift
+    dashboard['panels'] = [row] + panels + dashboard['panels']
+    save_dashboard(dashboard, args.dashboard)
+
+print("=" * 70)
+print("✓ SLO RULES GENERATED")
+print("=" * 70)
+for slo in slos:
+    print(f"   {slo.name:<24} {slo.describe()}")
+print(f"\n  Error budget period: {period}")
+print(f"  Recording rules: {records}, alerts: {alerts} (page: 1h/6h burn, ticket: 1d/3d burn)")
+print(f"  Rules file: {args.rules_file}")
+if not args.no_panels:
+    print(f"  Panels: '{SLO_ROW_TITLE}' row at the top of {args.dashboard.name}")
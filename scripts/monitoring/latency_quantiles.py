@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Latency panels that read a histogram's buckets once.
+
+A percentiles panel with one `histogram_quantile(q, rate(m_bucket[1m]))`
+target per quantile makes Prometheus scan every bucket series three times per
+step, for every viewer. Grafana cannot derive quantiles from bucket frames
+(no transformation interpolates a histogram), and PromQL re-reads the buckets
+for every histogram_quantile call, so latency_panels() splits the work:
+
+    heatmap    the one bucket query, `sum(rate(m_bucket[1m])) by (le)` in
+               heatmap format, showing the whole distribution
+    quantiles  one target reading `m:quantile_rate1m`, a recording rule per
+               quantile (labelled quantile="0.5", ...) evaluated once per
+               interval for all viewers instead of once per panel refresh,
+               over the bucket rates dashboard-recording-rules.yml records
+               (`m_bucket:rate1m`) rather than three more reads of the buckets
+
+The rules keep every label of the bucket series but `le`, so the dashboards'
+$job/$instance filters still apply and each series is the quantile the old
+per-series targets computed.
+"""
+
+from dashboard_utils import RULES_DIR, write_yaml
+from panel_builder import Target, heatmap, timeseries
+from recording_rules import load_rules, recorded_expr
+
+QUANTILE_RULES_FILE = RULES_DIR / "latency-quantile-rules.yml"
+QUANTILE_RULE_GROUP = "bookstore-latency-quantiles"
+QUANTILES = ['0.5', '0.95', '0.99']
+WINDOW = '1m'
+
+RULES_HEADER = """Generated by scripts/monitoring/add-database-panels.py - do not edit by hand.
+p50/p95/p99 of the histograms behind the latency panels, read by their quantile lines."""
+
+
+def quantile_record(family, window=WINDOW):
+    return f"{family}:quantile_rate{window}"
+
+
+def quantile_rules(families, window=WINDOW, rules=None):
+    """One recording rule per family and quantile, all of a family under one name.
+
+    Bucket rates already recorded in `rules` (default: dashboard-recording-rules.yml) are read from there.
+    """
+    rules = load_rules() if rules is None else rules
+    return [{'record': quantile_record(family, window),
+             'expr': recorded_expr(f"histogram_quantile({q}, rate({family}_bucket[{window}]))", rules),
+             'labels': {'quantile': q}}
+            for family in families for q in QUANTILES]
+
+
+def write_quantile_rules(families, path=QUANTILE_RULES_FILE, window=WINDOW, rules=None):
+    entries = quantile_rules(families, window, rules)
+    write_yaml({'groups': [{'name': QUANTILE_RULE_GROUP, 'rules': entries}]}, path, header=RULES_HEADER)
+    return len(entries)
+
+
+def latency_panels(title, family, legend, unit=None, window=WINDOW, **options):
+    """(quantile lines, heatmap of the bucket rates) for a histogram family; options go to timeseries()"""
+    quantiles = timeseries(f"{title} (Percentiles)", [Target(quantile_record(family, window), f"{{{{quantile}}}} - {legend}")],
+                           unit=unit, **options)
+    distribution = heatmap(f"{title} (Distribution)",
+                           [Target(f"sum(rate({family}_bucket[{window}])) by (le)", "{{le}}", format="heatmap")],
+                           unit=unit)
+    return quantiles, distribution
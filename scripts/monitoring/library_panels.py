@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Library-panel mode for the composite dashboards.
+
+Instead of carrying a copy of every source panel, a composite dashboard can
+reference Grafana library panels: the generator links each copied panel to
+its source (`link`), the usual pipeline runs on the full panel, and just
+before writing `extract_library_panels` replaces the panel with a
+`libraryPanel` reference and returns the model as a library element. The
+elements are written to LIBRARY_DIR in the /api/library-elements payload
+shape; Grafana cannot provision them from files, so publish-library-panels.py
+pushes them through the HTTP API.
+
+A library element is shared by every dashboard that references it, so its
+model must not depend on the composite it was built for: panels carrying
+`libraryPanel` are never rewritten to read another panel's results
+(query_dedup.py, query_consolidation.py), only their own queries change.
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import urllib.error
+import urllib.request
+
+from dashboard_utils import REPO_ROOT, dashboard_files, load_dashboard, save_dashboard
+
+LIBRARY_DIR = REPO_ROOT / "monitoring/grafana/library-panels"
+LIBRARY_PANEL_KIND = 1          # library-elements kind for panels (2 is variables)
+MAX_UID_LENGTH = 40             # Grafana rejects longer uids
+
+# Dashboard-only keys a library panel model leaves to the referencing dashboard
+_PLACEMENT_KEYS = ('gridPos', 'id', 'libraryPanel')
+
+
+def is_library_panel(panel):
+    return 'libraryPanel' in panel
+
+
+def library_uid(dashboard_uid, panel_id):
+    """Stable library panel uid for a source panel, hashed down to Grafana's length limit"""
+    full = f"{dashboard_uid}-{panel_id}"
+    if len(full) <= MAX_UID_LENGTH:
+        return full
+    digest = hashlib.sha1(full.encode('utf-8')).hexdigest()[:8]
+    return f"{full[:MAX_UID_LENGTH - 9].rstrip('-')}-{digest}"
+
+
+def link(panel, source_dashboard):
+    """Mark a copied panel as an instance of its source panel's library panel"""
+    if panel.get('type') == 'row' or 'id' not in panel:
+        return panel
+    uid = library_uid(source_dashboard['uid'], panel['id'])
+    # Names are unique per folder; the source id keeps same-titled panels apart
+    panel['libraryPanel'] = {"name": f"{panel.get('title') or panel['type']} ({source_dashboard['uid']}#{panel['id']})",
+                             "uid": uid}
+    return panel
+
+
+def _reference(panel):
+    reference = {"gridPos": panel['gridPos'], "id": panel['id'], "libraryPanel": panel['libraryPanel']}
+    if panel.get('title'):
+        reference["title"] = panel['title']
+    return reference
+
+
+def extract_library_panels(dashboard):
+    """Replace linked panels (rows included) with references. Returns {uid: library element}."""
+    elements = {}
+
+    def extract(panels):
+        for index, panel in enumerate(panels):
+            if panel.get('type') == 'row':
+                extract(panel.get('panels', []))
+            elif is_library_panel(panel):
+                model = {k: copy.deepcopy(v) for k, v in panel.items() if k not in _PLACEMENT_KEYS}
+                uid = panel['libraryPanel']['uid']
+                elements[uid] = {"uid": uid, "name": panel['libraryPanel']['name'], "kind": LIBRARY_PANEL_KIND,
+                                 "model": model}
+                panels[index] = _reference(panel)
+
+    extract(dashboard.get('panels', []))
+    return elements
+
+
+def save_library_panels(elements, directory=LIBRARY_DIR):
+    """Write one <uid>.json payload per element. Returns the paths written."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for uid in sorted(elements):
+        path = directory / f"{uid}.json"
+        save_dashboard(elements[uid], path)
+        paths.append(path)
+    return paths
+
+
+def load_library_panels(directory=LIBRARY_DIR):
+    return {e['uid']: e for e in map(load_dashboard, dashboard_files(directory))}
+
+
+class GrafanaClient:
+    """Just enough of the Grafana HTTP API to publish library panels"""
+
+    def __init__(self, url, user, password, timeout=10):
+        self.url = url.rstrip('/')
+        token = base64.b64encode(f"{user}:{password}".encode('utf-8')).decode('ascii')
+        self.headers = {"Authorization": f"Basic {token}", "Content-Type": "application/json",
+                        "Accept": "application/json"}
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        """(status, parsed JSON body); HTTP errors are returned, not raised"""
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.url + path, data=data, headers=self.headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b'null')
+            except ValueError:
+                return e.code, None
+
+    def folder_uid(self, title):
+        """uid of the folder with this title ('' for General, or when it does not exist yet)"""
+        status, folders = self.request('GET', '/api/folders')
+        if status != 200:
+            raise RuntimeError(f"GET /api/folders: HTTP {status}")
+        return next((f['uid'] for f in folders if f.get('title') == title), '')
+
+
+def publish(client, elements, folder_uid=''):
+    """Create or update every element. Returns {uid: 'created' | 'updated' | 'unchanged' | 'error: ...'}."""
+    outcome = {}
+    for uid in sorted(elements):
+        element = elements[uid]
+        status, existing = client.request('GET', f"/api/library-elements/{uid}")
+        if status == 404:
+            status, body = client.request('POST', '/api/library-elements', dict(element, folderUid=folder_uid))
+            action = 'created'
+        elif status == 200:
+            current = existing['result']
+            if current.get('name') == element['name'] and current.get('model') == element['model']:
+                outcome[uid] = 'unchanged'
+                continue
+            status, body = client.request('PATCH', f"/api/library-elements/{uid}",
+                                          dict(element, folderUid=current.get('folderUid', folder_uid),
+                                               version=current['version']))
+            action = 'updated'
+        else:
+            body = existing
+        if status == 200:
+            outcome[uid] = action
+        else:
+            outcome[uid] = f"error: HTTP {status} {(body or {}).get('message', '')}".rstrip()
+    return outcome
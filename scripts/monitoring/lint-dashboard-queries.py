@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Estimate the Prometheus cost of each dashboard and fail when one exceeds its query budget"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, dashboard_files, load_dashboard
+from query_cost import BUDGETS_FILE, analyze_dashboard, budget_for, format_report, load_budgets
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('dashboards', nargs='*', type=Path,
+                    help='Dashboard JSON files (default: every dashboard in --dashboards-dir)')
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--budgets', type=Path, default=BUDGETS_FILE, help='YAML file of per-dashboard budgets')
+parser.add_argument('--budget', type=float, help='Override every budget with this value')
+parser.add_argument('--top', type=int, default=5, help='Most expensive panels to list per dashboard (default: 5)')
+parser.add_argument('--verbose', '-v', action='store_true', help='List every finding instead of the first few per rule')
+args = parser.parse_args()
+
+budgets = load_budgets(args.budgets)
+paths = args.dashboards or dashboard_files(args.dashboards_dir)
+
+failed = []
+for path in paths:
+    analysis = analyze_dashboard(load_dashboard(path))
+    budget = args.budget if args.budget is not None else budget_for(analysis.uid, budgets)
+    errors = [f for p in analysis.panels for f in p.findings if f.severity == 'error']
+    over = analysis.load > budget
+    if over or errors:
+        failed.append(path.name)
+    status = "❌ OVER BUDGET" if over else ("❌ ERRORS" if errors else "✓ within budget")
+    print(format_report(analysis, budget, top=args.top, verbose=args.verbose))
+    print(f"   {status}\n")
+
+print("=" * 70)
+if failed:
+    print(f"❌ {len(failed)} of {len(paths)} dashboards failed the query budget: {', '.join(failed)}")
+    sys.exit(1)
+print(f"✓ All {len(paths)} dashboards are within their query budgets")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Long-range dashboard variants that read downsampled recording rules.
+
+The generated dashboards look at the last 2 minutes through `[1m]` windows,
+so opening one over 24h or 7d makes Prometheus scan every raw 15s sample of
+every series for every panel. Each variant here is a copy of a generated
+dashboard (uid `<uid>-24h`, `<uid>-7d`) whose queries are rewritten to:
+
+    1. resolve series recorded by dashboard-recording-rules.yml back to the
+       rate/increase they record,
+    2. widen every range window to the variant's resolution (5m, 1h), so a
+       step never skips samples, and turn irate into rate,
+    3. read the result from a downsampled recording rule instead:
+       sum(rate(m{...}[1h])) by (...) -> sum(instance_downsampled:m:rate1h{...}) by (...)
+
+Panels get the resolution as their min interval, so every step of a 7d
+range reads one recorded sample per series. compile-long-range-rules.py
+derives the rules (long-range-recording-rules.yml) from the variants that
+were written, the way compile-recording-rules.py does for the live panels;
+they are evaluated once a minute, well inside Prometheus' 5m lookback.
+"""
+
+import copy
+import dataclasses
+import re
+
+import promql
+from dashboard_utils import RULES_DIR, iter_panels, iter_targets, write_yaml
+from metric_references import expression_usage
+from native_histograms import native_rules
+from recording_rules import (COMPILABLE_FUNCTIONS, PRESERVED_LABELS, RULES_FILE, RecordingRule, find_candidates,
+                             load_rules, recorded_sources, rewrite_expr, unrecord)
+
+LONG_RANGE_RULES_FILE = RULES_DIR / "long-range-recording-rules.yml"
+LONG_RANGE_GROUP = "bookstore-long-range-recording-rules"
+EVALUATION_INTERVAL = '1m'
+LONG_RANGE_TAG = 'long-range'
+
+RULES_HEADER = """Generated by scripts/monitoring/compile-long-range-rules.py - do not edit by hand.
+Downsampled rates read by the long-range (-24h, -7d) dashboard variants."""
+
+# Recorded names keep everything needed to rebuild the rule: level, source metric, function and window
+_DOWNSAMPLED = re.compile(r'^(instance_)?downsampled:(?P<metric>.+):(?P<func>rate|increase)(?P<window>\d+[smhdwy])$')
+
+
+@dataclasses.dataclass
+class LongRangeVariant:
+    name: str            # uid suffix and time range, e.g. 7d
+    resolution: str      # shortest window and panel min interval
+
+    @property
+    def seconds(self):
+        return promql.duration_seconds(self.resolution)
+
+
+LONG_RANGE_VARIANTS = [
+    LongRangeVariant('24h', '5m'),
+    LongRangeVariant('7d', '1h'),
+]
+
+
+class DownsampledRule(RecordingRule):
+    """A recording rule the long-range variants read, named apart from the live rules"""
+
+    @property
+    def record(self):
+        level = 'instance_downsampled' if self.aggregated else 'downsampled'
+        return f"{level}:{self.metric}:{self.func}{self.window}"
+
+
+def _widen(node, seconds, resolution):
+    """Stretch range windows shorter than the resolution and use rate instead of irate"""
+    def widen(n):
+        if not (isinstance(n, promql.Call) and n.func in promql.RANGE_FUNCTIONS and n.args):
+            return None
+        selector = n.args[0]
+        if not isinstance(selector, promql.Selector) or selector.range is None or selector.range.startswith('$'):
+            return None
+        if promql.duration_seconds(selector.range) < seconds:
+            selector = dataclasses.replace(selector, range=resolution)
+        return dataclasses.replace(n, func='rate' if n.func == 'irate' else n.func, args=[selector] + n.args[1:])
+
+    return promql.transform(node, widen)
+
+
+def downsample_expr(text, variant, recorded):
+    """A panel expression rewritten to read downsampled series (unchanged if it cannot be parsed)"""
+    try:
+        node = promql.parse(text)
+    except promql.PromQLError:
+        return text
+    node = _widen(unrecord(node, recorded), variant.seconds, variant.resolution)
+    rules = {key: DownsampledRule(func, selector.metric, selector.range, key[0])
+             for key, func, selector, _ in find_candidates(node) if func in COMPILABLE_FUNCTIONS}
+    return promql.format_expr(rewrite_expr(node, rules))
+
+
+def _link(dashboard, title):
+    return {
+        "asDropdown": False,
+        "icon": "dashboard",
+        "includeVars": True,
+        "keepTime": False,
+        "tags": [],
+        "targetBlank": False,
+        "title": title,
+        "tooltip": dashboard['title'],
+        "type": "link",
+        "url": f"/d/{dashboard['uid']}",
+    }
+
+
+def long_range_variants(dashboard, variants=LONG_RANGE_VARIANTS, live_rules_file=RULES_FILE):
+    """Copies of a generated dashboard for each long-range variant, queries rewritten to downsampled series"""
+    live_rules = load_rules(live_rules_file)
+    recorded = recorded_sources(live_rules)
+    # --native-histograms dashboards read the native counterparts of the histogram rules
+    recorded.update((rule.record, rule) for rule, _ in native_rules(live_rules).values())
+    results = []
+    for variant in variants:
+        result = copy.deepcopy(dashboard)
+        result['uid'] = f"{dashboard['uid']}-{variant.name}"
+        result['title'] = f"{dashboard['title']} - Last {variant.name}"
+        result['time'] = {"from": f"now-{variant.name}", "to": "now"}
+        result['refresh'] = variant.resolution
+        result['tags'] = list(result.get('tags', [])) + [LONG_RANGE_TAG]
+        # The queries differ from the source panels', so these are plain copies, never library panel instances
+        for panel in iter_panels(result.get('panels', [])):
+            panel.pop('libraryPanel', None)
+        for panel, target in iter_targets(result):
+            target['expr'] = downsample_expr(target['expr'], variant, recorded)
+            panel['interval'] = variant.resolution
+        results.append(result)
+    return results
+
+
+def link_variants(live, variants):
+    """Link the live dashboard and its long-range variants to each other"""
+    everything = [live] + variants
+    titles = {id(live): "Live"}
+    titles.update({id(v): f"Last {v['time']['from'][len('now-'):]}" for v in variants})
+    for dashboard in everything:
+        dashboard['links'] = list(dashboard.get('links', [])) + [
+            _link(other, titles[id(other)]) for other in everything if other is not dashboard]
+
+
+def is_long_range(dashboard):
+    return LONG_RANGE_TAG in dashboard.get('tags', [])
+
+
+def collect_rules(dashboards):
+    """{record: DownsampledRule} for every downsampled series the dashboards read"""
+    rules = {}
+    for dashboard in dashboards:
+        for _, target in iter_targets(dashboard):
+            try:
+                usage = expression_usage(promql.parse(target['expr']))
+            except promql.PromQLError:
+                continue
+            for name, entry in usage.items():
+                match = _DOWNSAMPLED.match(name)
+                if not match:
+                    continue
+                rule = rules.setdefault(name, DownsampledRule(match['func'], match['metric'], match['window'],
+                                                              bool(match.group(1))))
+                rule.occurrences += 1
+                if rule.aggregated:
+                    rule.labels.update(entry.labels | set(PRESERVED_LABELS))
+    return rules
+
+
+def rules_document(rules):
+    entries = [{'record': r.record, 'expr': r.expr} for r in sorted(rules.values(), key=lambda r: r.record)]
+    return {'groups': [{'name': LONG_RANGE_GROUP, 'interval': EVALUATION_INTERVAL, 'rules': entries}]}
+
+
+def write_long_range_rules(rules, path=LONG_RANGE_RULES_FILE):
+    write_yaml(rules_document(rules), path, header=RULES_HEADER)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Synthetic OpenMetrics history for every metric the dashboards read.
+
+Series are the cross product of each metric's labels: the scrape labels from
+prometheus.yml (one instance per --instances), plus whatever labels the
+dashboards filter or group on, with values drawn from the BookStore API's
+real routes and status codes. The scale knobs stretch each dimension, so the
+same dashboards can be benchmarked at 10x or 100x today's cardinality. The
+output is meant for `promtool tsdb create-blocks-from openmetrics`.
+"""
+
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from dashboard_utils import PROMETHEUS_CONFIG, load_yaml
+
+# Labels whose values come from the scrape config rather than the metric
+TARGET_LABELS = ['job', 'instance', 'service', 'environment']
+
+# Metric prefixes exported by the performance service; everything else comes from the API
+JOB_PREFIXES = {
+    'performance-service': ('llm_', 'claude_', 'openai_', 'ollama_', 'bedrock_'),
+}
+DEFAULT_JOB = 'bookstore-api'
+
+ROUTES = [
+    ('api/v1/Books', 'GET'), ('api/v1/Books/{id}', 'GET'), ('api/v1/Books', 'POST'),
+    ('api/v1/Books/{id}', 'PUT'), ('api/v1/Books/{id}', 'PATCH'), ('api/v1/Books/{id}', 'DELETE'),
+    ('api/v1/Books/search', 'GET'), ('api/v1/Books/random', 'GET'), ('api/v1/Books/bulk', 'POST'),
+    ('api/v1/Books/{id}/generate-summary', 'POST'), ('api/v1/Authors', 'GET'), ('api/v1/Authors/{id}', 'GET'),
+    ('api/v1/ErrorSimulation/{code}', 'GET'), ('health', 'GET'),
+]
+
+STATUS_CODES = ['200', '201', '204', '400', '404', '500', '401', '409', '422', '503',
+                '403', '410', '429', '502', '504']
+
+# Values for other labels the dashboards use; literal matcher values from the dashboards are added on top
+LABEL_VALUES = {
+    'generation': ['gen0', 'gen1', 'gen2', 'loh', 'poh'],
+    'provider': ['claude', 'openai', 'ollama', 'bedrock'],
+    'type': ['input', 'output'],
+    'http_host': ['mongodb:27017', 'redis:6379', 'api.anthropic.com', 'api.openai.com'],
+    'http_request_method': ['GET', 'POST', 'PUT', 'PATCH', 'DELETE'],
+}
+
+# ASP.NET Core / OpenTelemetry default duration buckets
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 7.5, 10]
+
+COUNTER_FUNCTIONS = {'rate', 'irate', 'increase', 'resets'}
+
+
+@dataclass
+class Scale:
+    routes: int = len(ROUTES)
+    status_codes: int = 8
+    instances: int = 2
+    hours: float = 1.0
+    interval: int = 15       # seconds between samples (scrape_interval)
+    label_values: int = 3    # values for labels with no known values
+
+
+@dataclass
+class Family:
+    """One OpenMetrics metric family to generate"""
+    name: str                # family name (without _total / _bucket suffixes)
+    kind: str                # counter, histogram, gauge or unknown (monotonic, no _total suffix)
+    job: str
+    labels: List[str] = field(default_factory=list)
+    values: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def _job_for(metric):
+    for job, prefixes in JOB_PREFIXES.items():
+        if metric.startswith(prefixes):
+            return job
+    return DEFAULT_JOB
+
+
+def plan_families(references):
+    """Group referenced metric names into OpenMetrics families. Returns {family name: Family}.
+
+    A bare histogram name (the native histogram the native rules read) joins
+    its classic `_bucket` family: OpenMetrics text has no native histograms,
+    so the fixtures carry the classic series those rules are compared against.
+    """
+    bucketed = {name[:-len('_bucket')] for name in references if name.endswith('_bucket')}
+    families = {}
+    for name, usage in sorted(references.items()):
+        if name.startswith('__') or ':' in name:
+            continue
+        base, kind = name, 'histogram' if name in bucketed else 'gauge'
+        for suffix in ('_bucket', '_count', '_sum'):
+            if name.endswith(suffix) and name[:-len(suffix)] in bucketed:
+                base, kind = name[:-len(suffix)], 'histogram'
+        if kind != 'histogram':
+            if name.endswith('_total'):
+                base, kind = name[:-len('_total')], 'counter'
+            elif usage.functions & COUNTER_FUNCTIONS:
+                kind = 'unknown'
+        family = families.setdefault(base, Family(base, kind, _job_for(name)))
+        for label in sorted(usage.labels - set(TARGET_LABELS) - {'le', '__name__'}):
+            if label not in family.labels:
+                family.labels.append(label)
+            family.values.setdefault(label, [])
+            for value in sorted(usage.values.get(label, ())):
+                if value not in family.values[label]:
+                    family.values[label].append(value)
+    return families
+
+
+def scrape_targets(scale, config_path=PROMETHEUS_CONFIG):
+    """{job: [target label dicts]} with `scale.instances` instances per scrape job"""
+    targets = {}
+    for job in load_yaml(config_path).get('scrape_configs', []):
+        static = (job.get('static_configs') or [{}])[0]
+        port = (static.get('targets') or ['localhost:80'])[0].rsplit(':', 1)[-1]
+        labels = static.get('labels', {})
+        targets[job['job_name']] = [
+            dict(labels, job=job['job_name'], instance=f"{job['job_name']}-{i}:{port}")
+            for i in range(scale.instances)
+        ]
+    return targets
+
+
+def _route_list(scale):
+    routes = list(ROUTES)
+    for i in range(len(routes), scale.routes):
+        path, method = ROUTES[i % len(ROUTES)]
+        routes.append((path.replace('api/v1/', f'api/v1/Tenant{i // len(ROUTES)}/'), method))
+    return routes[:scale.routes]
+
+
+def label_sets(family, scale):
+    """Every label combination (excluding scrape labels) a family's series carry"""
+    routes = _route_list(scale)
+    dims = []
+    if 'http_route' in family.labels:
+        # Routes carry their own method, so route x method is not a full cross product
+        with_method = 'http_request_method' in family.labels
+        dims.append([{'http_route': r, **({'http_request_method': m} if with_method else {})} for r, m in routes])
+    for label in family.labels:
+        if label == 'http_route' or (label == 'http_request_method' and 'http_route' in family.labels):
+            continue
+        if label == 'http_response_status_code':
+            values = STATUS_CODES[:scale.status_codes]
+        else:
+            known = LABEL_VALUES.get(label) or [f"{label}-{i}" for i in range(scale.label_values)]
+            values = list(dict.fromkeys(family.values.get(label, []) + known))
+        dims.append([{label: v} for v in values])
+
+    combos = [{}]
+    for dim in dims:
+        combos = [dict(c, **d) for c in combos for d in dim]
+    return combos
+
+
+def _weight(labels):
+    """Relative traffic of a series: errors are rarer than successes"""
+    code = labels.get('http_response_status_code', '200')
+    return {'2': 1.0, '4': 0.05, '5': 0.01}.get(code[0], 0.1)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+def _lognormal_cdf(x, median, sigma=0.8):
+    return 0.5 * (1 + math.erf(math.log(x / median) / (sigma * math.sqrt(2))))
+
+
+def series_count(families, targets, scale):
+    total = 0
+    for family in families.values():
+        combos = len(label_sets(family, scale)) * len(targets.get(family.job, []))
+        total += combos * (len(BUCKETS) + 3 if family.kind == 'histogram' else 1)
+    return total
+
+
+def write_family(out, family, targets, scale, end, rng):
+    """Write one family's samples, series by series in timestamp order. Returns samples written."""
+    steps = int(scale.hours * 3600 // scale.interval)
+    start = end - steps * scale.interval
+    sample_name = family.name + ('_total' if family.kind == 'counter' else '')
+    out.write(f"# TYPE {family.name} {family.kind}\n")
+    written = 0
+
+    for target in targets.get(family.job, []):
+        for combo in label_sets(family, scale):
+            labels = dict(target, **combo)
+            weight = _weight(labels) * rng.uniform(0.5, 1.5)
+            value = rng.uniform(0, 1000) * weight
+            median = rng.uniform(0.02, 0.3)
+            buckets = [0] * len(BUCKETS)
+            count = total = 0.0
+            rendered = _format_labels(labels)
+            for step in range(steps + 1):
+                ts = start + step * scale.interval
+                if family.kind == 'histogram':
+                    n = max(0, int(rng.gauss(20 * weight, 5 * weight) * scale.interval / 15))
+                    for i, le in enumerate(BUCKETS):
+                        buckets[i] += round(n * _lognormal_cdf(le, median))
+                    count += n
+                    total += n * median * 1.4
+                    for i, le in enumerate(BUCKETS):
+                        out.write(f"{family.name}_bucket{_format_labels(dict(labels, le=str(le)))} {buckets[i]} {ts}\n")
+                    out.write(f"{family.name}_bucket{_format_labels(dict(labels, le='+Inf'))} {int(count)} {ts}\n")
+                    out.write(f"{family.name}_count{rendered} {int(count)} {ts}\n")
+                    out.write(f"{family.name}_sum{rendered} {total:.6f} {ts}\n")
+                    written += len(BUCKETS) + 3
+                    continue
+                if family.kind in ('counter', 'unknown'):
+                    value += max(0.0, rng.gauss(10 * weight, 3 * weight)) * scale.interval / 15
+                else:
+                    value = max(0.0, value + rng.gauss(0, 0.05 * (value + 1)))
+                out.write(f"{sample_name}{rendered} {value:.6f} {ts}\n")
+                written += 1
+    return written
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Index of every metric the dashboards and Prometheus rules read.
+
+Recorded series (`instance:...:rate1m`) are resolved back to the raw metrics
+their rule reads, so the index lists what the scrape targets must actually
+expose, together with the labels each metric is filtered or grouped on.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Set
+
+import promql
+from dashboard_utils import RULES_DIR, iter_targets, load_yaml
+
+
+@dataclass
+class MetricUsage:
+    name: str
+    labels: Set[str] = field(default_factory=set)                  # labels matched or grouped on
+    values: Dict[str, Set[str]] = field(default_factory=dict)      # label -> literal `=` matcher values
+    functions: Set[str] = field(default_factory=set)               # functions applied to the series
+    sources: Set[str] = field(default_factory=set)                 # dashboards / rule files reading it
+
+    def merge(self, other, source=None):
+        self.labels |= other.labels
+        for label, values in other.values.items():
+            self.values.setdefault(label, set()).update(values)
+        self.functions |= other.functions
+        self.sources |= {source} if source else other.sources
+
+
+# Functions writing a label (their second argument) that the series they read do not carry
+LABEL_WRITING_FUNCTIONS = {'label_replace': 3, 'label_join': 3}
+
+
+def added_labels(node):
+    """Labels an expression writes with label_replace/label_join rather than reading them from its series"""
+    added = set()
+    for n in promql.walk(node):
+        if isinstance(n, promql.Call) and n.func in LABEL_WRITING_FUNCTIONS and len(n.args) > 1:
+            first_source = LABEL_WRITING_FUNCTIONS[n.func]
+            sources = {a.value for a in n.args[first_source:] if isinstance(a, promql.String)}
+            if isinstance(n.args[1], promql.String) and n.args[1].value not in sources:
+                added.add(n.args[1].value)
+    return added
+
+
+def expression_usage(node):
+    """MetricUsage per metric name for one parsed expression"""
+    usage = {}
+
+    def get(selector):
+        return usage.setdefault(selector.metric, MetricUsage(selector.metric))
+
+    for n in promql.walk(node):
+        if isinstance(n, promql.Selector) and n.metric:
+            entry = get(n)
+            for m in n.matchers:
+                entry.labels.add(m.name)
+                if m.op == '=' and '$' not in m.value:
+                    entry.values.setdefault(m.name, set()).add(m.value)
+        elif isinstance(n, promql.Aggregation) and n.grouping and not n.without:
+            grouping = set(n.grouping) - added_labels(n.expr)
+            for s in promql.selectors(n.expr):
+                if s.metric:
+                    get(s).labels.update(grouping)
+        elif isinstance(n, promql.Call):
+            for arg in n.args:
+                for s in promql.selectors(arg):
+                    if s.metric:
+                        get(s).functions.add(n.func)
+    return usage
+
+
+def recording_rules(directory=RULES_DIR):
+    """{record: (parsed expr, rule file name)} for every recording rule"""
+    rules = {}
+    for path in sorted(directory.glob('*.yml')):
+        for group in load_yaml(path).get('groups', []):
+            for entry in group.get('rules', []):
+                if 'record' not in entry:
+                    continue
+                try:
+                    rules[entry['record']] = (promql.parse(entry['expr']), path.name)
+                except promql.PromQLError:
+                    continue
+    return rules
+
+
+def collect_references(dashboards, rules_dir=RULES_DIR):
+    """Raw metrics read by a set of dashboards and every rule file.
+
+    dashboards maps a name to a loaded dashboard. Returns {metric: MetricUsage};
+    recorded series are replaced by the metrics their rules read, carrying the
+    labels the panels use on the recorded series, less those the rule itself
+    adds (its `labels:` block, label_replace/label_join targets).
+    """
+    rules = recording_rules(rules_dir)
+    references = {}
+    added = {}
+
+    def add(usage, source):
+        for name, entry in usage.items():
+            references.setdefault(name, MetricUsage(name)).merge(entry, source)
+
+    for path in sorted(rules_dir.glob('*.yml')):
+        for group in load_yaml(path).get('groups', []):
+            for entry in group.get('rules', []):
+                try:
+                    node = promql.parse(entry['expr'])
+                except promql.PromQLError:
+                    continue
+                add(expression_usage(node), f"rules/{path.name}")
+                if 'record' in entry:
+                    added.setdefault(entry['record'], set()).update(set(entry.get('labels') or {}) | added_labels(node))
+
+    for name, dashboard in dashboards.items():
+        for _, target in iter_targets(dashboard):
+            try:
+                add(expression_usage(promql.parse(target['expr'])), name)
+            except promql.PromQLError:
+                continue
+
+    # Fold recorded series into their source metrics (rules may read other recorded series)
+    for _ in range(len(rules)):
+        recorded = [name for name in references if name in rules]
+        if not recorded:
+            break
+        for name in recorded:
+            entry = references.pop(name)
+            node, _ = rules[name]
+            own = added.get(name, set()) | {'__name__'}
+            for source in promql.metric_names(node):
+                target = references.setdefault(source, MetricUsage(source))
+                target.labels |= entry.labels - own
+                for label, values in entry.values.items():
+                    if label not in own:
+                        target.values.setdefault(label, set()).update(values)
+                target.sources |= entry.sources
+    return references
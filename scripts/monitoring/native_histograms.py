@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Native (exponential) histogram queries for the generated dashboards.
+
+A classic histogram is one series per bucket per label set (`m_bucket`, 15
+with the default duration buckets) plus `m_sum` and `m_count`, and every
+p50/p95/p99 panel reads all of them. With `Telemetry:Metrics:NativeHistograms`
+enabled the services push their histograms with base-2 exponential buckets to
+Prometheus' OTLP receiver, which stores each label set as a single
+native-histogram series `m`. native_expr rewrites a panel to read those:
+
+    histogram_quantile(q, sum(rate(m_bucket[w])) by (le, x))  ->  histogram_quantile(q, sum(rate(m[w])) by (x))
+    sum(rate(m_count[w])) by (x)                              ->  sum(histogram_count(rate(m[w]))) by (x)
+    sum(rate(m_sum[w])) by (x)                                ->  sum(histogram_sum(rate(m[w]))) by (x)
+    sum(rate(m_bucket{le="0.5"}[w])) by (x)                   ->  sum(histogram_fraction(0, 0.5, rate(m[w]))
+                                                                      * histogram_count(rate(m[w]))) by (x)
+
+The outer `sum(...)` stays where it was, so the grouping, consolidation and
+dedup passes see the same query shapes as before. Series recorded from a
+histogram by dashboard-recording-rules.yml move to a native counterpart
+(`instance:m_count:rate1m` -> `histogram_count(instance:m:rate1m)`), recorded
+in native-histogram-recording-rules.yml.
+
+Counters that merely end in `_count` or `_sum` (mongodb_operations_count) are
+left alone: only families with a `_bucket` series are histograms. An
+expression using a histogram series any other way (a bare `_bucket` selector,
+`le=~"..."`) keeps its classic query, which needs
+`Telemetry:Metrics:NativeHistograms:KeepClassicHistograms` in the services.
+"""
+
+import dataclasses
+
+import promql
+from dashboard_utils import RULES_DIR, iter_targets, write_yaml
+from recording_rules import RULES_FILE, RecordingRule, load_rules, rules_document
+
+NATIVE_RULES_FILE = RULES_DIR / "native-histogram-recording-rules.yml"
+NATIVE_RULE_GROUP = "bookstore-native-histogram-recording-rules"
+
+RULES_HEADER = """Generated by scripts/monitoring/create-demo-dashboard.py / create-mega-dashboard.py --native-histograms - do not edit by hand.
+Native-histogram counterparts of the histogram rates recorded in dashboard-recording-rules.yml."""
+
+BUCKET_SUFFIX = '_bucket'
+# Classic histogram series and the function that reads the same value from a native histogram
+HISTOGRAM_PARTS = {BUCKET_SUFFIX: None, '_count': 'histogram_count', '_sum': 'histogram_sum'}
+RATE_FUNCTIONS = {'rate', 'irate', 'increase'}
+
+
+class _Classic(Exception):
+    """The expression uses a classic histogram series in a way native histograms cannot answer"""
+
+
+def histogram_families(names):
+    """Histogram family names (without suffix) among a set of metric names"""
+    return {name[:-len(BUCKET_SUFFIX)] for name in names if name.endswith(BUCKET_SUFFIX)}
+
+
+def _part(metric, families):
+    """(family, suffix) if the metric is a classic histogram series, else None"""
+    for suffix in HISTOGRAM_PARTS:
+        if metric and metric.endswith(suffix) and metric[:-len(suffix)] in families:
+            return metric[:-len(suffix)], suffix
+    return None
+
+
+def native_rules(live_rules):
+    """{classic record: (native RecordingRule, suffix)} for the histogram rates among the live rules.
+
+    The _bucket, _count and _sum rates of one family, level and window share a
+    native rule keeping the union of their labels (less `le`).
+    """
+    families = histogram_families(rule.metric for rule in live_rules.values())
+    natives, mapping = {}, {}
+    for rule in live_rules.values():
+        part = _part(rule.metric, families)
+        if part is None:
+            continue
+        family, suffix = part
+        native = natives.setdefault((rule.aggregated, rule.func, family, rule.window),
+                                    RecordingRule(rule.func, family, rule.window, rule.aggregated))
+        native.labels.update(label for label in rule.labels if label != 'le')
+        mapping[rule.record] = (native, suffix)
+    return mapping
+
+
+def _native_rate(node, families, recorded):
+    """(native rate, suffix, le matchers) for a rate over a classic histogram series, raw or recorded, else None"""
+    if isinstance(node, promql.Selector) and node.metric in recorded:
+        rule, suffix = recorded[node.metric]
+        bounds = [m for m in node.matchers if m.name == 'le']
+        return promql.Selector(rule.record, [m for m in node.matchers if m.name != 'le']), suffix, bounds
+    if not (isinstance(node, promql.Call) and node.func in RATE_FUNCTIONS and len(node.args) == 1
+            and isinstance(node.args[0], promql.Selector)):
+        return None
+    selector = node.args[0]
+    part = _part(selector.metric, families)
+    if part is None:
+        return None
+    family, suffix = part
+    bounds = [m for m in selector.matchers if m.name == 'le']
+    selector = dataclasses.replace(selector, metric=family, matchers=[m for m in selector.matchers if m.name != 'le'])
+    return dataclasses.replace(node, args=[selector]), suffix, bounds
+
+
+def _native(node, families, recorded):
+    def replace(n):
+        aggregation, inner = None, n
+        if isinstance(n, promql.Aggregation) and n.op == 'sum' and n.param is None and not n.without:
+            aggregation, inner = n, promql.strip_parens(n.expr)
+        source = _native_rate(inner, families, recorded)
+        if source is None:
+            return None
+        native, suffix, bounds = source
+        if HISTOGRAM_PARTS[suffix]:
+            native = promql.Call(HISTOGRAM_PARTS[suffix], [native])
+        elif len(bounds) > 1 or (bounds and bounds[0].op != '='):
+            raise _Classic()
+        elif bounds and bounds[0].value == '+Inf':
+            native = promql.Call('histogram_count', [native])
+        elif bounds:
+            # Observations up to the bucket's bound; durations are never negative
+            native = promql.BinaryOp('*', promql.Call('histogram_fraction', [
+                promql.Number('0'), promql.Number(bounds[0].value), native]), promql.Call('histogram_count', [native]))
+        if aggregation is None:
+            return promql.Paren(native) if isinstance(native, promql.BinaryOp) else native
+        # Native histograms carry every bucket in one sample, so `le` leaves the grouping
+        grouping = [label for label in aggregation.grouping or [] if label != 'le']
+        return dataclasses.replace(aggregation, expr=native, grouping=grouping or None)
+
+    node = promql.rewrite(node, replace)
+    if any(_part(name, families) or name in recorded for name in promql.metric_names(node)):
+        raise _Classic()
+    return node
+
+
+def native_expr(text, families, recorded):
+    """A panel expression reading native histograms (unchanged if it has no histogram or cannot be rewritten)"""
+    try:
+        node = promql.parse(text)
+    except promql.PromQLError:
+        return text
+    try:
+        rewritten = promql.format_expr(_native(node, families, recorded))
+    except _Classic:
+        return text
+    return text if rewritten == promql.format_expr(node) else rewritten
+
+
+def apply_native_histograms(dashboard, live_rules_file=RULES_FILE):
+    """Rewrite a dashboard's histogram queries for native histograms.
+
+    Returns (rewritten targets, targets left on classic histogram series).
+    """
+    live_rules = load_rules(live_rules_file)
+    names = {rule.metric for rule in live_rules.values()}
+    for _, target in iter_targets(dashboard):
+        try:
+            names.update(promql.metric_names(promql.parse(target['expr'])))
+        except promql.PromQLError:
+            continue
+    families = histogram_families(names)
+    recorded = native_rules(live_rules)
+
+    rewritten = classic = 0
+    for _, target in iter_targets(dashboard):
+        expr = native_expr(target['expr'], families, recorded)
+        if expr != target['expr']:
+            target['expr'] = expr
+            rewritten += 1
+            continue
+        try:
+            names = promql.metric_names(promql.parse(expr))
+        except promql.PromQLError:
+            continue
+        if any(_part(name, families) or name in recorded for name in names):
+            classic += 1
+    return rewritten, classic
+
+
+def write_native_rules(live_rules_file=RULES_FILE, path=NATIVE_RULES_FILE):
+    """Write the native counterparts of the live histogram rules. Returns the number of rules."""
+    rules = {rule.record: rule for rule, _ in native_rules(load_rules(live_rules_file)).values()}
+    write_yaml(rules_document(rules, NATIVE_RULE_GROUP), path, header=RULES_HEADER)
+    return len(rules)
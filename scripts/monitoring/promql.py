@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""Small PromQL parser, printer and rewrite helpers shared by the dashboard scripts.
+
+Only covers the subset of PromQL our Grafana dashboards use (selectors, range
+functions, aggregations, binary operators, subqueries and Grafana `$variables`),
+which is enough to analyse and rewrite panel expressions safely.
+"""
+
+import re
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+AGGREGATIONS = {
+    'sum', 'min', 'max', 'avg', 'group', 'stddev', 'stdvar', 'count',
+    'count_values', 'bottomk', 'topk', 'quantile', 'limitk', 'limit_ratio',
+}
+
+# Functions whose first argument is a range vector
+RANGE_FUNCTIONS = {
+    'rate', 'irate', 'increase', 'delta', 'idelta', 'deriv', 'changes', 'resets',
+    'avg_over_time', 'min_over_time', 'max_over_time', 'sum_over_time',
+    'count_over_time', 'last_over_time', 'present_over_time', 'stddev_over_time',
+    'stdvar_over_time', 'quantile_over_time', 'absent_over_time', 'predict_linear',
+    'holt_winters', 'double_exponential_smoothing',
+}
+
+# Binary operators from lowest to highest precedence
+PRECEDENCE = [
+    ('or',),
+    ('and', 'unless'),
+    ('==', '!=', '<=', '<', '>=', '>'),
+    ('+', '-'),
+    ('*', '/', '%', 'atan2'),
+    ('^',),
+]
+COMPARISON_OPS = {'==', '!=', '<=', '<', '>=', '>'}
+SET_OPS = {'and', 'or', 'unless'}
+
+
+class PromQLError(ValueError):
+    """Raised when an expression cannot be parsed"""
+
+
+# ==================== AST ====================
+
+@dataclass
+class Number:
+    value: str
+
+
+@dataclass
+class String:
+    value: str
+
+
+@dataclass
+class Matcher:
+    name: str
+    op: str
+    value: str
+
+
+@dataclass
+class Selector:
+    metric: Optional[str]
+    matchers: List[Matcher] = field(default_factory=list)
+    range: Optional[str] = None
+    offset: Optional[str] = None
+
+
+@dataclass
+class Call:
+    func: str
+    args: list = field(default_factory=list)
+
+
+@dataclass
+class Aggregation:
+    op: str
+    expr: object
+    param: object = None
+    grouping: Optional[List[str]] = None
+    without: bool = False
+
+
+@dataclass
+class BinaryOp:
+    op: str
+    lhs: object
+    rhs: object
+    bool_modifier: bool = False
+    matching: Optional[str] = None       # 'on' or 'ignoring'
+    matching_labels: List[str] = field(default_factory=list)
+    group: Optional[str] = None          # 'group_left' or 'group_right'
+    group_labels: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Unary:
+    op: str
+    expr: object
+
+
+@dataclass
+class Paren:
+    expr: object
+
+
+@dataclass
+class Subquery:
+    expr: object
+    range: str
+    step: str = ''
+    offset: Optional[str] = None
+
+
+# ==================== Lexer ====================
+
+_TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<number>(?:0x[0-9a-fA-F]+|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)(?![\w:]))
+  | (?P<duration>\d+(?:ms|[smhdwy])(?:\d+(?:ms|[smhdwy]))*)
+  | (?P<variable>\$\{[^}]+\}|\$\w+)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)
+  | (?P<ident>[a-zA-Z_][\w:]*)
+  | (?P<op>=~|!~|==|!=|<=|>=|[-+*/%^<>=(){}\[\],:@])
+''', re.VERBOSE)
+
+
+def tokenize(text):
+    """Split a PromQL expression into (kind, value) tokens"""
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise PromQLError(f"Unexpected character {text[pos]!r} at {pos} in: {text}")
+        kind = match.lastgroup
+        if kind != 'ws':
+            tokens.append((kind, match.group()))
+        pos = match.end()
+    tokens.append(('eof', ''))
+    return tokens
+
+
+def _unquote(raw):
+    if raw[0] == '`':
+        return raw[1:-1]
+    body = raw[1:-1]
+    return re.sub(r'\\(.)', lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)), body)
+
+
+def _quote(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+# ==================== Parser ====================
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def accept(self, value):
+        if self.peek()[1] == value and self.peek()[0] in ('op', 'ident'):
+            return self.next()
+        return None
+
+    def expect(self, value):
+        token = self.next()
+        if token[1] != value:
+            raise PromQLError(f"Expected {value!r} but found {token[1]!r} in: {self.text}")
+        return token
+
+    def parse(self):
+        node = self.parse_binary(0)
+        if self.peek()[0] != 'eof':
+            raise PromQLError(f"Unexpected {self.peek()[1]!r} in: {self.text}")
+        return node
+
+    def parse_binary(self, level):
+        if level == len(PRECEDENCE):
+            return self.parse_unary()
+        lhs = self.parse_binary(level + 1)
+        while self.peek()[1] in PRECEDENCE[level] and self.peek()[0] in ('op', 'ident'):
+            op = self.next()[1]
+            node = BinaryOp(op, lhs, None)
+            if self.accept('bool'):
+                node.bool_modifier = True
+            if self.peek()[1] in ('on', 'ignoring'):
+                node.matching = self.next()[1]
+                node.matching_labels = self.parse_label_list()
+                if self.peek()[1] in ('group_left', 'group_right'):
+                    node.group = self.next()[1]
+                    if self.peek()[1] == '(':
+                        node.group_labels = self.parse_label_list()
+            # '^' is right associative, everything else is left associative
+            node.rhs = self.parse_binary(level if op == '^' else level + 1)
+            lhs = node
+        return lhs
+
+    def parse_unary(self):
+        if self.peek()[1] in ('-', '+') and self.peek()[0] == 'op':
+            op = self.next()[1]
+            return Unary(op, self.parse_unary())
+        return self.parse_postfix(self.parse_primary())
+
+    def parse_postfix(self, node):
+        while True:
+            if self.peek()[1] == '[':
+                self.next()
+                window = self.parse_duration()
+                if self.accept(':'):
+                    step = self.parse_duration() if self.peek()[1] != ']' else ''
+                    self.expect(']')
+                    node = Subquery(node, window, step)
+                else:
+                    self.expect(']')
+                    if not isinstance(node, Selector) or node.range is not None:
+                        raise PromQLError(f"Range selector on non-selector in: {self.text}")
+                    node.range = window
+            elif self.peek()[1] == 'offset':
+                self.next()
+                negative = '-' if self.accept('-') else ''
+                offset = negative + self.parse_duration()
+                if not isinstance(node, (Selector, Subquery)):
+                    raise PromQLError(f"offset on non-selector in: {self.text}")
+                node.offset = offset
+            else:
+                return node
+
+    def parse_duration(self):
+        kind, value = self.next()
+        if kind in ('duration', 'variable'):
+            return value
+        if kind == 'number':
+            return value
+        raise PromQLError(f"Expected duration but found {value!r} in: {self.text}")
+
+    def parse_primary(self):
+        kind, value = self.peek()
+        if kind == 'number':
+            self.next()
+            return Number(value)
+        if kind == 'string':
+            self.next()
+            return String(_unquote(value))
+        if kind == 'variable':
+            self.next()
+            return Number(value)
+        if value == '(':
+            self.next()
+            inner = self.parse_binary(0)
+            self.expect(')')
+            return Paren(inner)
+        if value == '{':
+            return Selector(None, self.parse_matchers())
+        if kind == 'ident':
+            self.next()
+            if value in AGGREGATIONS and self.peek()[1] in ('(', 'by', 'without'):
+                return self.parse_aggregation(value)
+            if self.peek()[1] == '(':
+                return Call(value, self.parse_args())
+            if value.lower() in ('inf', 'nan'):
+                return Number(value)
+            matchers = self.parse_matchers() if self.peek()[1] == '{' else []
+            return Selector(value, matchers)
+        raise PromQLError(f"Unexpected {value!r} in: {self.text}")
+
+    def parse_args(self):
+        self.expect('(')
+        args = []
+        while self.peek()[1] != ')':
+            args.append(self.parse_binary(0))
+            if not self.accept(','):
+                break
+        self.expect(')')
+        return args
+
+    def parse_label_list(self):
+        self.expect('(')
+        labels = []
+        while self.peek()[1] != ')':
+            labels.append(self.next()[1])
+            if not self.accept(','):
+                break
+        self.expect(')')
+        return labels
+
+    def parse_matchers(self):
+        self.expect('{')
+        matchers = []
+        while self.peek()[1] != '}':
+            kind, name = self.next()
+            if kind == 'string':
+                name = _unquote(name)
+            op = self.next()[1]
+            if op not in ('=', '!=', '=~', '!~'):
+                raise PromQLError(f"Bad matcher operator {op!r} in: {self.text}")
+            kind, value = self.next()
+            if kind != 'string':
+                raise PromQLError(f"Matcher value must be a string in: {self.text}")
+            matchers.append(Matcher(name, op, _unquote(value)))
+            if not self.accept(','):
+                break
+        self.expect('}')
+        return matchers
+
+    def parse_aggregation(self, op):
+        grouping, without = None, False
+        if self.peek()[1] in ('by', 'without'):
+            without = self.next()[1] == 'without'
+            grouping = self.parse_label_list()
+        args = self.parse_args()
+        if self.peek()[1] in ('by', 'without'):
+            without = self.next()[1] == 'without'
+            grouping = self.parse_label_list()
+        if not args:
+            raise PromQLError(f"Aggregation {op} without arguments in: {self.text}")
+        param = args[0] if len(args) > 1 else None
+        return Aggregation(op, args[-1], param, grouping, without)
+
+
+def parse(text):
+    """Parse a PromQL expression into an AST"""
+    return _Parser(text).parse()
+
+
+# ==================== Printer ====================
+
+def _format_selector(node):
+    matchers = ', '.join(f'{m.name}{m.op}{_quote(m.value)}' for m in node.matchers)
+    text = node.metric or ''
+    if matchers or not text:
+        text += '{' + matchers + '}'
+    if node.range is not None:
+        text += f'[{node.range}]'
+    if node.offset is not None:
+        text += f' offset {node.offset}'
+    return text
+
+
+def format_expr(node):
+    """Render an AST back to PromQL in the style our dashboards use"""
+    if isinstance(node, Number):
+        return node.value
+    if isinstance(node, String):
+        return _quote(node.value)
+    if isinstance(node, Selector):
+        return _format_selector(node)
+    if isinstance(node, Call):
+        return f"{node.func}({', '.join(format_expr(a) for a in node.args)})"
+    if isinstance(node, Aggregation):
+        args = format_expr(node.expr)
+        if node.param is not None:
+            args = f'{format_expr(node.param)}, {args}'
+        text = f'{node.op}({args})'
+        if node.grouping is not None:
+            text += f" {'without' if node.without else 'by'} ({', '.join(node.grouping)})"
+        return text
+    if isinstance(node, BinaryOp):
+        op = node.op
+        if node.bool_modifier:
+            op += ' bool'
+        if node.matching:
+            op += f" {node.matching}({', '.join(node.matching_labels)})"
+            if node.group:
+                op += f" {node.group}"
+                if node.group_labels:
+                    op += f"({', '.join(node.group_labels)})"
+        return f'{format_expr(node.lhs)} {op} {format_expr(node.rhs)}'
+    if isinstance(node, Unary):
+        return f'{node.op}{format_expr(node.expr)}'
+    if isinstance(node, Paren):
+        return f'({format_expr(node.expr)})'
+    if isinstance(node, Subquery):
+        text = f'{format_expr(node.expr)}[{node.range}:{node.step}]'
+        if node.offset is not None:
+            text += f' offset {node.offset}'
+        return text
+    raise TypeError(f"Unknown PromQL node {node!r}")
+
+
+# ==================== Traversal & rewriting ====================
+
+def children(node):
+    """Direct child expressions of a node"""
+    if isinstance(node, Call):
+        return list(node.args)
+    if isinstance(node, Aggregation):
+        return [node.param, node.expr] if node.param is not None else [node.expr]
+    if isinstance(node, BinaryOp):
+        return [node.lhs, node.rhs]
+    if isinstance(node, (Unary, Paren, Subquery)):
+        return [node.expr]
+    return []
+
+
+def walk(node):
+    """Yield every node of the tree, parents before children"""
+    yield node
+    for child in children(node):
+        yield from walk(child)
+
+
+def transform(node, fn):
+    """Rebuild the tree bottom-up, replacing nodes where fn returns a new node"""
+    if isinstance(node, Call):
+        node = replace(node, args=[transform(a, fn) for a in node.args])
+    elif isinstance(node, Aggregation):
+        node = replace(node, expr=transform(node.expr, fn),
+                       param=transform(node.param, fn) if node.param is not None else None)
+    elif isinstance(node, BinaryOp):
+        node = replace(node, lhs=transform(node.lhs, fn), rhs=transform(node.rhs, fn))
+    elif isinstance(node, (Unary, Paren, Subquery)):
+        node = replace(node, expr=transform(node.expr, fn))
+    elif isinstance(node, Selector):
+        node = replace(node, matchers=[replace(m) for m in node.matchers])
+    result = fn(node)
+    return node if result is None else result
+
+
+def rewrite(node, fn):
+    """Rebuild the tree top-down; where fn returns a node it replaces the whole subtree"""
+    result = fn(node)
+    if result is not None:
+        return result
+    if isinstance(node, Call):
+        return replace(node, args=[rewrite(a, fn) for a in node.args])
+    if isinstance(node, Aggregation):
+        return replace(node, expr=rewrite(node.expr, fn),
+                       param=rewrite(node.param, fn) if node.param is not None else None)
+    if isinstance(node, BinaryOp):
+        return replace(node, lhs=rewrite(node.lhs, fn), rhs=rewrite(node.rhs, fn))
+    if isinstance(node, (Unary, Paren, Subquery)):
+        return replace(node, expr=rewrite(node.expr, fn))
+    return node
+
+
+def selectors(node):
+    """All vector selectors in an expression"""
+    return [n for n in walk(node) if isinstance(n, Selector)]
+
+
+def metric_names(node):
+    """Metric names referenced by an expression, in order of first use"""
+    names = []
+    for sel in selectors(node):
+        name = sel.metric
+        if name is None:
+            name = next((m.value for m in sel.matchers if m.name == '__name__' and m.op == '='), None)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def strip_parens(node):
+    """Unwrap any redundant outer parentheses"""
+    while isinstance(node, Paren):
+        node = node.expr
+    return node
+
+
+def canonicalize(node):
+    """Normalise an expression so that equivalent spellings compare equal.
+
+    Sorts matchers and grouping labels, drops redundant parentheses around
+    selectors and calls, and orders the operands of commutative operators.
+    """
+    def normalise(n):
+        if isinstance(n, Selector):
+            return replace(n, matchers=sorted(n.matchers, key=lambda m: (m.name, m.op, m.value)))
+        if isinstance(n, Aggregation) and n.grouping is not None:
+            return replace(n, grouping=sorted(set(n.grouping)))
+        if isinstance(n, Paren) and isinstance(n.expr, (Selector, Call, Aggregation, Number, Paren)):
+            return n.expr
+        if isinstance(n, BinaryOp):
+            n = replace(n, matching_labels=sorted(n.matching_labels), group_labels=sorted(n.group_labels))
+            # Only arithmetic commutes: `and` keeps the left-hand side's samples
+            if n.op in ('+', '*') and not n.bool_modifier and not n.group:
+                lhs, rhs = format_expr(n.lhs), format_expr(n.rhs)
+                if rhs < lhs:
+                    return replace(n, lhs=n.rhs, rhs=n.lhs)
+        return None
+    return transform(node, normalise)
+
+
+def canonical_text(text):
+    """Canonical string form of a PromQL expression (the text itself if unparsable)"""
+    try:
+        return format_expr(canonicalize(parse(text)))
+    except PromQLError:
+        return ' '.join(text.split())
+
+
+def duration_seconds(text):
+    """Convert a PromQL duration like 1m30s to seconds (None for Grafana variables)"""
+    if text is None or text.startswith('$'):
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+    parts = re.findall(r'(\d+)(ms|[smhdwy])', text)
+    if not parts:
+        return float(text)
+    return sum(int(n) * units[u] for n, u in parts)
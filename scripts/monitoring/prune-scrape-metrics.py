@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Write metric_relabel_configs to prometheus.yml that drop every metric no dashboard or rule reads"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from dashboard_utils import DASHBOARDS_DIR, PROMETHEUS_CONFIG, RULES_DIR, dashboard_files, load_yaml
+from metric_references import collect_references
+from recording_rules import load_dashboards
+from scrape_pruning import ALLOWLIST_FILE, job_metrics, keep_regexes, load_allowlist, splice_keep_rules
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--config', type=Path, default=PROMETHEUS_CONFIG, help='prometheus.yml to update')
+parser.add_argument('--allowlist', type=Path, default=ALLOWLIST_FILE,
+                    help='Metrics to keep regardless of use (default: scrape-allowlist.yml)')
+parser.add_argument('--dashboards-dir', type=Path, default=DASHBOARDS_DIR, help='Directory of dashboard JSON files')
+parser.add_argument('--rules-dir', type=Path, default=RULES_DIR, help='Directory of Prometheus rule files')
+parser.add_argument('--check', action='store_true', help='Exit 1 if prometheus.yml is out of date instead of writing it')
+parser.add_argument('--verbose', '-v', action='store_true', help='List the metrics kept for each job')
+args = parser.parse_args()
+
+paths = dashboard_files(args.dashboards_dir)
+references = collect_references(load_dashboards(paths), args.rules_dir)
+jobs = [job['job_name'] for job in load_yaml(args.config).get('scrape_configs', [])]
+kept = job_metrics(references, jobs)
+
+print(f"📁 {len(references)} metrics referenced by {len(paths)} dashboards and {args.rules_dir.name}/*.yml")
+regexes = keep_regexes(jobs, kept, load_allowlist(args.allowlist))
+for job, (_, metrics, patterns) in regexes.items():
+    print(f"   ✓ {job}: keep {metrics} metrics + {patterns} allowlist patterns")
+    if args.verbose:
+        for name in kept[job]:
+            print(f"       {name}")
+
+current = args.config.read_text(encoding='utf-8')
+text = splice_keep_rules(current, {job: regex for job, (regex, _, _) in regexes.items()})
+if args.check:
+    if text != current:
+        print(f"\n❌ {args.config} is out of date - run prune-scrape-metrics.py")
+        sys.exit(1)
+    print(f"\n✓ {args.config} is up to date")
+    sys.exit(0)
+
+args.config.write_text(text, encoding='utf-8')
+print("\n" + "=" * 70)
+print("✓ SCRAPE PRUNING WRITTEN" if text != current else "✓ SCRAPE PRUNING UNCHANGED")
+print("=" * 70)
+print(f"  Config: {args.config}")
+print("  Reload Prometheus to apply: curl -X POST http://localhost:9090/-/reload (needs --web.enable-lifecycle)")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Create or update the library panels written by the generators' --library-panels mode in Grafana"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from library_panels import LIBRARY_DIR, GrafanaClient, load_library_panels, publish
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--url', default=os.environ.get('GRAFANA_URL', 'http://localhost:3333'),
+                    help='Grafana base URL (default: $GRAFANA_URL or http://localhost:3333)')
+parser.add_argument('--user', default=os.environ.get('GRAFANA_USER', 'admin'), help='Grafana user (default: admin)')
+parser.add_argument('--password', default=os.environ.get('GRAFANA_PASSWORD', 'admin123'),
+                    help='Grafana password (default: $GRAFANA_PASSWORD or the docker-compose admin password)')
+parser.add_argument('--folder', default='BookStore',
+                    help='Folder for new library panels (default: BookStore, the provisioned dashboards folder)')
+parser.add_argument('--library-dir', type=Path, default=LIBRARY_DIR, help='Directory of library panel models')
+args = parser.parse_args()
+
+elements = load_library_panels(args.library_dir)
+if not elements:
+    print(f"❌ No library panels in {args.library_dir} - run the generators with --library-panels first")
+    sys.exit(1)
+
+client = GrafanaClient(args.url, args.user, args.password)
+print(f"📁 Publishing {len(elements)} library panels to {args.url}")
+try:
+    folder_uid = client.folder_uid(args.folder)
+except (OSError, RuntimeError) as e:
+    print(f"❌ Cannot reach Grafana: {e}")
+    sys.exit(1)
+if not folder_uid:
+    print(f"⚠️  Folder '{args.folder}' not found - new library panels go to General")
+
+outcome = publish(client, elements, folder_uid)
+counts = {}
+for uid, result in outcome.items():
+    counts[result.split(':')[0]] = counts.get(result.split(':')[0], 0) + 1
+    if result.startswith('error'):
+        print(f"   ❌ {uid}: {result}")
+
+print(f"✓ {counts.get('created', 0)} created, {counts.get('updated', 0)} updated, "
+      f"{counts.get('unchanged', 0)} unchanged")
+if counts.get('error'):
+    print(f"❌ {counts['error']} library panels failed")
+    sys.exit(1)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Coalescing, step-aligned query cache between Grafana and Prometheus.
+
+Every viewer of a dashboard refreshing at 5s sends the same panel queries
+with a slightly different `now`. The proxy snaps query_range start/end to
+multiples of the step (and instant query times to the scrape interval), so
+those requests become identical; identical requests in flight are merged into
+one upstream call, and results are kept in an LRU cache with a TTL. Every
+other Prometheus API path (labels, series, metadata) is passed through.
+
+Prometheus then sees about one query per panel per step no matter how many
+viewers are open. The price is that the newest point of a range can be up to
+one step old, which at our 15s scrape interval is data Prometheus did not
+have yet anyway.
+
+The proxy's own counters are on /metrics (query_cache_*). Only aiohttp is
+needed, so it also runs in a bare python container (docker-compose.query-cache.yml).
+"""
+
+import argparse
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict, defaultdict
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, web
+
+DEFAULT_UPSTREAM = 'http://localhost:9090'
+DEFAULT_TTL = 60.0                  # seconds a result may be served from the cache
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+DEFAULT_INSTANT_ALIGN = 15.0        # seconds, the global scrape_interval
+UPSTREAM_TIMEOUT = 120              # seconds, above Prometheus' default 2m query timeout
+
+CACHED_ENDPOINTS = {'/api/v1/query_range': 'query_range', '/api/v1/query': 'query'}
+# Request headers worth forwarding upstream; hop-by-hop and Grafana-internal ones are dropped
+FORWARDED_HEADERS = ('Accept', 'Authorization', 'Content-Type', 'User-Agent', 'X-Scope-OrgID')
+
+_DURATION = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)')
+_UNIT_SECONDS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+
+def parse_seconds(value):
+    """Prometheus float seconds or a duration like 30s / 1m30s"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parts = _DURATION.findall(value or '')
+    if not parts or ''.join(n + u for n, u in parts) != value:
+        raise ValueError(f"invalid duration {value!r}")
+    return sum(float(n) * _UNIT_SECONDS[u] for n, u in parts)
+
+
+def _format(seconds):
+    return f"{seconds:.3f}".rstrip('0').rstrip('.')
+
+
+def align_params(endpoint, params, now=None, instant_align=DEFAULT_INSTANT_ALIGN):
+    """Parameters snapped to shared boundaries; raises ValueError when they cannot be parsed"""
+    params = dict(params)
+    if endpoint == 'query_range':
+        step = parse_seconds(params['step'])
+        if step <= 0:
+            raise ValueError("step must be positive")
+        start, end = float(params['start']), float(params['end'])
+        params['start'] = _format(math.floor(start / step) * step)
+        params['end'] = _format(math.floor(end / step) * step)
+        params['step'] = _format(step)
+    else:
+        at = float(params['time']) if params.get('time') else (now or time.time())
+        params['time'] = _format(math.floor(at / instant_align) * instant_align)
+    return params
+
+
+class Entry:
+    __slots__ = ('status', 'body', 'content_type', 'expires')
+
+    def __init__(self, status, body, content_type, expires):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.expires = expires
+
+
+class QueryCache:
+    """LRU of upstream responses, bounded by entry count and bytes, with a per-entry TTL"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.evictions = defaultdict(int)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= self.clock():
+            self._remove(key, 'ttl')
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, status, body, content_type):
+        if len(body) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key, None)
+        self.entries[key] = Entry(status, body, content_type, self.clock() + self.ttl)
+        self.bytes += len(body)
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)), 'size')
+
+    def expire(self):
+        now = self.clock()
+        for key in [k for k, e in self.entries.items() if e.expires <= now]:
+            self._remove(key, 'ttl')
+
+    def _remove(self, key, reason):
+        entry = self.entries.pop(key)
+        self.bytes -= len(entry.body)
+        if reason:
+            self.evictions[reason] += 1
+
+
+class Stats:
+    """Counters exposed on /metrics"""
+
+    def __init__(self):
+        self.requests = defaultdict(int)            # (endpoint, result) -> count
+        self.upstream = defaultdict(int)            # (endpoint, code) -> count
+        self.upstream_seconds = defaultdict(float)  # endpoint -> seconds
+
+    def hit_ratio(self):
+        served = sum(n for (endpoint, result), n in self.requests.items() if endpoint in CACHED_ENDPOINTS.values())
+        saved = sum(n for (_, result), n in self.requests.items() if result in ('hit', 'coalesced'))
+        return saved / served if served else 0.0
+
+    def exposition(self, cache, inflight):
+        lines = ["# HELP query_cache_requests_total Requests received, by endpoint and how they were answered",
+                 "# TYPE query_cache_requests_total counter"]
+        lines += [f'query_cache_requests_total{{endpoint="{e}",result="{r}"}} {n}'
+                  for (e, r), n in sorted(self.requests.items())]
+        lines += ["# HELP query_cache_upstream_requests_total Requests sent to Prometheus, by endpoint and status code",
+                  "# TYPE query_cache_upstream_requests_total counter"]
+        lines += [f'query_cache_upstream_requests_total{{endpoint="{e}",code="{c}"}} {n}'
+                  for (e, c), n in sorted(self.upstream.items())]
+        lines += ["# HELP query_cache_upstream_seconds_total Time spent waiting for Prometheus",
+                  "# TYPE query_cache_upstream_seconds_total counter"]
+        lines += [f'query_cache_upstream_seconds_total{{endpoint="{e}"}} {s:.6f}'
+                  for e, s in sorted(self.upstream_seconds.items())]
+        lines += ["# HELP query_cache_evictions_total Cache entries dropped, by reason",
+                  "# TYPE query_cache_evictions_total counter"]
+        lines += [f'query_cache_evictions_total{{reason="{r}"}} {n}' for r, n in sorted(cache.evictions.items())]
+        lines += ["# HELP query_cache_hit_ratio Share of cacheable requests answered without a new upstream query",
+                  "# TYPE query_cache_hit_ratio gauge", f"query_cache_hit_ratio {self.hit_ratio():.6f}",
+                  "# HELP query_cache_entries Responses in the cache", "# TYPE query_cache_entries gauge",
+                  f"query_cache_entries {len(cache)}",
+                  "# HELP query_cache_bytes Response bytes in the cache", "# TYPE query_cache_bytes gauge",
+                  f"query_cache_bytes {cache.bytes}",
+                  "# HELP query_cache_inflight Upstream queries currently shared by waiting requests",
+                  "# TYPE query_cache_inflight gauge", f"query_cache_inflight {inflight}"]
+        return '\n'.join(lines) + '\n'
+
+
+def _error(message, status=502):
+    return web.json_response({'status': 'error', 'errorType': 'unavailable', 'error': message}, status=status)
+
+
+def create_app(upstream=DEFAULT_UPSTREAM, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+               max_bytes=DEFAULT_MAX_BYTES, instant_align=DEFAULT_INSTANT_ALIGN):
+    upstream = upstream.rstrip('/')
+    cache = QueryCache(ttl, max_entries, max_bytes)
+    stats = Stats()
+    inflight = {}
+    app = web.Application()
+
+    async def open_session(app):
+        app['session'] = ClientSession(timeout=ClientTimeout(total=UPSTREAM_TIMEOUT))
+
+    async def close_session(app):
+        await app['session'].close()
+
+    app.on_startup.append(open_session)
+    app.on_cleanup.append(close_session)
+
+    def forwarded_headers(request):
+        return {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+
+    async def fetch(endpoint, path, params, headers):
+        started = time.perf_counter()
+        async with app['session'].post(upstream + path, data=params, headers=headers) as response:
+            body = await response.read()
+            status, content_type = response.status, response.content_type
+        stats.upstream[(endpoint, status)] += 1
+        stats.upstream_seconds[endpoint] += time.perf_counter() - started
+        return status, body, content_type
+
+    async def cached_query(request):
+        endpoint = CACHED_ENDPOINTS[request.path]
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        headers = {k: v for k, v in forwarded_headers(request).items() if k != 'Content-Type'}
+
+        try:
+            aligned = align_params(endpoint, params, instant_align=instant_align)
+        except (KeyError, ValueError):
+            # Let Prometheus word the error (or answer a form we do not understand)
+            stats.requests[(endpoint, 'bypass')] += 1
+            try:
+                status, body, content_type = await fetch(endpoint, request.path, params, headers)
+            except (ClientError, asyncio.TimeoutError) as e:
+                return _error(f"upstream {upstream}: {e or type(e).__name__}")
+            return web.Response(status=status, body=body, content_type=content_type)
+
+        key = (endpoint, tuple(sorted(aligned.items())), headers.get('Authorization'), headers.get('X-Scope-OrgID'))
+        entry = cache.get(key)
+        if entry is not None:
+            stats.requests[(endpoint, 'hit')] += 1
+            return web.Response(status=entry.status, body=entry.body, content_type=entry.content_type)
+
+        if key in inflight:
+            stats.requests[(endpoint, 'coalesced')] += 1
+        else:
+            stats.requests[(endpoint, 'miss')] += 1
+            inflight[key] = asyncio.ensure_future(fetch(endpoint, request.path, aligned, headers))
+            inflight[key].add_done_callback(lambda task: finish(key, task))
+        try:
+            # Shielded: a viewer closing the dashboard must not cancel the query the others wait for
+            status, body, content_type = await asyncio.shield(inflight[key])
+        except (ClientError, asyncio.TimeoutError) as e:
+            return _error(f"upstream {upstream}: {e or type(e).__name__}")
+        return web.Response(status=status, body=body, content_type=content_type)
+
+    def finish(key, task):
+        inflight.pop(key, None)
+        # Errors (bad query, timeout, overload) are not cached; the next refresh retries them
+        if not task.cancelled() and task.exception() is None and task.result()[0] == 200:
+            cache.put(key, *task.result())
+
+    async def passthrough(request):
+        stats.requests[('other', 'bypass')] += 1
+        body = await request.read() if request.can_read_body else None
+        try:
+            async with app['session'].request(request.method, upstream + request.path, params=request.query,
+                                              data=body, headers=forwarded_headers(request)) as response:
+                return web.Response(status=response.status, body=await response.read(),
+                                    content_type=response.content_type)
+        except (ClientError, asyncio.TimeoutError) as e:
+            return _error(f"upstream {upstream}: {e or type(e).__name__}")
+
+    async def metrics(request):
+        cache.expire()
+        return web.Response(text=stats.exposition(cache, len(inflight)), content_type='text/plain')
+
+    app.router.add_route('GET', '/metrics', metrics)
+    for path in CACHED_ENDPOINTS:
+        app.router.add_route('GET', path, cached_query)
+        app.router.add_route('POST', path, cached_query)
+    app.router.add_route('*', '/{tail:.*}', passthrough)
+    app['cache'], app['stats'] = cache, stats
+    return app
+
+
+async def start_proxy(host='127.0.0.1', port=0, **options):
+    """Start the proxy in the running event loop. Returns (runner, base_url); call runner.cleanup() to stop."""
+    runner = web.AppRunner(create_app(**options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_host, bound_port = runner.addresses[0][:2]
+    return runner, f"http://{bound_host}:{bound_port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM, help=f'Prometheus base URL (default: {DEFAULT_UPSTREAM})')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9092)
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL, help=f'Seconds a result is cached (default: {DEFAULT_TTL:g})')
+    parser.add_argument('--max-entries', type=int, default=DEFAULT_MAX_ENTRIES)
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 2, help='Cache size limit in MiB')
+    parser.add_argument('--instant-align', type=float, default=DEFAULT_INSTANT_ALIGN,
+                        help=f'Seconds instant query times are rounded down to (default: {DEFAULT_INSTANT_ALIGN:g})')
+    args = parser.parse_args()
+    web.run_app(create_app(args.upstream, args.ttl, args.max_entries, int(args.max_mb * 1024 ** 2), args.instant_align),
+                host=args.host, port=args.port)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Collapse per-label query variants into one grouped query.
+
+Panels (or targets within a panel) that run the same `sum(...)` and differ
+only in one label matcher, e.g. one stat per status code:
+
+    sum(rate(http_server_request_duration_seconds_count{http_response_status_code="400"}[1m])) or vector(0)
+    sum(rate(http_server_request_duration_seconds_count{http_response_status_code="404"}[1m])) or vector(0)
+
+are replaced by a single `sum(...) by (http_response_status_code)` query over
+`=~"400|404"`. Targets inside one panel become one target with the same
+legends; separate stat/gauge panels share the grouped result through the
+`-- Dashboard --` datasource and each pick their own field.
+"""
+
+import re
+from dataclasses import dataclass
+
+import promql
+from query_dedup import DASHBOARD_DATASOURCE, query_scopes, query_targets
+from recording_rules import PRESERVED_LABELS
+
+# Label carrying per-variant legend text when a group needs custom names
+LEGEND_LABEL = 'legend'
+
+# Panel types that reduce a query to one value and can select it by field name
+SINGLE_VALUE_PANELS = {'stat', 'gauge', 'bargauge'}
+
+_STATUS_CLASS = re.compile(r'\d\.\.')
+
+
+@dataclass
+class Variant:
+    key: tuple
+    label: str
+    op: str
+    value: str
+    base: object
+    fallback: bool
+
+
+def label_variant(expr):
+    """Split `sum(<selector with one varying matcher>) [or vector(0)]` into a Variant, else None"""
+    try:
+        node = promql.parse(expr)
+    except promql.PromQLError:
+        return None
+
+    fallback = False
+    if isinstance(node, promql.BinaryOp) and node.op == 'or':
+        rhs = promql.strip_parens(node.rhs)
+        if isinstance(rhs, promql.Call) and rhs.func == 'vector':
+            node, fallback = node.lhs, True
+
+    base = promql.strip_parens(node)
+    if not isinstance(base, promql.Aggregation) or base.op != 'sum' or base.grouping is not None or base.param is not None:
+        return None
+    sels = promql.selectors(base.expr)
+    if len(sels) != 1:
+        return None
+
+    varying = [m for m in sels[0].matchers
+               if m.op in ('=', '=~') and '$' not in m.value and m.name not in PRESERVED_LABELS]
+    if len(varying) != 1:
+        return None
+    matcher = varying[0]
+    if matcher.op == '=~' and not _STATUS_CLASS.fullmatch(matcher.value):
+        return None
+
+    def drop_matcher(n):
+        if isinstance(n, promql.Selector):
+            n.matchers = [m for m in n.matchers if m.name != matcher.name]
+        return None
+
+    template = promql.format_expr(promql.transform(base, drop_matcher))
+    return Variant((template, matcher.name, matcher.op), matcher.name, matcher.op, matcher.value, base, fallback)
+
+
+def field_name(variant):
+    """Series name a variant gets in the grouped result (5.. becomes 5xx)"""
+    return variant.value.replace('..', 'xx') if variant.op == '=~' else variant.value
+
+
+def grouped_expr(variants, legends=None):
+    """One query returning a series per variant.
+
+    With legends (one per variant) the series carry a `legend` label holding
+    that text; otherwise equality variants are grouped by their own label and
+    regex variants by their field_name().
+    """
+    first = variants[0]
+    patterns = [v.value if v.op == '=~' else re.escape(v.value) for v in variants]
+
+    def widen(n):
+        if isinstance(n, promql.Selector):
+            n.matchers = [promql.Matcher(m.name, '=~', '|'.join(patterns)) if m.name == first.label else m
+                          for m in n.matchers]
+        return None
+
+    inner = promql.transform(first.base.expr, widen)
+    if legends is None and first.op == '=':
+        return promql.format_expr(promql.Aggregation('sum', inner, grouping=[first.label]))
+
+    names = legends or [field_name(v) for v in variants]
+    for pattern, name in zip(patterns, names):
+        inner = promql.Call('label_replace', [
+            inner, promql.String(LEGEND_LABEL), promql.String(name.replace('$', '$$')),
+            promql.String(first.label), promql.String(pattern),
+        ])
+    return promql.format_expr(promql.Aggregation('sum', inner, grouping=[LEGEND_LABEL]))
+
+
+def _target_options(target):
+    return (target.get('format', 'time_series'), bool(target.get('instant', False)), target.get('interval', ''))
+
+
+def _groups(items):
+    """Group (item, target, variant) tuples by variant key, keeping distinct values only"""
+    groups = {}
+    for item, target, variant in items:
+        members = groups.setdefault((variant.key, _target_options(target)), [])
+        if all(v.value != variant.value for _, _, v in members):
+            members.append((item, target, variant))
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def consolidate_panel_targets(panel):
+    """Merge a panel's per-label targets into one grouped target. Returns targets removed."""
+    if not query_targets(panel):
+        return 0
+    panel['targets'] = [dict(t) for t in panel['targets']]
+    items = []
+    for target in query_targets(panel):
+        variant = label_variant(target['expr'])
+        if variant is not None and '{{' not in target.get('legendFormat', ''):
+            items.append((target, target, variant))
+
+    removed = 0
+    for members in _groups(items):
+        first_target = members[0][1]
+        variants = [v for _, _, v in members]
+        legends = [t.get('legendFormat') or field_name(v) for _, t, v in members]
+        if legends == [field_name(v) for v in variants]:
+            first_target['expr'] = grouped_expr(variants)
+            first_target['legendFormat'] = '{{' + (variants[0].label if variants[0].op == '=' else LEGEND_LABEL) + '}}'
+        else:
+            first_target['expr'] = grouped_expr(variants, legends)
+            first_target['legendFormat'] = '{{' + LEGEND_LABEL + '}}'
+        dropped = {id(t) for _, t, _ in members[1:]}
+        panel['targets'] = [t for t in panel['targets'] if id(t) not in dropped]
+        removed += len(dropped)
+    return removed
+
+
+def consolidate_panels(panels):
+    """Let single-value panels that differ by one label share one grouped query.
+
+    The first panel of each group runs the grouped query; the others read it
+    through the `-- Dashboard --` datasource. Every panel then shows only its
+    own series via reduceOptions.fields. Returns the number of queries removed.
+    """
+    items = []
+    for panel in panels:
+        targets = query_targets(panel)
+        if panel.get('type') not in SINGLE_VALUE_PANELS or len(targets) != 1 or panel.get('transformations'):
+            continue
+        # A library panel's model is shared with other dashboards, so it cannot join a group
+        if 'libraryPanel' in panel:
+            continue
+        variant = label_variant(targets[0]['expr'])
+        if variant is not None:
+            items.append((panel, targets[0], variant))
+
+    removed = 0
+    for members in _groups(items):
+        source, source_target, first = members[0]
+        variants = [v for _, _, v in members]
+        source['targets'] = [dict(source_target,
+                                  expr=grouped_expr(variants),
+                                  legendFormat='{{' + (first.label if first.op == '=' else LEGEND_LABEL) + '}}')]
+
+        for panel, _, variant in members:
+            options = dict(panel.get('options', {}))
+            options['reduceOptions'] = dict(options.get('reduceOptions', {}), fields=f"/^{re.escape(field_name(variant))}$/")
+            panel['options'] = options
+            if variant.fallback:
+                # The grouped query drops `or vector(0)`; a code with no series shows 0 instead
+                field_config = dict(panel.get('fieldConfig', {}))
+                defaults = field_config.get('defaults', {})
+                field_config['defaults'] = dict(defaults, noValue=defaults.get('noValue', '0'))
+                panel['fieldConfig'] = field_config
+            if panel is not source:
+                panel['datasource'] = dict(DASHBOARD_DATASOURCE)
+                panel['targets'] = [{"datasource": dict(DASHBOARD_DATASOURCE), "panelId": source['id'], "refId": "A"}]
+                removed += 1
+    return removed
+
+
+def consolidate_queries(dashboard):
+    """Apply both consolidations to a whole dashboard. Returns queries removed."""
+    removed = 0
+    for scope in query_scopes(dashboard):
+        for panel in scope:
+            removed += consolidate_panel_targets(panel)
+        removed += consolidate_panels(scope)
+    return removed
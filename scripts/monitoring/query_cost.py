@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Static cost model and lint rules for dashboard PromQL.
+
+Cost is measured in "sample reads": one unit per series-sample Prometheus has
+to touch. A panel's cost is the cost of one evaluation times the number of
+evaluation steps Grafana asks for; a dashboard's load is the summed cost of
+the panels Grafana queries on open, divided by the refresh interval.
+"""
+
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+import promql
+from dashboard_utils import SCRIPT_DIR, load_yaml
+from query_dedup import query_scopes, query_targets
+
+BUDGETS_FILE = SCRIPT_DIR / "query-budgets.yml"
+
+SCRAPE_INTERVAL = 15          # seconds, global scrape_interval in prometheus.yml
+MIN_STEP = 15                 # seconds, datasource timeInterval
+PIXELS_PER_GRID_COLUMN = 50   # Grafana caps maxDataPoints at the panel's pixel width
+HISTOGRAM_BUCKETS = 12        # typical bucket count of our OpenTelemetry histograms
+REGEX_FACTOR = 1.2            # regex matchers scan every value of the label
+UNAGGREGATED_QUANTILE_FACTOR = 1.5
+FALLBACK_COST = 0.5           # `or vector(0)` evaluates a second branch every step
+LONG_WINDOW = 600             # seconds; windows this long recomputed at a fast refresh get flagged
+
+DEFAULT_BUDGET = 100.0        # sample reads per second per viewer
+
+_DURATION = re.compile(r'now-(\d+)([smhdwy])')
+
+
+@dataclass
+class Finding:
+    rule: str
+    severity: str     # 'error' or 'warning'
+    message: str
+
+
+@dataclass
+class PanelCost:
+    panel: dict
+    cost: float
+    findings: List[Finding] = field(default_factory=list)
+    loaded: bool = True   # False for panels in collapsed rows
+
+
+@dataclass
+class DashboardCost:
+    uid: str
+    title: str
+    refresh_seconds: float
+    panels: List[PanelCost]
+
+    @property
+    def cost_per_refresh(self):
+        return sum(p.cost for p in self.panels if p.loaded)
+
+    @property
+    def load(self):
+        """Sample reads per second per open viewer"""
+        if not self.refresh_seconds:
+            return 0.0
+        return self.cost_per_refresh / self.refresh_seconds
+
+    @property
+    def collapsed_cost(self):
+        return sum(p.cost for p in self.panels if not p.loaded)
+
+
+def time_range_seconds(dashboard):
+    match = _DURATION.fullmatch(dashboard.get('time', {}).get('from', 'now-1h'))
+    if not match:
+        return 3600
+    return int(match.group(1)) * promql.duration_seconds('1' + match.group(2))
+
+
+def refresh_seconds(dashboard):
+    refresh = dashboard.get('refresh') or ''
+    return promql.duration_seconds(refresh) if refresh else 0.0
+
+
+def query_step(target, panel, range_seconds):
+    """The query_range step Grafana picks for a target, in seconds"""
+    interval = target.get('interval') or panel.get('interval')
+    max_points = panel.get('maxDataPoints') or panel.get('gridPos', {}).get('w', 12) * PIXELS_PER_GRID_COLUMN
+    return max(MIN_STEP, (interval and promql.duration_seconds(interval)) or 0, range_seconds / max_points)
+
+
+def evaluation_steps(target, panel, range_seconds):
+    """How many times Prometheus evaluates the expression per refresh"""
+    if target.get('instant'):
+        return 1
+    return max(1, int(range_seconds // query_step(target, panel, range_seconds)))
+
+
+def expression_cost(node):
+    """Sample reads for one evaluation of an expression"""
+    if isinstance(node, promql.Selector):
+        samples = _window_samples(node.range) if node.range else 1.0
+        metric = node.metric or ''
+        series = HISTOGRAM_BUCKETS if _is_bucket(metric) else 1
+        if any(m.op in ('=~', '!~') and not m.value.startswith('$') for m in node.matchers):
+            series *= REGEX_FACTOR
+        return samples * series
+    if isinstance(node, promql.Subquery):
+        steps = max(1.0, promql.duration_seconds(node.range) / (promql.duration_seconds(node.step) if node.step else MIN_STEP))
+        return steps * expression_cost(node.expr)
+    if isinstance(node, promql.Call) and node.func == 'histogram_quantile' and len(node.args) == 2:
+        inner = promql.strip_parens(node.args[1])
+        factor = 1.0 if isinstance(inner, promql.Aggregation) else UNAGGREGATED_QUANTILE_FACTOR
+        return factor * sum(expression_cost(c) for c in promql.children(node))
+    cost = sum(expression_cost(c) for c in promql.children(node))
+    if isinstance(node, promql.BinaryOp) and node.op == 'or' and _is_vector_literal(node.rhs):
+        cost += FALLBACK_COST
+    return cost
+
+
+def _window_samples(window):
+    """Samples per series in a range selector; Grafana variables count as a typical 1m window"""
+    seconds = promql.duration_seconds(window) or 60
+    return max(1.0, seconds / SCRAPE_INTERVAL)
+
+
+def _is_bucket(metric):
+    """Classic histogram bucket series, raw or recorded (native histograms keep every bucket in one series)"""
+    return metric.endswith('_bucket') or '_bucket:' in metric
+
+
+def _is_vector_literal(node):
+    node = promql.strip_parens(node)
+    return isinstance(node, promql.Call) and node.func == 'vector'
+
+
+def lint_expression(node, refresh):
+    """Cost-related problems in one expression"""
+    findings = []
+    for n in promql.walk(node):
+        if isinstance(n, promql.Call) and n.func == 'histogram_quantile' and len(n.args) == 2:
+            inner = promql.strip_parens(n.args[1])
+            grouping = (inner.grouping or []) if isinstance(inner, promql.Aggregation) else []
+            # Native histograms have no le label to keep
+            classic = any(_is_bucket(s.metric or '') for s in promql.selectors(inner))
+            if classic and not isinstance(inner, promql.Aggregation):
+                findings.append(Finding('quantile-without-le', 'warning',
+                                        "histogram_quantile without sum(...) by (le) computes a quantile for every raw series"))
+            elif classic and ('le' in grouping) == bool(inner.without):
+                findings.append(Finding('quantile-drops-le', 'error', "histogram_quantile aggregation drops the le label"))
+        if isinstance(n, promql.Selector):
+            for m in n.matchers:
+                if m.op in ('=~', '!~') and not m.value.startswith('$'):
+                    findings.append(Finding('regex-matcher', 'warning',
+                                            f'regex matcher {m.name}{m.op}"{m.value}" cannot use the label index directly'))
+            window = promql.duration_seconds(n.range) if n.range else None
+            if window and window >= LONG_WINDOW and refresh and refresh < window / 60:
+                findings.append(Finding('long-window', 'warning',
+                                        f"[{n.range}] window recomputed every {refresh:g}s "
+                                        f"({window / SCRAPE_INTERVAL:.0f} samples per series per step)"))
+        if isinstance(n, promql.BinaryOp) and n.op == 'or' and _is_vector_literal(n.rhs):
+            findings.append(Finding('vector-fallback', 'warning',
+                                    "`or vector(0)` fallback evaluates an extra branch every step; prefer the panel's noValue"))
+    return findings
+
+
+def panel_cost(panel, range_seconds, refresh):
+    result = PanelCost(panel, 0.0)
+    for target in query_targets(panel):
+        try:
+            node = promql.parse(target['expr'])
+        except promql.PromQLError as e:
+            result.findings.append(Finding('parse-error', 'error', f"unparsable query: {e}"))
+            continue
+        result.cost += expression_cost(node) * evaluation_steps(target, panel, range_seconds)
+        result.findings.extend(lint_expression(node, refresh))
+    return result
+
+
+def analyze_dashboard(dashboard):
+    range_seconds = time_range_seconds(dashboard)
+    refresh = refresh_seconds(dashboard)
+    panels = []
+    for index, scope in enumerate(query_scopes(dashboard)):
+        for panel in scope:
+            cost = panel_cost(panel, range_seconds, refresh)
+            cost.loaded = index == 0
+            panels.append(cost)
+    return DashboardCost(dashboard.get('uid', ''), dashboard.get('title', ''), refresh, panels)
+
+
+def queries_per_second(dashboard):
+    """Prometheus queries one open viewer causes per second (cached panels count once per TTL)"""
+    refresh = refresh_seconds(dashboard)
+    if not refresh:
+        return 0.0
+    return sum(len(query_targets(p)) / max(refresh, p.get('queryCachingTTL', 0) / 1000)
+               for p in query_scopes(dashboard)[0])
+
+
+def load_budgets(path=BUDGETS_FILE, variant=None):
+    """Per-dashboard budgets keyed by uid, with a 'default' fallback.
+
+    variant names a section of overrides for dashboards generated in another
+    mode (e.g. 'text-sections', where no row is collapsed).
+    """
+    config = load_yaml(path) if Path(path).exists() else {}
+    budgets = dict(config.get('dashboards') or {})
+    if variant:
+        budgets.update(config.get(variant) or {})
+    budgets.setdefault('default', config.get('default', DEFAULT_BUDGET))
+    return budgets
+
+
+def budget_for(uid, budgets):
+    return float(budgets.get(uid, budgets['default']))
+
+
+def format_report(analysis, budget=None, top=10, verbose=False):
+    lines = [f"📊 {analysis.title} ({analysis.uid})",
+             f"   Refresh: {analysis.refresh_seconds:g}s   Cost/refresh: {analysis.cost_per_refresh:,.0f}   "
+             f"Load: {analysis.load:,.1f} reads/s per viewer"
+             + (f"   Budget: {budget:,.0f}" if budget is not None else "")]
+    if analysis.collapsed_cost:
+        lines.append(f"   Collapsed rows: {analysis.collapsed_cost:,.0f} more per refresh when expanded")
+    ranked = sorted((p for p in analysis.panels if p.cost), key=lambda p: -p.cost)[:top]
+    for p in ranked:
+        lines.append(f"   {p.cost:>9,.0f}  {p.panel.get('title', '?')}" + ("" if p.loaded else " (collapsed)"))
+
+    by_rule = {}
+    for p in analysis.panels:
+        for f in p.findings:
+            by_rule.setdefault(f.rule, []).append((p, f))
+    for rule, hits in sorted(by_rule.items()):
+        icon = '❌' if hits[0][1].severity == 'error' else '⚠️ '
+        panels = {id(p.panel) for p, _ in hits}
+        lines.append(f"   {icon} {rule}: {len(hits)} in {len(panels)} panel(s)")
+        seen = set()
+        for p, f in hits if verbose else hits[:3]:
+            if (id(p.panel), f.message) not in seen:
+                seen.add((id(p.panel), f.message))
+                lines.append(f"        {p.panel.get('title', '?')}: {f.message}")
+    return '\n'.join(lines)
+
+
+def check_budget(dashboard, budgets=None):
+    """Analyse a dashboard and compare it with its budget. Returns (ok, report)."""
+    budgets = budgets or load_budgets()
+    analysis = analyze_dashboard(dashboard)
+    budget = budget_for(analysis.uid, budgets)
+    errors = [f for p in analysis.panels for f in p.findings if f.severity == 'error']
+    ok = analysis.load <= budget and not errors
+    return ok, format_report(analysis, budget)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Run each distinct panel query once and share the result through Grafana's `-- Dashboard --` datasource.
+
+A panel whose queries are all (canonically) identical to queries of another
+panel is switched to the Dashboard datasource pointing at that panel, so
+Prometheus only sees the query once per refresh. A `filterByRefId`
+transformation trims the shared result when the panel only needs some of the
+source panel's queries.
+"""
+
+import copy
+
+from dashboard_utils import iter_panels
+from promql import canonical_text
+
+DASHBOARD_DATASOURCE = {"type": "datasource", "uid": "-- Dashboard --"}
+
+
+def target_signature(target):
+    """What makes two targets return the same frames: canonical query plus display options"""
+    return (
+        canonical_text(target['expr']),
+        target.get('legendFormat', ''),
+        target.get('format', 'time_series'),
+        bool(target.get('instant', False)),
+        target.get('interval', ''),
+    )
+
+
+def is_dashboard_datasource(panel):
+    return (panel.get('datasource') or {}).get('uid') == DASHBOARD_DATASOURCE['uid']
+
+
+def query_targets(panel):
+    """Visible PromQL targets of a panel (empty for rows, text panels and reused panels)"""
+    if panel.get('type') == 'row' or is_dashboard_datasource(panel):
+        return []
+    return [t for t in panel.get('targets', []) if t.get('expr') and not t.get('hide')]
+
+
+def inline_shared_queries(dashboard):
+    """Give every panel reading another panel's result that panel's queries back.
+
+    Copies of these panels in another dashboard get new ids, so their
+    `panelId` would point at the wrong panel or none. The generators inline
+    the queries when they load a source dashboard and let
+    consolidate_queries() and deduplicate_queries() share them again where
+    the copies end up. Returns the number of panels changed.
+    """
+    panels = list(iter_panels(dashboard.get('panels', [])))
+    sources = {p['id']: p for p in panels if 'id' in p and p.get('type') != 'row' and not is_dashboard_datasource(p)}
+    inlined = 0
+    for panel in panels:
+        if not is_dashboard_datasource(panel):
+            continue
+        source = sources.get(next((t['panelId'] for t in panel.get('targets', []) if 'panelId' in t), None))
+        if source is None:
+            continue
+        panel['datasource'] = copy.deepcopy(source.get('datasource', {"type": "prometheus"}))
+        panel['targets'] = copy.deepcopy(source.get('targets', []))
+        inlined += 1
+    return inlined
+
+
+def query_scopes(dashboard):
+    """Group panels by when Grafana loads them.
+
+    Top-level panels (including the children of expanded rows) are always
+    loaded; each collapsed row only loads its children when it is opened. A
+    panel may reuse results from its own scope or from the always-loaded one.
+    """
+    always = []
+    collapsed = []
+    for panel in dashboard.get('panels', []):
+        if panel.get('type') == 'row':
+            if panel.get('collapsed'):
+                collapsed.append(panel.get('panels', []))
+            else:
+                always.extend(panel.get('panels', []))
+        else:
+            always.append(panel)
+    return [always] + collapsed
+
+
+def _reuse(panel, source, source_refs):
+    refs = [source_refs[target_signature(t)] for t in query_targets(panel)]
+    original_refs = [t['refId'] for t in query_targets(panel)]
+    if panel.get('transformations') and refs != original_refs:
+        # Existing transformations may refer to this panel's own refIds
+        return False
+
+    panel['datasource'] = dict(DASHBOARD_DATASOURCE)
+    panel['targets'] = [{"datasource": dict(DASHBOARD_DATASOURCE), "panelId": source['id'], "refId": "A"}]
+    if set(refs) != set(source_refs.values()):
+        pattern = refs[0] if len(refs) == 1 else f"/^({'|'.join(refs)})$/"
+        panel['transformations'] = [{"id": "filterByRefId", "options": {"include": pattern}}] + panel.get('transformations', [])
+    return True
+
+
+def deduplicate_queries(dashboard):
+    """Point panels with duplicate queries at the first panel that runs them.
+
+    Returns (queries_before, queries_after, reused_panels).
+    """
+    before = sum(len(query_targets(p)) for scope in query_scopes(dashboard) for p in scope)
+    reused = 0
+    shared_sources = []
+
+    for index, scope in enumerate(query_scopes(dashboard)):
+        sources = list(shared_sources)
+        for panel in scope:
+            targets = query_targets(panel)
+            if not targets:
+                continue
+            signatures = [target_signature(t) for t in targets]
+            match = None
+            for source, source_refs in sources:
+                if all(sig in source_refs for sig in signatures):
+                    match = (source, source_refs)
+                    if len(source_refs) == len(set(signatures)):
+                        break
+            # Library panels are shared with other dashboards: they may be a source, never a reader
+            if match and 'libraryPanel' not in panel and _reuse(panel, *match):
+                reused += 1
+                continue
+            refs = {}
+            for sig, target in zip(signatures, targets):
+                refs.setdefault(sig, target['refId'])
+            sources.append((panel, refs))
+        if index == 0:
+            shared_sources = sources
+
+    after = sum(len(query_targets(p)) for scope in query_scopes(dashboard) for p in scope)
+    return before, after, reused
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Replay a dashboard's query load against a Prometheus-compatible API.
+
+Each simulated viewer behaves like an open browser tab: every refresh it
+sends the query_range request of every panel Grafana loads on open (collapsed
+rows excluded) with the step Grafana would pick, then waits for the next
+refresh. All viewers share one pooled aiohttp session.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import aiohttp
+
+from query_cost import SCRAPE_INTERVAL, query_step, refresh_seconds, time_range_seconds
+from query_dedup import query_scopes, query_targets
+
+_VARIABLE = re.compile(r'\$\{(\w+)(?::\w+)?\}|\[\[(\w+)\]\]|\$(\w+)')
+
+
+@dataclass
+class ReplayQuery:
+    panel_id: int
+    panel_title: str
+    ref_id: str
+    expr: str
+    step: float
+    instant: bool = False
+
+    @property
+    def key(self):
+        return f"{self.panel_title} [{self.panel_id}]"
+
+
+@dataclass
+class ReplayStats:
+    viewers: int
+    refresh: float
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    refreshes: List[float] = field(default_factory=list)
+    overruns: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def total_queries(self):
+        return sum(len(v) for v in self.latencies.values()) + sum(self.errors.values())
+
+    @property
+    def total_errors(self):
+        return sum(self.errors.values())
+
+    @property
+    def qps(self):
+        return self.total_queries / self.elapsed if self.elapsed else 0.0
+
+    def all_latencies(self):
+        return [latency for values in self.latencies.values() for latency in values]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def format_duration(seconds):
+    if seconds == int(seconds):
+        return f"{int(seconds)}s"
+    return f"{int(seconds * 1000)}ms"
+
+
+def variable_values(dashboard):
+    """Current value of every template variable, multi-values as a regex alternation"""
+    values = {}
+    for variable in dashboard.get('templating', {}).get('list', []):
+        current = (variable.get('current') or {}).get('value')
+        if isinstance(current, list):
+            current = '|'.join(current)
+        values[variable['name']] = '.*' if current in (None, '', '$__all') else str(current)
+    return values
+
+
+def interpolate(expr, step, range_seconds, variables=None):
+    """Substitute Grafana's built-in and template variables the way the Prometheus datasource does"""
+    builtins = {
+        '__interval': format_duration(step),
+        '__interval_ms': str(int(step * 1000)),
+        '__rate_interval': format_duration(max(step + SCRAPE_INTERVAL, 4 * SCRAPE_INTERVAL)),
+        '__range': format_duration(range_seconds),
+        '__range_s': str(int(range_seconds)),
+        '__range_ms': str(int(range_seconds * 1000)),
+    }
+    variables = variables or {}
+
+    def substitute(match):
+        name = match.group(1) or match.group(2) or match.group(3)
+        if name in builtins:
+            return builtins[name]
+        return variables.get(name, '.*')
+
+    return _VARIABLE.sub(substitute, expr)
+
+
+def dashboard_queries(dashboard, include_collapsed=False):
+    """The requests one viewer sends per refresh"""
+    range_seconds = time_range_seconds(dashboard)
+    variables = variable_values(dashboard)
+    scopes = query_scopes(dashboard)
+    panels = [p for scope in (scopes if include_collapsed else scopes[:1]) for p in scope]
+    queries = []
+    for panel in panels:
+        for target in query_targets(panel):
+            step = query_step(target, panel, range_seconds)
+            queries.append(ReplayQuery(
+                panel.get('id'), panel.get('title', ''), target.get('refId', 'A'),
+                interpolate(target['expr'], step, range_seconds, variables),
+                step, bool(target.get('instant')),
+            ))
+    return queries
+
+
+async def _run_query(session, base_url, query, range_seconds, timeout, stats, limit):
+    end = int(time.time() // query.step * query.step)
+    if query.instant:
+        path, data = '/api/v1/query', {'query': query.expr, 'time': str(end)}
+    else:
+        path = '/api/v1/query_range'
+        data = {'query': query.expr, 'start': str(end - range_seconds), 'end': str(end), 'step': str(query.step)}
+
+    async with limit:
+        started = time.perf_counter()
+        try:
+            async with session.post(base_url + path, data=data, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                body = await resp.read()
+                ok = resp.status == 200 and json.loads(body).get('status') == 'success'
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            ok = False
+        latency = time.perf_counter() - started
+
+    if ok:
+        stats.latencies.setdefault(query.key, []).append(latency)
+    else:
+        stats.errors[query.key] = stats.errors.get(query.key, 0) + 1
+
+
+async def _viewer(session, base_url, queries, range_seconds, stats, deadline, offset, timeout, per_viewer):
+    await asyncio.sleep(offset)
+    limit = asyncio.Semaphore(per_viewer)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.gather(*(_run_query(session, base_url, q, range_seconds, timeout, stats, limit) for q in queries))
+        took = time.perf_counter() - started
+        stats.refreshes.append(took)
+        if took > stats.refresh:
+            stats.overruns += 1
+        await asyncio.sleep(max(0.0, min(stats.refresh - took, deadline - time.perf_counter())))
+
+
+async def replay(dashboard, base_url, viewers, duration, refresh=None, include_collapsed=False,
+                 connections=100, per_viewer=6, timeout=30.0):
+    """Simulate `viewers` open tabs for `duration` seconds. Returns ReplayStats.
+
+    Viewers start spread over one refresh interval, like people opening the
+    dashboard at different times; each sends at most `per_viewer` requests at
+    once (the browser's per-host connection limit).
+    """
+    refresh = refresh or refresh_seconds(dashboard) or 5.0
+    range_seconds = time_range_seconds(dashboard)
+    queries = dashboard_queries(dashboard, include_collapsed)
+    stats = ReplayStats(viewers, refresh)
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            _viewer(session, base_url.rstrip('/'), queries, range_seconds, stats, deadline,
+                    random.uniform(0, refresh), timeout, per_viewer)
+            for _ in range(viewers)
+        ))
+        stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def _ms(value):
+    return f"{value * 1000:7.1f}" if value is not None else "      -"
+
+
+def format_stats(stats, top=None):
+    """Per-panel and per-dashboard latency table for one replay run"""
+    latencies = stats.all_latencies()
+    error_rate = stats.total_errors / stats.total_queries * 100 if stats.total_queries else 0.0
+    lines = [
+        f"   Viewers: {stats.viewers}   Refresh: {stats.refresh:g}s   Duration: {stats.elapsed:.0f}s",
+        f"   Queries: {stats.total_queries:,} ({stats.total_errors} errors, {error_rate:.1f}%)   QPS: {stats.qps:.1f}",
+        f"   {'':<44}{'n':>7}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'errors':>8}",
+        f"   {'All queries':<44}{len(latencies):>7}{_ms(percentile(latencies, 50))} "
+        f"{_ms(percentile(latencies, 95))} {_ms(percentile(latencies, 99))}{stats.total_errors:>8}",
+        f"   {'Dashboard refresh (all panels)':<44}{len(stats.refreshes):>7}{_ms(percentile(stats.refreshes, 50))} "
+        f"{_ms(percentile(stats.refreshes, 95))} {_ms(percentile(stats.refreshes, 99))}{stats.overruns:>8}",
+    ]
+    keys = sorted(set(stats.latencies) | set(stats.errors),
+                  key=lambda k: -(percentile(stats.latencies.get(k, []), 95) or 0))
+    for key in keys[:top] if top else keys:
+        values = stats.latencies.get(key, [])
+        lines.append(f"   {key[:44]:<44}{len(values):>7}{_ms(percentile(values, 50))} "
+                     f"{_ms(percentile(values, 95))} {_ms(percentile(values, 99))}{stats.errors.get(key, 0):>8}")
+    return '\n'.join(lines)
+
+
+def degraded(stats, max_error_rate=0.01):
+    """A run is degraded when refreshes take longer than the refresh interval or queries fail"""
+    p95 = percentile(stats.refreshes, 95)
+    errors = stats.total_errors / stats.total_queries if stats.total_queries else 0.0
+    return (p95 is not None and p95 > stats.refresh) or errors > max_error_rate
+
+
+def stats_document(stats):
+    """JSON-serialisable summary of a run"""
+    def summary(values):
+        return {'count': len(values), 'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                'p99': percentile(values, 99)}
+
+    return {
+        'viewers': stats.viewers,
+        'refresh_seconds': stats.refresh,
+        'elapsed_seconds': stats.elapsed,
+        'queries': stats.total_queries,
+        'errors': stats.total_errors,
+        'qps': stats.qps,
+        'overruns': stats.overruns,
+        'dashboard_refresh': summary(stats.refreshes),
+        'all_queries': summary(stats.all_latencies()),
+        'panels': {key: dict(summary(stats.latencies.get(key, [])), errors=stats.errors.get(key, 0))
+                   for key in sorted(set(stats.latencies) | set(stats.errors))},
+    }
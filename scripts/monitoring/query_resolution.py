@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Ask Prometheus for only the points a panel draws.
+
+Grafana sends every panel as a range query with a step of range /
+maxDataPoints, where maxDataPoints defaults to the panel's width in pixels on
+the viewer's screen, and a `[1m]` window stops covering the samples between
+two steps once zoomed out past a 1m step. Per panel type:
+
+    stat/gauge/bargauge/piechart  showing the last value only: instant queries,
+                                  one evaluation instead of one per step
+    stat with a sparkline         SPARKLINE_POINTS points
+    timeseries and other graphs   at most one point per pixel of the grid width
+
+Short `rate`/`irate` windows (up to four scrape intervals, the smallest window
+Grafana's `$__rate_interval` ever picks) become `$__rate_interval` in range
+queries, so they always span at least one step. Longer windows are a choice
+of the panel (a 5m trend, an hourly cost) and stay; panels whose shortest
+window is that long get a min interval of a fifth of it, since the curve
+cannot change faster than that.
+"""
+
+import dataclasses
+
+import promql
+from dashboard_utils import iter_panels
+from query_cost import PIXELS_PER_GRID_COLUMN, SCRAPE_INTERVAL
+from query_dedup import query_targets
+from refresh_tiers import query_windows
+
+RATE_INTERVAL = '$__rate_interval'
+RATE_INTERVAL_FUNCTIONS = {'rate', 'irate'}
+MAX_RATE_WINDOW = 4 * SCRAPE_INTERVAL   # seconds; $__rate_interval is never shorter
+
+SINGLE_VALUE_PANELS = {'stat', 'gauge', 'bargauge', 'piechart'}
+LAST_VALUE_CALCS = {'last', 'lastNotNull'}
+GRAPH_PANELS = {'timeseries', 'barchart', 'heatmap', 'state-timeline', 'status-history', 'histogram'}
+SPARKLINE_POINTS = 100
+
+SMOOTH_WINDOW = 300          # seconds; panels whose windows are all this long get a min interval
+STEPS_PER_WINDOW = 5
+
+
+def _format_duration(seconds):
+    for unit, size in (('h', 3600), ('m', 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{int(seconds // size)}{unit}"
+    return f"{int(seconds)}s"
+
+
+def shows_last_value(panel):
+    """True for single-value panels that reduce each series to its latest value"""
+    if panel.get('type') not in SINGLE_VALUE_PANELS:
+        return False
+    options = panel.get('options', {})
+    if panel['type'] == 'stat' and options.get('graphMode', 'area') != 'none':
+        return False
+    reduce = options.get('reduceOptions', {})
+    return not reduce.get('values', False) and set(reduce.get('calcs', ['lastNotNull'])) <= LAST_VALUE_CALCS
+
+
+def rate_interval_expr(text):
+    """Expression with short rate/irate windows replaced by $__rate_interval (unchanged if none or unparsable)"""
+    try:
+        node = promql.parse(text)
+    except promql.PromQLError:
+        return text
+
+    def widen(n):
+        if not (isinstance(n, promql.Call) and n.func in RATE_INTERVAL_FUNCTIONS and n.args):
+            return None
+        selector = n.args[0]
+        if not isinstance(selector, promql.Selector) or selector.range is None or selector.offset is not None:
+            return None
+        seconds = promql.duration_seconds(selector.range)
+        if seconds is None or seconds > MAX_RATE_WINDOW:
+            return None
+        return dataclasses.replace(n, args=[dataclasses.replace(selector, range=RATE_INTERVAL)] + n.args[1:])
+
+    rewritten = promql.format_expr(promql.transform(node, widen))
+    return text if rewritten == promql.format_expr(node) else rewritten
+
+
+def apply_query_resolution(dashboard):
+    """Set instant queries, maxDataPoints, min intervals and $__rate_interval windows.
+
+    Panels reading another panel's result through `-- Dashboard --` are left
+    alone, and library panels get no width-based maxDataPoints. Returns
+    (instant targets, capped panels, $__rate_interval targets).
+    """
+    instant = capped = rate_intervals = 0
+    for panel in iter_panels(dashboard.get('panels', [])):
+        targets = query_targets(panel)
+        if not targets:
+            continue
+        if shows_last_value(panel):
+            for target in targets:
+                target['instant'], target['range'] = True, False
+            instant += len(targets)
+            continue
+
+        if panel.get('type') == 'stat':
+            panel['maxDataPoints'] = SPARKLINE_POINTS
+            capped += 1
+        elif panel.get('type') in GRAPH_PANELS:
+            # A library panel's model is shared by instances of different widths; Grafana's
+            # default already caps each at its own width
+            if 'libraryPanel' not in panel:
+                panel['maxDataPoints'] = panel.get('gridPos', {}).get('w', 12) * PIXELS_PER_GRID_COLUMN
+                capped += 1
+        else:
+            continue
+
+        # A min interval also raises $__rate_interval (4x the interval), so those panels keep their windows
+        if panel.get('interval'):
+            continue
+        windows = query_windows(panel)
+        if windows and min(windows) >= SMOOTH_WINDOW:
+            panel['interval'] = _format_duration(min(windows) / STEPS_PER_WINDOW)
+            continue
+        for target in targets:
+            if target.get('instant'):
+                continue
+            expr = rate_interval_expr(target['expr'])
+            if expr != target['expr']:
+                target['expr'] = expr
+                rate_intervals += 1
+    return instant, capped, rate_intervals
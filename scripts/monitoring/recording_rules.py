@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Compile repeated rate/sum/histogram subexpressions into Prometheus recording rules.
+
+Panels that run `sum(rate(metric{...}[1m])) by (...)` or `rate(metric{...}[1m])`
+are rewritten to read a precomputed series instead. Aggregated rules keep the
+union of every label a panel groups or filters on (plus the scrape labels in
+PRESERVED_LABELS), so the panel's own matchers and `by` clause still apply to
+the recorded series and the results are unchanged.
+"""
+
+from dataclasses import dataclass, field
+from typing import Set
+
+import promql
+from dashboard_utils import RULES_DIR, iter_targets, load_dashboard, load_yaml, write_yaml
+
+RULES_FILE = RULES_DIR / "dashboard-recording-rules.yml"
+RULE_GROUP = "bookstore-dashboard-recording-rules"
+
+# Scrape-level labels every aggregated recording keeps so dashboards can still filter on them
+PRESERVED_LABELS = ['job', 'instance', 'service', 'environment']
+
+# Range functions worth precomputing (all are sum-able across series)
+COMPILABLE_FUNCTIONS = {'rate', 'irate', 'increase'}
+
+RULES_HEADER = """Generated by scripts/monitoring/compile-recording-rules.py - do not edit by hand.
+Precomputes the rate/histogram subexpressions shared by the Grafana dashboards."""
+
+
+@dataclass
+class RecordingRule:
+    func: str
+    metric: str
+    window: str
+    aggregated: bool
+    labels: Set[str] = field(default_factory=set)
+    occurrences: int = 0
+
+    @property
+    def record(self):
+        if self.aggregated:
+            return f"instance:{self.metric}:{self.func}{self.window}"
+        return f"{self.metric}:{self.func}{self.window}"
+
+    @property
+    def expr(self):
+        call = promql.Call(self.func, [promql.Selector(self.metric, range=self.window)])
+        if not self.aggregated:
+            return promql.format_expr(call)
+        return promql.format_expr(promql.Aggregation('sum', call, grouping=sorted(self.labels)))
+
+
+def _range_call(node):
+    """The selector of `func(metric{...}[window])` if it can be recorded, else None"""
+    node = promql.strip_parens(node)
+    if not isinstance(node, promql.Call) or node.func not in COMPILABLE_FUNCTIONS or len(node.args) != 1:
+        return None
+    selector = node.args[0]
+    if not isinstance(selector, promql.Selector) or not selector.metric or ':' in selector.metric:
+        return None
+    if selector.range is None or selector.range.startswith('$') or selector.offset is not None:
+        return None
+    if any(m.name == '__name__' for m in selector.matchers):
+        return None
+    return selector
+
+
+def match_candidate(node):
+    """Return (key, func, selector, grouping) for a recordable subexpression, else None.
+
+    The key identifies the recording rule the subexpression maps onto; grouping
+    is the panel's own `by` labels (None when it is not aggregated).
+    """
+    if isinstance(node, promql.Aggregation) and node.op == 'sum' and node.param is None and not node.without:
+        selector = _range_call(node.expr)
+        if selector is not None:
+            func = promql.strip_parens(node.expr).func
+            return (True, func, selector.metric, selector.range), func, selector, node.grouping or []
+    selector = _range_call(node)
+    if selector is not None and isinstance(node, promql.Call):
+        return (False, node.func, selector.metric, selector.range), node.func, selector, None
+    return None
+
+
+def find_candidates(node):
+    """All recordable subexpressions of an expression (outermost match wins)"""
+    found = []
+
+    def visit(n):
+        match = match_candidate(n)
+        if match is not None:
+            found.append(match)
+            return n
+        return None
+
+    promql.rewrite(node, visit)
+    return found
+
+
+def rewrite_expr(node, rules):
+    """Replace recordable subexpressions that have a rule with the recorded series"""
+    def replace_candidate(n):
+        match = match_candidate(n)
+        if match is None or match[0] not in rules:
+            return None
+        key, _, selector, grouping = match
+        recorded = promql.Selector(rules[key].record, [promql.Matcher(m.name, m.op, m.value) for m in selector.matchers])
+        if key[0]:
+            return promql.Aggregation('sum', recorded, grouping=list(grouping) if n.grouping is not None else None)
+        return recorded
+
+    return promql.rewrite(node, replace_candidate)
+
+
+def recorded_expr(expr, rules):
+    """An expression as compile-recording-rules.py leaves it: reading the existing rules' series.
+
+    Generators emit this so running them again does not bring back the raw
+    rate() the compiler replaced. Aggregations grouping or filtering on a
+    label their rule does not keep stay raw, for the compiler to widen it.
+    """
+    def replace_covered(n):
+        match = match_candidate(n)
+        if match is None or match[0] not in rules:
+            return None
+        key, _, selector, grouping = match
+        if key[0] and not rules[key].labels >= set(grouping) | {m.name for m in selector.matchers}:
+            return None
+        return rewrite_expr(n, {key: rules[key]})
+
+    return promql.format_expr(promql.rewrite(promql.parse(expr), replace_covered))
+
+
+def recorded_sources(rules):
+    """{record: rule} for loaded recording rules"""
+    return {rule.record: rule for rule in rules.values()}
+
+
+def unrecord(node, recorded):
+    """Replace recorded series (keys of `recorded`, see recorded_sources) with the rate/increase they record"""
+    def source(selector):
+        rule = recorded[selector.metric]
+        return promql.Call(rule.func, [promql.Selector(rule.metric, list(selector.matchers), range=rule.window)])
+
+    def replace(n):
+        if isinstance(n, promql.Aggregation) and n.op == 'sum' and n.param is None and not n.without:
+            inner = promql.strip_parens(n.expr)
+            if isinstance(inner, promql.Selector) and inner.metric in recorded and recorded[inner.metric].aggregated:
+                return promql.Aggregation('sum', source(inner), grouping=n.grouping)
+        if isinstance(n, promql.Selector) and n.metric in recorded:
+            rule = recorded[n.metric]
+            # A bare aggregated series: the sum it records, with the labels it keeps
+            return promql.Aggregation('sum', source(n), grouping=sorted(rule.labels)) if rule.aggregated else source(n)
+        return None
+
+    return promql.rewrite(node, replace)
+
+
+def load_rules(path=RULES_FILE):
+    """Read a previously generated rules file back into RecordingRule objects"""
+    if not path.exists():
+        return {}
+    rules = {}
+    for group in load_yaml(path).get('groups', []):
+        for entry in group.get('rules', []):
+            if 'record' not in entry:
+                continue
+            try:
+                match = match_candidate(promql.parse(entry['expr']))
+            except promql.PromQLError:
+                continue
+            if match is None:
+                continue
+            key, func, selector, grouping = match
+            rules[key] = RecordingRule(func, selector.metric, selector.range, key[0], set(grouping or []))
+    return rules
+
+
+def referenced_metrics(directory=RULES_DIR, exclude=None):
+    """Metric names used by the expressions of every other rules file"""
+    names = set()
+    for path in sorted(directory.glob('*.yml')):
+        if exclude is not None and path.resolve() == exclude.resolve():
+            continue
+        for group in load_yaml(path).get('groups', []):
+            for entry in group.get('rules', []):
+                try:
+                    names.update(promql.metric_names(promql.parse(entry['expr'])))
+                except (promql.PromQLError, KeyError):
+                    continue
+    return names
+
+
+def compile_rules(dashboards, existing=None, min_occurrences=2, extra_references=()):
+    """Work out recording rules and expression rewrites for a set of dashboards.
+
+    dashboards maps a name to a loaded dashboard. Returns (rules, rewrites) where
+    rules maps a candidate key to its RecordingRule and rewrites maps a dashboard
+    name to {old_expr: new_expr}.
+    """
+    rules = dict(existing or {})
+    candidates = {}
+    parsed = {}
+
+    for name, dashboard in dashboards.items():
+        for _, target in iter_targets(dashboard):
+            expr = target['expr']
+            if expr not in parsed:
+                try:
+                    parsed[expr] = promql.parse(expr)
+                except promql.PromQLError as e:
+                    print(f"   ⚠️  Skipping unparsable expression in {name}: {e}")
+                    parsed[expr] = None
+            if parsed[expr] is None:
+                continue
+            for key, func, selector, grouping in find_candidates(parsed[expr]):
+                rule = candidates.setdefault(key, RecordingRule(func, selector.metric, selector.range, key[0]))
+                rule.occurrences += 1
+                if key[0]:
+                    rule.labels.update(grouping)
+                    rule.labels.update(m.name for m in selector.matchers)
+
+    for key, candidate in candidates.items():
+        if key in rules:
+            rules[key].labels.update(candidate.labels)
+        elif candidate.occurrences >= min_occurrences:
+            rules[key] = candidate
+
+    for rule in rules.values():
+        if rule.aggregated:
+            rule.labels.update(PRESERVED_LABELS)
+
+    rewrites = {}
+    referenced = set(extra_references)
+    uses = {}
+    for name, dashboard in dashboards.items():
+        mapping = {}
+        for _, target in iter_targets(dashboard):
+            expr = target['expr']
+            node = parsed.get(expr)
+            if node is None:
+                continue
+            new_node = rewrite_expr(node, rules)
+            referenced.update(promql.metric_names(new_node))
+            for selector in promql.selectors(new_node):
+                uses[selector.metric] = uses.get(selector.metric, 0) + 1
+            new_expr = promql.format_expr(new_node)
+            if new_expr != expr:
+                mapping[expr] = new_expr
+        rewrites[name] = mapping
+
+    # Drop rules that no dashboard or other rule file reads any more
+    rules = {key: rule for key, rule in rules.items() if rule.record in referenced}
+    for rule in rules.values():
+        rule.occurrences = uses.get(rule.record, 0)
+    return rules, rewrites
+
+
+def rules_document(rules, group=RULE_GROUP):
+    """Prometheus rule file structure for a set of recording rules"""
+    entries = [{'record': r.record, 'expr': r.expr} for r in sorted(rules.values(), key=lambda r: r.record)]
+    return {'groups': [{'name': group, 'rules': entries}]}
+
+
+def write_rules(rules, path=RULES_FILE):
+    write_yaml(rules_document(rules), path, header=RULES_HEADER)
+
+
+def load_dashboards(paths):
+    return {path.name: load_dashboard(path) for path in paths}
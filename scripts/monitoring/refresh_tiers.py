@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Assign panels a refresh tier and keep slow-changing panels off the fast refresh loop.
+
+Grafana refreshes a whole dashboard at one interval, so a panel showing
+`increase(...[1h])` is re-queried every 5s just because it sits next to live
+request rates. Each panel gets a tier from its type and longest query window:
+
+    hot   5s   live rates and gauges
+    warm  30s  5m+ windows, tables and breakdowns
+    cold  5m   1h+ windows (costs, totals)
+
+Warm and cold panels either move to linked `<uid>-warm` / `<uid>-cold`
+dashboards refreshed at their own interval (split), or stay in place with
+per-panel query caching (cache; honoured by Grafana Enterprise/Cloud only).
+"""
+
+import copy
+import re
+
+import promql
+from dashboard_layout import reflow, sections
+from dashboard_utils import iter_panels
+from query_cost import queries_per_second
+from query_dedup import query_targets
+
+TIERS = ['hot', 'warm', 'cold']
+TIER_REFRESH = {'hot': '5s', 'warm': '30s', 'cold': '5m'}
+TIER_TITLES = {'warm': 'Trends', 'cold': 'Costs & Totals'}
+
+COLD_WINDOW = 3600   # seconds
+WARM_WINDOW = 300    # seconds
+WARM_PANEL_TYPES = {'table', 'piechart'}
+
+# Recorded series keep the window in their name, e.g. instance:openai_cost_usd_USD_sum:increase1h
+_RECORDED_WINDOW = re.compile(r':(?:rate|irate|increase)(\d+(?:ms|[smhdwy]))$')
+
+
+def query_windows(panel):
+    """Every fixed range window (in seconds) the panel's queries look back over, recorded windows included"""
+    windows = []
+    for target in query_targets(panel):
+        try:
+            node = promql.parse(target['expr'])
+        except promql.PromQLError:
+            continue
+        for selector in promql.selectors(node):
+            if selector.range and not selector.range.startswith('$'):
+                windows.append(promql.duration_seconds(selector.range))
+            match = _RECORDED_WINDOW.search(selector.metric or '')
+            if match:
+                windows.append(promql.duration_seconds(match.group(1)))
+    return windows
+
+
+def query_window(panel):
+    """Longest range window (in seconds) any of the panel's queries looks back over"""
+    return max(query_windows(panel), default=0)
+
+
+def panel_tier(panel):
+    window = query_window(panel)
+    if window >= COLD_WINDOW:
+        return 'cold'
+    if window >= WARM_WINDOW or panel.get('type') in WARM_PANEL_TYPES:
+        return 'warm'
+    return 'hot'
+
+
+def _link(dashboard, tier):
+    return {
+        "asDropdown": False,
+        "icon": "dashboard",
+        "includeVars": True,
+        "keepTime": True,
+        "tags": [],
+        "targetBlank": False,
+        "title": f"{TIER_TITLES.get(tier, 'Live')} ({dashboard['refresh']})",
+        "tooltip": f"{dashboard['title']} - refreshed every {dashboard['refresh']}",
+        "type": "link",
+        "url": f"/d/{dashboard['uid']}",
+    }
+
+
+def split_by_tier(dashboard):
+    """Move warm and cold panels into linked dashboards with a slower refresh.
+
+    Returns the dashboards to write, hot (the original uid) first. Section
+    headers are repeated in every dashboard that has panels in that section.
+    """
+    tiered = {tier: [] for tier in TIERS}
+    for header, members, nested in sections(dashboard.get('panels', [])):
+        for tier in TIERS:
+            panels = [p for p in members if panel_tier(p) == tier]
+            # Empty sections stay on the main dashboard; others only where they have panels
+            keep = panels or (tier == 'hot' and not members)
+            if header is None:
+                tiered[tier].extend(panels)
+            elif keep and nested:
+                tiered[tier].append(dict(header, panels=panels))
+            elif keep:
+                tiered[tier].append(header)
+                tiered[tier].extend(panels)
+
+    results = []
+    for tier in TIERS:
+        if tier != 'hot' and not any(query_targets(p) for p in iter_panels(tiered[tier])):
+            continue
+        result = copy.deepcopy({k: v for k, v in dashboard.items() if k != 'panels'})
+        result['panels'] = [dict(p) for p in tiered[tier]]
+        reflow(result['panels'])
+        if tier != 'hot':
+            result['uid'] = f"{dashboard['uid']}-{tier}"
+            result['title'] = f"{dashboard['title']} - {TIER_TITLES[tier]}"
+            result['refresh'] = TIER_REFRESH[tier]
+            result['tags'] = list(result.get('tags', [])) + [f"refresh-{tier}"]
+        results.append((tier, result))
+
+    for tier, result in results:
+        result['links'] = list(result.get('links', [])) + [
+            _link(other, other_tier) for other_tier, other in results if other is not result]
+    return [result for _, result in results]
+
+
+def apply_query_caching(dashboard):
+    """Keep every panel in place but let warm/cold panels serve cached results. Returns panels changed."""
+    changed = 0
+    for panel in iter_panels(dashboard.get('panels', [])):
+        tier = panel_tier(panel)
+        if tier == 'hot' or not query_targets(panel):
+            continue
+        ttl = int(promql.duration_seconds(TIER_REFRESH[tier]))
+        panel['cacheTimeout'] = str(ttl)
+        panel['queryCachingTTL'] = ttl * 1000
+        changed += 1
+    return changed
+
+
+def format_query_rates(dashboards, baseline_refresh=TIER_REFRESH['hot']):
+    """Steady-state Prometheus queries per second per viewer, before and after tiering"""
+    total_queries = sum(len(query_targets(p)) for d in dashboards for p in iter_panels(d.get('panels', [])))
+    before = total_queries / promql.duration_seconds(baseline_refresh)
+    lines = [f"  Steady-state query rate per viewer: {before:.1f}/s at {baseline_refresh} → "
+             f"{queries_per_second(dashboards[0]):.1f}/s on {dashboards[0]['uid']}"]
+    for dashboard in dashboards:
+        lines.append(f"   {dashboard['refresh']:>4}  {dashboard['uid']}: {queries_per_second(dashboard):.2f} queries/s")
+    if len(dashboards) > 1:
+        lines.append(f"   With every tier open: {sum(queries_per_second(d) for d in dashboards):.1f}/s")
+    return '\n'.join(lines)
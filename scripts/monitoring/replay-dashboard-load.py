@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Replay a dashboard's panel queries for N concurrent viewers and report per-panel latency and QPS"""
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from dashboard_utils import load_dashboard
+from query_replay import dashboard_queries, degraded, format_stats, percentile, replay, stats_document
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('dashboard', type=Path, help='Dashboard JSON file (e.g. monitoring/grafana/dashboards/bookstore-mega.json)')
+parser.add_argument('--url', default='http://localhost:9090', help='Prometheus base URL (default: http://localhost:9090)')
+parser.add_argument('--stub', action='store_true', help='Start a local stub Prometheus instead of using --url')
+parser.add_argument('--viewers', default='10',
+                    help='Concurrent viewers, or a comma-separated ramp such as 1,5,10,25 (default: 10)')
+parser.add_argument('--duration', type=float, default=60, help='Seconds to run each viewer level (default: 60)')
+parser.add_argument('--refresh', type=float, help="Refresh interval in seconds (default: the dashboard's refresh)")
+parser.add_argument('--include-collapsed', action='store_true', help='Also query panels inside collapsed rows')
+parser.add_argument('--connections', type=int, default=100, help='HTTP connection pool size (default: 100)')
+parser.add_argument('--timeout', type=float, default=30, help='Per-query timeout in seconds (default: 30)')
+parser.add_argument('--top', type=int, default=15, help='Slowest panels to list per run (default: 15)')
+parser.add_argument('--json', type=Path, help='Also write the results to this JSON file')
+args = parser.parse_args()
+
+dashboard = load_dashboard(args.dashboard)
+levels = [int(v) for v in args.viewers.split(',')]
+queries = dashboard_queries(dashboard, args.include_collapsed)
+
+
+async def main():
+    runner = None
+    url = args.url
+    if args.stub:
+        from stub_prometheus import start_stub
+        runner, url = await start_stub()
+
+    print(f"📊 {dashboard.get('title')} ({dashboard.get('uid')})")
+    print(f"   {len(queries)} queries per refresh against {url}" + (" (stub)" if args.stub else ""))
+
+    results = []
+    try:
+        for viewers in levels:
+            print(f"\n▶ {viewers} viewer(s) for {args.duration:g}s")
+            stats = await replay(dashboard, url, viewers, args.duration, refresh=args.refresh,
+                                 include_collapsed=args.include_collapsed,
+                                 connections=args.connections, timeout=args.timeout)
+            print(format_stats(stats, top=args.top))
+            results.append(stats)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return results
+
+
+results = asyncio.run(main())
+
+print("\n" + "=" * 70)
+print(f"{'viewers':>8}{'QPS':>9}{'query p95 ms':>14}{'refresh p95 ms':>16}{'errors':>8}")
+first_degraded = None
+for stats in results:
+    marker = ''
+    if degraded(stats):
+        marker = '  ⚠️  degraded'
+        first_degraded = first_degraded or stats.viewers
+    query_p95 = percentile(stats.all_latencies(), 95)
+    refresh_p95 = percentile(stats.refreshes, 95)
+    print(f"{stats.viewers:>8}{stats.qps:>9.1f}{(query_p95 or 0) * 1000:>14.1f}"
+          f"{(refresh_p95 or 0) * 1000:>16.1f}{stats.total_errors:>8}{marker}")
+print("=" * 70)
+if first_degraded:
+    print(f"⚠️  Degrades at {first_degraded} viewers (refresh p95 over the refresh interval or >1% errors)")
+else:
+    print(f"✓ No degradation up to {levels[-1]} viewers")
+
+if args.json:
+    with open(args.json, 'w') as f:
+        json.dump({'dashboard': dashboard.get('uid'), 'runs': [stats_document(s) for s in results]}, f, indent=2)
+    print(f"📁 Results: {args.json}")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Keep only the metrics the dashboards and rules read at scrape time.
+
+Every scrape job gets one `metric_relabel_configs` rule that keeps the metric
+names in the reference index (see metric_references.py) plus an allowlist and
+drops the rest before they reach the head block. Prometheus RE2 has no
+negative lookahead, so "drop everything unused" is written as a `keep` on the
+names in use; `up` and the other synthetic scrape series are never relabeled.
+The rule is spliced into prometheus.yml as text, marked with KEEP_RULE_MARKER,
+so the rest of the hand-written file stays as it is.
+"""
+
+import json
+import re
+from pathlib import Path
+
+from dashboard_utils import SCRIPT_DIR, load_yaml
+from metric_fixtures import JOB_PREFIXES
+
+ALLOWLIST_FILE = SCRIPT_DIR / 'scrape-allowlist.yml'
+
+KEEP_RULE_MARKER = '# Generated by scripts/monitoring/prune-scrape-metrics.py from the dashboards and rules - do not edit'
+JOB_LINE = re.compile(r'^ *- job_name: *["\']?(?P<name>[^"\'\s#]+)')
+
+
+def load_allowlist(path=ALLOWLIST_FILE):
+    """{'all': [regex, ...], job: [regex, ...]} from the allowlist file"""
+    config = load_yaml(path) if Path(path).exists() else {}
+    allowlist = {job: list(patterns or []) for job, patterns in (config.get('jobs') or {}).items()}
+    allowlist['all'] = list(config.get('all') or [])
+    return allowlist
+
+
+def job_metrics(references, jobs):
+    """{job: sorted metric names} each job must keep.
+
+    A metric is kept for the jobs a query pins it to with job="...", else for
+    the job owning its prefix in JOB_PREFIXES, else for every job.
+    """
+    kept = {job: [] for job in jobs}
+    for name, usage in sorted(references.items()):
+        if name.startswith('__') or ':' in name:
+            continue
+        pinned = usage.values.get('job') or {job for job, prefixes in JOB_PREFIXES.items()
+                                             if name.startswith(prefixes) and job in jobs}
+        for job in jobs:
+            if not pinned or job in pinned:
+                kept[job].append(name)
+    return kept
+
+
+def keep_regex(names, patterns=()):
+    return '|'.join([re.escape(name) for name in names] + list(patterns))
+
+
+def keep_regexes(jobs, kept, allowlist):
+    """{job: (keep regex, metrics kept, allowlist patterns)} for every scrape job"""
+    regexes = {}
+    for job in jobs:
+        patterns = allowlist['all'] + allowlist.get(job, [])
+        regexes[job] = (keep_regex(kept.get(job, []), patterns), len(kept.get(job, [])), len(patterns))
+    return regexes
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip(' '))
+
+
+def _job_blocks(lines):
+    """[(job, first line, end line)] for every `- job_name:` item, trailing blank lines excluded"""
+    blocks = []
+    for start, line in enumerate(lines):
+        match = JOB_LINE.match(line)
+        if not match:
+            continue
+        end = start + 1
+        while end < len(lines) and (not lines[end].strip() or _indent(lines[end]) > _indent(line)):
+            end += 1
+        while not lines[end - 1].strip():
+            end -= 1
+        blocks.append((match.group('name'), start, end))
+    return blocks
+
+
+def _keep_rule(regex, indent):
+    pad = ' ' * indent
+    return [f"{pad}{KEEP_RULE_MARKER}",
+            f'{pad}- source_labels: ["__name__"]',
+            f"{pad}  regex: {json.dumps(regex)}",
+            f'{pad}  action: "keep"']
+
+
+def splice_keep_rules(text, regexes):
+    """prometheus.yml text with each job's generated keep rule set to regexes[job].
+
+    This is a text edit rather than a YAML round trip, so the hand-written
+    config keeps its layout and comments. The rule under KEEP_RULE_MARKER is
+    replaced in place; a job without one gets it appended to its
+    metric_relabel_configs, which is added at the end of the job if missing.
+    """
+    lines = text.split('\n')
+    for name, start, end in reversed(_job_blocks(lines)):
+        if name not in regexes:
+            continue
+        block = lines[start:end]
+        key_indent = _indent(block[0]) + 2
+        marker = next((i for i, line in enumerate(block) if line.strip() == KEEP_RULE_MARKER), None)
+        if marker is not None:
+            item_indent = _indent(block[marker])
+            stop = marker + 2
+            while stop < len(block) and block[stop].strip() and _indent(block[stop]) > item_indent:
+                stop += 1
+            block[marker:stop] = _keep_rule(regexes[name], item_indent)
+        else:
+            key = next((i for i, line in enumerate(block)
+                        if _indent(line) == key_indent and line.strip().startswith('metric_relabel_configs:')), None)
+            if key is None:
+                block += [' ' * key_indent + 'metric_relabel_configs:'] + _keep_rule(regexes[name], key_indent + 4)
+            else:
+                stop = key + 1
+                while stop < len(block) and (not block[stop].strip() or _indent(block[stop]) > key_indent):
+                    stop += 1
+                while not block[stop - 1].strip():
+                    stop -= 1
+                items = [_indent(line) for line in block[key + 1:stop] if line.strip().startswith('- ')]
+                block[stop:stop] = _keep_rule(regexes[name], items[0] if items else key_indent + 4)
+        lines[start:end] = block
+    return '\n'.join(lines)
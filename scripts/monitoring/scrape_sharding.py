@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""Hashmod-sharded scraping behind one federating Prometheus.
+
+One Prometheus scraping every target is both the ingestion and the query
+bottleneck at production replica counts. Each shard here gets the whole
+target inventory and keeps the targets whose address hashes to it:
+
+    - source_labels: [__address__]          - source_labels: [__tmp_hash]
+      modulus: N                              regex: "<shard>"
+      target_label: __tmp_hash                action: keep
+      action: hashmod
+
+so adding replicas to the inventory, or a shard to N, needs no per-target
+assignment. A target lives on exactly one shard, so a recording rule whose
+aggregations all keep `instance` gives the same series there as on a single
+Prometheus; those rules are evaluated on the shards. A global Prometheus
+federates their results plus the raw series the dashboards and the remaining
+rules (SLO ratios, constants, native histograms pushed to it over OTLP) read,
+evaluates those rules and answers the dashboards' queries through the
+existing datasource. Grafana's mixed datasource would return one series per
+shard for every `sum(...)`, so it cannot stand in for the global instance.
+"""
+
+import copy
+import hashlib
+import re
+from pathlib import Path
+
+import promql
+from dashboard_utils import PROMETHEUS_CONFIG, PROMETHEUS_DIR, REPO_ROOT, RULES_DIR, SCRIPT_DIR, iter_targets, load_yaml
+from native_histograms import histogram_families
+
+INVENTORY_FILE = SCRIPT_DIR / "scrape-inventory.yml"
+SHARDS_DIR = PROMETHEUS_DIR / "shards"
+SHARD_RULES_FILE = "shard-rules.yml"        # in SHARDS_DIR, next to the configs reading them
+GLOBAL_RULES_FILE = "global-rules.yml"
+GLOBAL_CONFIG = "prometheus-global.yml"
+COMPOSE_FILE = REPO_ROOT / "docker-compose.sharded.yml"
+
+SHARD_LABEL = 'shard'                       # external label of each shard, kept on federated series
+HASH_LABEL = '__tmp_hash'
+FEDERATE_JOB = 'federate'
+PROMETHEUS_IMAGE = 'prom/prometheus:v2.54.1'
+# The global instance evaluates the SLO rules, which average over the 30d period (slo-targets.yml)
+GLOBAL_RETENTION = '35d'
+
+# Series every shard produces on its own, so a rule using them must not run once per shard
+GLOBAL_FUNCTIONS = {'vector', 'time', 'absent', 'absent_over_time', 'scalar'}
+# Synthetic series the global instance always federates: target health and shard load
+SCRAPE_SERIES = ['up', 'scrape_samples_scraped', 'scrape_samples_post_metric_relabeling']
+
+CONFIG_HEADER = """Generated by scripts/monitoring/generate-scrape-shards.py from prometheus.yml and scrape-inventory.yml - do not edit by hand.
+{role}"""
+
+_LABEL_VALUES = re.compile(r'^label_values\((?P<expr>.+),\s*\w+\)$')
+
+
+def load_inventory(path=INVENTORY_FILE):
+    """(shard count, {job: [target addresses]}) from an inventory file"""
+    config = load_yaml(path)
+    return int(config.get('shards', 1)), {job: list(targets or []) for job, targets in (config.get('jobs') or {}).items()}
+
+
+def shard_of(address, shards):
+    """The shard Prometheus' hashmod action assigns an address to (low 64 bits of its MD5, mod shards)"""
+    return int.from_bytes(hashlib.md5(address.encode('utf-8')).digest()[8:], 'big') % shards
+
+
+def shard_relabel(shard, shards):
+    """relabel_configs keeping the targets of one shard"""
+    return [
+        {'source_labels': ['__address__'], 'modulus': shards, 'target_label': HASH_LABEL, 'action': 'hashmod'},
+        {'source_labels': [HASH_LABEL], 'regex': str(shard), 'action': 'keep'},
+    ]
+
+
+def scrape_jobs(base, inventory):
+    """The base config's scrape jobs with the inventory's targets (jobs missing from it keep their own)"""
+    jobs = []
+    for job in base.get('scrape_configs', []):
+        job = copy.deepcopy(job)
+        targets = inventory.get(job['job_name'])
+        if targets is not None:
+            labels = (job.get('static_configs') or [{}])[0].get('labels')
+            job['static_configs'] = [dict({'targets': targets}, **({'labels': labels} if labels else {}))]
+        jobs.append(job)
+    return jobs
+
+
+def assignments(jobs, shards):
+    """{shard: [(job, address)]} as the shards' relabeling will split the targets"""
+    result = {shard: [] for shard in range(shards)}
+    for job in jobs:
+        for static in job.get('static_configs', []):
+            for address in static.get('targets', []):
+                result[shard_of(address, shards)].append((job['job_name'], address))
+    return result
+
+
+def _keeps_instance(node):
+    if isinstance(node, promql.Aggregation):
+        grouping = node.grouping or []
+        return 'instance' not in grouping if node.without else 'instance' in grouping
+    if isinstance(node, promql.BinaryOp) and node.matching:
+        return ('instance' in node.matching_labels) == (node.matching == 'on')
+    if isinstance(node, promql.Call):
+        return node.func not in GLOBAL_FUNCTIONS
+    return True
+
+
+def split_rules(rules_dir=RULES_DIR):
+    """Partition the rule files' groups into (shard groups, global groups, shard-local records).
+
+    A recording rule is shard-local when it reads only scraped series or other
+    shard-local records and every aggregation or vector match keeps `instance`.
+    Alerting rules and everything else run on the global instance.
+    """
+    groups, exprs = [], {}
+    for path in sorted(Path(rules_dir).glob('*.yml')):
+        for group in load_yaml(path).get('groups', []):
+            groups.append(group)
+            for entry in group.get('rules', []):
+                if 'record' in entry:
+                    try:
+                        exprs.setdefault(entry['record'], []).append(promql.parse(entry['expr']))
+                    except promql.PromQLError:
+                        exprs.setdefault(entry['record'], []).append(None)
+
+    names = {name for nodes in exprs.values() for node in nodes if node for name in promql.metric_names(node)}
+    # Native histograms are pushed to the global instance over OTLP, never scraped
+    pushed = histogram_families(names)
+    local = {record for record, nodes in exprs.items()
+             if all(node and promql.metric_names(node) and all(_keeps_instance(n) for n in promql.walk(node))
+                    for node in nodes)}
+    # A rule reading a global record is global too
+    changed = True
+    while changed:
+        changed = False
+        for record in sorted(local):
+            read = {name for node in exprs[record] for name in promql.metric_names(node)}
+            if any(name in pushed or (name in exprs and name not in local) for name in read):
+                local.discard(record)
+                changed = True
+
+    shard_groups, global_groups = [], []
+    for group in groups:
+        split = ([], [])
+        for entry in group.get('rules', []):
+            split['record' not in entry or entry['record'] not in local].append(entry)
+        for rules, target in zip(split, (shard_groups, global_groups)):
+            if rules:
+                target.append(dict(group, rules=rules))
+    return shard_groups, global_groups, local
+
+
+def _read_names(text):
+    try:
+        return promql.metric_names(promql.parse(text))
+    except promql.PromQLError:
+        return []
+
+
+def federated_metrics(dashboards, global_groups):
+    """Sorted metric names the global instance must federate from the shards.
+
+    Everything the dashboards' panels and variables or the global rules read,
+    less the series the global rules record themselves.
+    """
+    names = set(SCRAPE_SERIES)
+    for dashboard in dashboards.values():
+        for _, target in iter_targets(dashboard):
+            names.update(_read_names(target['expr']))
+        for variable in dashboard.get('templating', {}).get('list', []):
+            match = _LABEL_VALUES.match(variable.get('definition') or '')
+            if match:
+                names.update(_read_names(match['expr']))
+    recorded_here = set()
+    for group in global_groups:
+        for entry in group['rules']:
+            names.update(_read_names(entry['expr']))
+            recorded_here.add(entry.get('record'))
+    pushed = histogram_families(names)
+    return sorted(name for name in names - recorded_here - pushed if not name.startswith('__'))
+
+
+def shard_config(base, jobs, shard, shards):
+    config = {'global': dict(base.get('global', {}), external_labels={SHARD_LABEL: str(shard)}),
+              'rule_files': [SHARD_RULES_FILE], 'scrape_configs': []}
+    for job in jobs:
+        relabel = shard_relabel(shard, shards) + job.get('relabel_configs', [])
+        job = {key: value for key, value in copy.deepcopy(job).items() if key != 'relabel_configs'}
+        rules = job.pop('metric_relabel_configs', None)
+        job['relabel_configs'] = relabel
+        if rules is not None:
+            job['metric_relabel_configs'] = rules
+        config['scrape_configs'].append(job)
+    return config
+
+
+def shard_host(shard):
+    return f"prometheus-shard-{shard}"
+
+
+def global_config(base, shards, metrics):
+    config = {'global': dict(base.get('global', {})), 'rule_files': [GLOBAL_RULES_FILE]}
+    if 'otlp' in base:
+        config['otlp'] = base['otlp']
+    config['scrape_configs'] = [{
+        'job_name': FEDERATE_JOB,
+        'metrics_path': '/federate',
+        # Keep the shards' job/instance labels rather than the federation target's
+        'honor_labels': True,
+        'params': {'match[]': ['{__name__=~"' + '|'.join(re.escape(name) for name in metrics) + '"}']},
+        'static_configs': [{'targets': [f"{shard_host(shard)}:9090" for shard in range(shards)]}],
+    }]
+    return config
+
+
+def compose_document(shards):
+    """docker-compose override running the shards and turning `prometheus` into the global instance"""
+    def command(config):
+        return [f"--config.file=/etc/prometheus/shards/{config}", "--storage.tsdb.path=/prometheus",
+                "--web.enable-lifecycle"]
+
+    services, volumes = {}, {}
+    for shard in range(shards):
+        services[shard_host(shard)] = {
+            'image': PROMETHEUS_IMAGE,
+            'container_name': f"bookstore-{shard_host(shard)}-perf",
+            'profiles': ['observability'],
+            'volumes': ['./monitoring/prometheus:/etc/prometheus:ro', f"prometheus_shard_{shard}_data:/prometheus"],
+            'command': command(f"prometheus-shard-{shard}.yml"),
+        }
+        volumes[f"prometheus_shard_{shard}_data"] = None
+    services['prometheus'] = {
+        'command': command(GLOBAL_CONFIG) + [f"--storage.tsdb.retention.time={GLOBAL_RETENTION}",
+                                             "--enable-feature=otlp-write-receiver,native-histograms"],
+        'depends_on': [shard_host(shard) for shard in range(shards)],
+    }
+    return {'services': services, 'volumes': volumes}
+
+
+def shard_documents(dashboards, inventory_path=INVENTORY_FILE, base_path=PROMETHEUS_CONFIG, rules_dir=RULES_DIR,
+                    shards=None):
+    """{path: (document, header)} for every file of an N-shard setup, plus the target assignment"""
+    base = load_yaml(base_path)
+    inventory_shards, inventory = load_inventory(inventory_path)
+    shards = shards or inventory_shards
+    jobs = scrape_jobs(base, inventory)
+    shard_groups, global_groups, _ = split_rules(rules_dir)
+    metrics = federated_metrics(dashboards, global_groups)
+
+    shard_role = "Shard {shard} of {shards}: scrapes the targets hashing to it and evaluates the shard-local rules."
+    documents = {
+        SHARDS_DIR / SHARD_RULES_FILE: ({'groups': shard_groups}, "Rules whose every aggregation keeps `instance`, evaluated on each shard."),
+        SHARDS_DIR / GLOBAL_RULES_FILE: ({'groups': global_groups}, "Rules needing every target's series, evaluated on the global instance."),
+        SHARDS_DIR / GLOBAL_CONFIG: (global_config(base, shards, metrics),
+                                     "Global instance: federates the shards and answers the dashboards' queries."),
+        COMPOSE_FILE: (compose_document(shards),
+                       "Run: docker-compose -f docker-compose.perf.yml -f docker-compose.sharded.yml --profile observability up -d"),
+    }
+    for shard in range(shards):
+        documents[SHARDS_DIR / f"prometheus-shard-{shard}.yml"] = (
+            shard_config(base, jobs, shard, shards), shard_role.format(shard=shard, shards=shards))
+    documents = {path: (document, CONFIG_HEADER.format(role=role)) for path, (document, role) in documents.items()}
+    return documents, assignments(jobs, shards), metrics
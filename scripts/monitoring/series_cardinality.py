@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Attribute series cardinality to dashboard panels.
+
+Works from saved Prometheus API output: `/api/v1/series?match[]={__name__=~".+"}`
+for the label sets and optionally `/api/v1/status/tsdb` for head statistics.
+Each panel selector is matched against the saved series the way Prometheus
+would (template variables match everything, like "All"), which gives the
+number of series a panel query touches and the labels that multiply it.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import promql
+from dashboard_utils import iter_targets
+from recording_rules import PRESERVED_LABELS
+
+# Labels with at least this many values on one metric are worth a look
+HIGH_CARDINALITY = 50
+
+# A recording rule is only suggested when it cuts a metric's series by this factor
+MIN_REDUCTION = 2.0
+
+
+@dataclass
+class PanelSeries:
+    dashboard: str
+    panel_id: Optional[int]
+    title: str
+    series: int
+    metrics: List[str] = field(default_factory=list)
+    drivers: List[Tuple[str, int]] = field(default_factory=list)   # (label, distinct values), largest first
+
+
+@dataclass
+class Suggestion:
+    kind: str          # 'drop-label' or 'aggregate'
+    metric: str
+    label: str
+    values: int
+    series: int
+    reason: str
+    rule: dict
+
+
+def _api_data(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    if isinstance(document, dict) and 'data' in document:
+        if document.get('status', 'success') != 'success':
+            raise ValueError(f"{path}: API response status is {document.get('status')}")
+        return document['data']
+    return document
+
+
+def load_series(path):
+    """Label sets from a saved /api/v1/series response (or a bare JSON list of them)"""
+    return _api_data(path)
+
+
+def load_tsdb_status(path):
+    """The data object of a saved /api/v1/status/tsdb response"""
+    return _api_data(path)
+
+
+class SeriesIndex:
+    """Saved series grouped by metric name.
+
+    rules maps recorded series names to their parsed expressions; a recorded
+    series missing from the dump (say, a rule not deployed yet) is estimated by
+    projecting the series its rule reads onto the labels the rule keeps.
+    """
+
+    def __init__(self, series, rules=None):
+        self.by_metric: Dict[str, List[dict]] = {}
+        self.rules = rules or {}
+        for labels in series:
+            self.by_metric.setdefault(labels.get('__name__', ''), []).append(labels)
+
+    def __len__(self):
+        return sum(len(v) for v in self.by_metric.values())
+
+    def match(self, selector):
+        """Series a selector selects; `$variable` matchers match everything"""
+        checks = [_matcher_check(m) for m in selector.matchers if '$' not in m.value]
+        if selector.metric:
+            candidates = self.by_metric.get(selector.metric)
+            if candidates is None:
+                candidates = self._recorded(selector.metric)
+        else:
+            candidates = [s for values in self.by_metric.values() for s in values]
+        return [s for s in candidates if all(check(s) for check in checks)]
+
+    def _recorded(self, record):
+        if record not in self.rules:
+            return []
+        node = promql.strip_parens(self.rules[record])
+        keep = set(node.grouping or []) if isinstance(node, promql.Aggregation) and not node.without else None
+        projected = {}
+        for selector in promql.selectors(node):
+            for labels in self.match(selector):
+                labels = {k: v for k, v in labels.items() if k != '__name__' and (keep is None or k in keep)}
+                projected[_series_key(labels)] = dict(labels, __name__=record)
+        return list(projected.values())
+
+
+def _matcher_check(matcher):
+    if matcher.op in ('=~', '!~'):
+        pattern = re.compile(matcher.value)
+        matches = lambda s: pattern.fullmatch(s.get(matcher.name, '')) is not None
+    else:
+        matches = lambda s: s.get(matcher.name, '') == matcher.value
+    return matches if matcher.op in ('=', '=~') else (lambda s: not matches(s))
+
+
+def _series_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def label_drivers(series, top=3):
+    """Labels with the most distinct values across a set of series, largest first"""
+    values = {}
+    for labels in series:
+        for name, value in labels.items():
+            if name != '__name__':
+                values.setdefault(name, set()).add(value)
+    ranked = sorted(((name, len(v)) for name, v in values.items() if len(v) > 1), key=lambda x: (-x[1], x[0]))
+    return ranked[:top]
+
+
+def panel_series(dashboards, index, top_labels=3):
+    """PanelSeries for every panel with a PromQL query, most series first"""
+    panels = {}
+    for name, dashboard in dashboards.items():
+        for panel, target in iter_targets(dashboard):
+            try:
+                node = promql.parse(target['expr'])
+            except promql.PromQLError:
+                continue
+            key = (name, id(panel))
+            entry = panels.setdefault(key, (panel, {}, []))
+            for selector in promql.selectors(node):
+                for labels in index.match(selector):
+                    entry[1][_series_key(labels)] = labels
+                if selector.metric and selector.metric not in entry[2]:
+                    entry[2].append(selector.metric)
+
+    results = []
+    for (name, _), (panel, series, metrics) in panels.items():
+        results.append(PanelSeries(name, panel.get('id'), panel.get('title', ''), len(series), metrics,
+                                   label_drivers(series.values(), top_labels)))
+    return sorted(results, key=lambda p: (-p.series, p.dashboard, p.title))
+
+
+def dashboard_series(panels):
+    """{dashboard: series touched by all its panels} (panels sharing series count them each time)"""
+    totals = {}
+    for panel in panels:
+        totals[panel.dashboard] = totals.get(panel.dashboard, 0) + panel.series
+    return dict(sorted(totals.items(), key=lambda x: -x[1]))
+
+
+HISTOGRAM_SUFFIXES = ('_bucket', '_count', '_sum')
+
+
+def metric_families(index):
+    """{family: [metric names]} - a histogram's _bucket/_count/_sum series form one family"""
+    bucketed = {m[:-len('_bucket')] for m in index.by_metric if m.endswith('_bucket')}
+    families = {}
+    for metric in sorted(index.by_metric):
+        if ':' in metric or not metric:
+            continue
+        family = next((metric[:-len(s)] for s in HISTOGRAM_SUFFIXES
+                       if metric.endswith(s) and metric[:-len(s)] in bucketed), metric)
+        families.setdefault(family, []).append(metric)
+    return families
+
+
+def _family_rule(family, metrics, kept):
+    """Recording rule summing a family down to the labels in use"""
+    name = f"{family}_bucket" if f"{family}_bucket" in metrics else metrics[0]
+    func = 'rate' if name.endswith(('_total',) + HISTOGRAM_SUFFIXES) else 'avg_over_time'
+    grouping = [l for l in kept if l != 'le' or name.endswith('_bucket')]
+    return {'record': f"instance:{name}:{func.split('_')[0]}1m",
+            'expr': f"sum({func}({name}[1m])) by ({', '.join(grouping)})"}
+
+
+def suggest_rules(index, references, threshold=HIGH_CARDINALITY):
+    """Suggestions for high-cardinality labels on raw metric families.
+
+    - drop-label: nobody reads the label and the series stay unique without it;
+      blanked at scrape time for that family only (labeldrop would hit every
+      metric of the job).
+    - drop-at-source: nobody reads it, but dropping it at scrape time would make
+      series collide (duplicate samples are rejected), so the exporter has to
+      stop emitting it, e.g. an OpenTelemetry view with an explicit TagKeys list.
+    - aggregate: panels read the label; a recording rule by the labels in use
+      cuts the series the panels touch.
+    """
+    suggestions = []
+    for family, metrics in metric_families(index).items():
+        series = [s for m in metrics for s in index.by_metric[m]]
+        used = {'le', '__name__'} | set(PRESERVED_LABELS)
+        for metric in metrics:
+            if metric in references:
+                used |= references[metric].labels
+        regex = re.escape(metrics[0]) if len(metrics) == 1 else f"{re.escape(family)}_({'|'.join(m[len(family) + 1:] for m in metrics)})"
+
+        aggregated = False
+        for label, values in label_drivers(series, top=None):
+            if values < threshold:
+                break
+            kept = sorted(used - {'__name__'})
+            if label in used:
+                if aggregated:
+                    continue    # one rule per family covers every label in use
+                aggregated = True
+                groups = {tuple(s.get(l, '') for l in kept) for s in series}
+                if len(series) / max(1, len(groups)) < MIN_REDUCTION:
+                    continue
+                suggestions.append(Suggestion(
+                    'aggregate', family, label, values, len(series),
+                    f"{label} is read by dashboards; summing by the labels in use cuts "
+                    f"{len(series):,} series to {len(groups):,}",
+                    _family_rule(family, metrics, kept)))
+                continue
+
+            remaining = {_series_key({k: v for k, v in s.items() if k != label}) for s in series}
+            if len(remaining) == len(series):
+                suggestions.append(Suggestion(
+                    'drop-label', family, label, values, len(series),
+                    f"{label} has {values:,} values and no dashboard or rule reads it",
+                    {'source_labels': ['__name__'], 'regex': regex,
+                     'target_label': label, 'replacement': '', 'action': 'replace'}))
+            else:
+                tag_keys = sorted(set(l for s in series for l in s) - {label, '__name__', 'le'} - set(PRESERVED_LABELS))
+                suggestions.append(Suggestion(
+                    'drop-at-source', family, label, values, len(series),
+                    f"{label} has {values:,} values and no dashboard or rule reads it, but series collide "
+                    f"without it ({len(series):,} -> {len(remaining):,}); stop emitting it in the exporter",
+                    {'metric': family, 'keep_tags': tag_keys}))
+    return sorted(suggestions, key=lambda s: -s.series)
+
+
+def tsdb_summary(status, top=10):
+    """Lines summarising a /api/v1/status/tsdb response"""
+    head = status.get('headStats', {})
+    lines = [f"   Head: {head.get('numSeries', 0):,} series, {head.get('numLabelPairs', 0):,} label pairs, "
+             f"{head.get('chunkCount', 0):,} chunks"]
+    for key, title in (('seriesCountByMetricName', 'Series by metric'),
+                       ('labelValueCountByLabelName', 'Values by label'),
+                       ('memoryInBytesByLabelName', 'Bytes by label')):
+        entries = status.get(key) or []
+        if entries:
+            lines.append(f"   {title}:")
+            lines.extend(f"     {e['value']:>10,}  {e['name']}" for e in entries[:top])
+    return lines
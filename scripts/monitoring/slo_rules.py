@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Multi-window, multi-burn-rate SLO rules and panels.
+
+Every SLO in slo-targets.yml gets two cheap recording rules over the raw
+histogram, evaluated on a 5m window and aggregated to (environment, job,
+service), so each is a handful of series:
+
+    slo:sli_requests:rate5m{slo="..."}   requests per second
+    slo:sli_errors:rate5m{slo="..."}     bad requests per second (server errors,
+                                         or requests slower than the threshold)
+
+plus its error budget as a constant (slo:error_budget:ratio). Error ratios
+over the short windows (up to 2h) average those two recorded rates and are
+shared by all SLOs (slo:sli_error:ratio_rate1h, ...). The long ones (6h, 1d,
+3d and the period) average hourly rates recorded every 5m instead
+(slo:sli_errors:rate1h, slo:sli_requests:rate1h): the 5m rates are recorded
+at the 15s rule interval, so `avg_over_time(...[30d])` over them would read
+172,800 samples per series each minute; over the hourly rates it reads
+8,640. The hourly average lags the raw window by up to an hour, which the
+6h and longer windows absorb. Prometheus has to keep the period's worth of
+hourly rates, longer than its default 15d retention: the compose files and
+the AppHost run it with `--storage.tsdb.retention.time=35d`.
+
+Alerts follow the multi-window, multi-burn-rate scheme: page when 2% of the
+period's budget burns within 1h or 5% within 6h, open a ticket for 10%
+within 1d or 3d. Each long window is paired with a short one (1/12 of it),
+so an alert resets soon after the burning stops.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import promql
+from dashboard_utils import RULES_DIR, SCRIPT_DIR, load_yaml, write_yaml
+from metric_fixtures import BUCKETS
+from panel_builder import Target, Threshold, stat, timeseries
+from status_codes import budget_status_regex
+
+SLO_CONFIG = SCRIPT_DIR / "slo-targets.yml"
+SLO_RULES_FILE = RULES_DIR / "slo-rules.yml"
+
+COUNT_METRIC = 'http_server_request_duration_seconds_count'
+BUCKET_METRIC = 'http_server_request_duration_seconds_bucket'
+SLI_WINDOW = '5m'
+SLO_LABELS = ['environment', 'job', 'service']
+
+# Ratios the alerts and panels read; the long ones (and the period) evaluate once a minute
+# over hourly rates recorded every HOURLY_INTERVAL
+SHORT_WINDOWS = ['5m', '30m', '1h', '2h']
+LONG_WINDOWS = ['6h', '1d', '3d']
+LONG_WINDOW_INTERVAL = '1m'
+HOURLY_WINDOW = '1h'
+HOURLY_INTERVAL = '5m'
+
+# (severity, long window, short window, share of the period's error budget burnt in the long window)
+BURN_RATE_ALERTS = [
+    ('page', '1h', '5m', 0.02),
+    ('page', '6h', '30m', 0.05),
+    ('ticket', '1d', '2h', 0.10),
+    ('ticket', '3d', '6h', 0.10),
+]
+ALERT_FOR = {'page': '2m', 'ticket': '15m'}
+ALERT_NAME = 'SLOErrorBudgetBurn'
+
+RULES_HEADER = """Generated by scripts/monitoring/generate-slo-rules.py from slo-targets.yml - do not edit by hand.
+Multi-window, multi-burn-rate SLO recording and alerting rules."""
+
+
+@dataclass
+class SLO:
+    name: str
+    kind: str                   # 'availability' or 'latency'
+    objective: float            # percent of good requests
+    job: Optional[str] = None   # None: every scrape job, each judged on its own
+    route: Optional[str] = None
+    method: Optional[str] = None
+    threshold: Optional[float] = None
+
+    @property
+    def budget(self):
+        return round(1 - self.objective / 100, 10)
+
+    def _sum_rate(self, metric, *extra):
+        matchers = []
+        if self.job:
+            matchers.append(f'job="{self.job}"')
+        if self.route:
+            matchers.append(f'http_route="{self.route}"')
+        if self.method:
+            matchers.append(f'http_request_method="{self.method}"')
+        matchers.extend(extra)
+        return f"sum(rate({metric}{{{', '.join(matchers)}}}[{SLI_WINDOW}])) by ({', '.join(SLO_LABELS)})"
+
+    @property
+    def requests_expr(self):
+        return self._sum_rate(COUNT_METRIC)
+
+    @property
+    def errors_expr(self):
+        if self.kind == 'availability':
+            errors = self._sum_rate(COUNT_METRIC, f'http_response_status_code=~"{budget_status_regex()}"')
+            # Without a failed request the error series would be absent; `0 * requests` keeps it at 0
+            return f"{errors} or 0 * {self.requests_expr}"
+        fast = self._sum_rate(BUCKET_METRIC, f'le="{self.threshold:g}"')
+        return f"{self.requests_expr} - {fast}"
+
+    def describe(self):
+        if self.kind == 'availability':
+            return (f"{self.objective:g}% of {self.job or 'API'} requests without a server error "
+                    f"(HTTP {budget_status_regex()})")
+        target = ' '.join(filter(None, [self.job, self.method, self.route]))
+        return f"{self.objective:g}% of {target} requests within {self.threshold * 1000:g} ms"
+
+
+def load_slos(path=SLO_CONFIG):
+    """(period, [SLO]) from the config; raises ValueError on an invalid entry"""
+    config = load_yaml(path)
+    period = str(config.get('period', '30d'))
+    if promql.duration_seconds(period) < promql.duration_seconds(LONG_WINDOWS[-1]):
+        raise ValueError(f"period {period} is shorter than the {LONG_WINDOWS[-1]} alert window")
+    slos = []
+    for kind in ('availability', 'latency'):
+        for entry in config.get(kind) or []:
+            slo = SLO(name=entry['name'], kind=kind, objective=float(entry['objective']),
+                      job=entry.get('job'), route=entry.get('route'), method=entry.get('method'),
+                      threshold=entry.get('threshold'))
+            if not 0 < slo.objective < 100:
+                raise ValueError(f"{slo.name}: objective must be a percentage between 0 and 100")
+            if kind == 'latency' and (not slo.route or slo.threshold not in BUCKETS):
+                raise ValueError(f"{slo.name}: latency SLOs need a route and a threshold from the histogram "
+                                 f"buckets ({', '.join(f'{b:g}' for b in BUCKETS)})")
+            slos.append(slo)
+    names = [slo.name for slo in slos]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate SLO names: {', '.join(duplicates)}")
+    return period, slos
+
+
+def ratio_record(window):
+    return f"slo:sli_error:ratio_rate{window}"
+
+
+def _ratio_expr(window, source=SLI_WINDOW):
+    """Error ratio over `window`, averaging the slo:sli_*:rate<source> series"""
+    if window == source:
+        return f"slo:sli_errors:rate{source} / slo:sli_requests:rate{source}"
+    return (f"avg_over_time(slo:sli_errors:rate{source}[{window}]) / "
+            f"avg_over_time(slo:sli_requests:rate{source}[{window}])")
+
+
+def _normalize(expr):
+    """Canonical text of a rule expression (and a check that it parses)"""
+    return promql.format_expr(promql.parse(expr))
+
+
+def burn_factor(share, window, period):
+    """Burn rate at which `share` of the period's budget is spent within `window`"""
+    return round(share * promql.duration_seconds(period) / promql.duration_seconds(window), 4)
+
+
+def alert_rules(slo, period):
+    rules = []
+    for severity in ALERT_FOR:
+        conditions, shares = [], []
+        for sev, long_window, short_window, share in BURN_RATE_ALERTS:
+            if sev != severity:
+                continue
+            limit = f"({burn_factor(share, long_window, period):g} * {slo.budget:g})"
+            conditions.append(f'({ratio_record(long_window)}{{slo="{slo.name}"}} > {limit} and '
+                              f'{ratio_record(short_window)}{{slo="{slo.name}"}} > {limit})')
+            shares.append(f"{share:.0%} of it burns within {long_window}")
+        rules.append({
+            'alert': ALERT_NAME,
+            'expr': _normalize(' or '.join(conditions)),
+            'for': ALERT_FOR[severity],
+            'labels': {'severity': severity, 'slo': slo.name},
+            'annotations': {
+                'summary': f"{{{{ $labels.service }}}} ({{{{ $labels.environment }}}}) is burning the {slo.name} "
+                           f"error budget",
+                'description': f"SLO: {slo.describe()} over {period}, an error budget of {slo.budget:.2%} of "
+                               f"requests. Fires when {' or '.join(shares)}.",
+            },
+        })
+    return rules
+
+
+def rules_document(slos, period):
+    """Prometheus rule file structure for a set of SLOs"""
+    sli = []
+    for slo in slos:
+        labels = {'slo': slo.name}
+        sli.append({'record': 'slo:sli_requests:rate5m', 'expr': _normalize(slo.requests_expr), 'labels': labels})
+        sli.append({'record': 'slo:sli_errors:rate5m', 'expr': _normalize(slo.errors_expr), 'labels': labels})
+        sli.append({'record': 'slo:error_budget:ratio', 'expr': f"vector({slo.budget:g})", 'labels': labels})
+    sli.extend({'record': ratio_record(w), 'expr': _normalize(_ratio_expr(w))} for w in SHORT_WINDOWS)
+    hourly = [{'record': f"slo:sli_{series}:rate{HOURLY_WINDOW}",
+               'expr': _normalize(f"avg_over_time(slo:sli_{series}:rate{SLI_WINDOW}[{HOURLY_WINDOW}])")}
+              for series in ('requests', 'errors')]
+    long_windows = list(dict.fromkeys(LONG_WINDOWS + [period]))
+    return {'groups': [
+        {'name': 'bookstore-slo-sli', 'rules': sli},
+        {'name': 'bookstore-slo-hourly', 'interval': HOURLY_INTERVAL, 'rules': hourly},
+        {'name': 'bookstore-slo-long-windows', 'interval': LONG_WINDOW_INTERVAL,
+         'rules': [{'record': ratio_record(w), 'expr': _normalize(_ratio_expr(w, HOURLY_WINDOW))}
+                   for w in long_windows]},
+        {'name': 'bookstore-slo-alerts', 'rules': [rule for slo in slos for rule in alert_rules(slo, period)]},
+    ]}
+
+
+def write_slo_rules(slos, period, path=SLO_RULES_FILE):
+    write_yaml(rules_document(slos, period), path, header=RULES_HEADER)
+
+
+def slo_panels(period):
+    """Error budget left, current burn rate and burn-rate trend for every SLO (one series each)"""
+    burn_rate = f"{ratio_record('1h')} / on(slo) group_left slo:error_budget:ratio"
+    page_fast = burn_factor(BURN_RATE_ALERTS[0][3], BURN_RATE_ALERTS[0][1], period)
+    page_slow = burn_factor(BURN_RATE_ALERTS[1][3], BURN_RATE_ALERTS[1][1], period)
+    budget = stat(f"Error Budget Remaining ({period})",
+                  [Target(f"1 - ({ratio_record(period)} / on(slo) group_left slo:error_budget:ratio)", "{{slo}}")],
+                  unit="percentunit", thresholds=[Threshold("red"), Threshold("orange", 0), Threshold("green", 0.25)],
+                  description="Share of each SLO's error budget not yet spent this period (slo-targets.yml)",
+                  textMode="value_and_name", graphMode="none")
+    current = stat("Burn Rate (1h)", [Target(burn_rate, "{{slo}}")],
+                   thresholds=[Threshold("green"), Threshold("orange", page_slow), Threshold("red", page_fast)],
+                   description=f"1 = the budget lasts exactly {period}; alerts page at {page_slow:g}x over 6h "
+                               f"and {page_fast:g}x over 1h", textMode="value_and_name", graphMode="none")
+    trend = timeseries("Burn Rate (1h vs 6h)",
+                       [Target(burn_rate, "{{slo}} 1h"),
+                        Target(f"{ratio_record('6h')} / on(slo) group_left slo:error_budget:ratio", "{{slo}} 6h")],
+                       legend_calcs=["lastNotNull", "max"], legend_table=True, tooltip="multi",
+                       thresholdsStyle={"mode": "dashed"}, showPoints="never")
+    trend.thresholds = [Threshold("green"), Threshold("orange", page_slow), Threshold("red", page_fast)]
+    for panel in (budget, current, trend):
+        panel.width, panel.height = 8, 6
+    return [budget, current, trend]
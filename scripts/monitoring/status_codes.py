@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""HTTP status codes tracked on the Errors & Diagnostics dashboard.
+
+add-status-code-panels.py builds one stat panel per entry; generate-slo-rules.py
+counts requests answered with a code of a server-error class (5xx) against the
+availability error budget.
+"""
+
+STATUS_CODES = [
+    {"code": "400", "title": "400 Bad Request", "desc": "Invalid request syntax or validation errors", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "401", "title": "401 Unauthorized", "desc": "Authentication required or failed", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "404", "title": "404 Not Found", "desc": "Resource doesn't exist", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "409", "title": "409 Conflict", "desc": "Resource already exists or conflicting state", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "410", "title": "410 Gone", "desc": "Resource permanently deleted", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "422", "title": "422 Validation Error", "desc": "Validation failed", "threshold_yellow": 1, "threshold_orange": 10},
+    {"code": "500", "title": "500 Internal Server Error", "desc": "Unhandled exceptions", "threshold_orange": 1, "threshold_red": 5},
+    {"code": "503", "title": "503 Service Unavailable", "desc": "Dependencies down or overloaded", "threshold_orange": 1, "threshold_red": 5},
+]
+
+
+def is_server_error(status):
+    return status['code'].startswith('5')
+
+
+def budget_status_regex(status_codes=STATUS_CODES):
+    """Matcher value for the codes that burn error budget: every code in the class of a listed server error.
+
+    The whole class counts, so a 502 or 504 the table has no panel for still burns budget.
+    """
+    classes = sorted({status['code'][0] for status in status_codes if is_server_error(status)})
+    return '|'.join(f"{c}.." for c in classes)
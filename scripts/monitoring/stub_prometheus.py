@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Minimal Prometheus HTTP API stub for load-testing dashboards without a real TSDB.
+
+Answers /api/v1/query and /api/v1/query_range with one synthetic series.
+Response time grows with the static cost of the query (query_cost.py) and
+requests beyond `max_concurrency` queue, like Prometheus'
+--query.max-concurrency, so expensive dashboards degrade under load the same
+way they would against the real thing.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+
+from aiohttp import web
+
+import promql
+from query_cost import expression_cost
+
+DEFAULT_LATENCY = 0.005          # seconds per request before any work
+DEFAULT_LATENCY_PER_KREAD = 0.002  # seconds per 1000 sample reads per evaluation step
+DEFAULT_MAX_CONCURRENCY = 20     # Prometheus --query.max-concurrency default
+
+
+def _error(message, status=400):
+    return web.json_response({'status': 'error', 'errorType': 'bad_data', 'error': message}, status=status)
+
+
+def create_app(latency=DEFAULT_LATENCY, latency_per_kread=DEFAULT_LATENCY_PER_KREAD,
+               max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    gate = asyncio.Semaphore(max_concurrency)
+
+    async def handle(request):
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update(await request.post())
+        try:
+            cost = expression_cost(promql.parse(params['query']))
+        except (KeyError, promql.PromQLError) as e:
+            return _error(f"invalid query: {e}")
+
+        instant = request.path.endswith('/query')
+        try:
+            if instant:
+                timestamps = [float(params.get('time', 0))]
+            else:
+                start, end, step = float(params['start']), float(params['end']), float(params['step'])
+                timestamps = [start + i * step for i in range(int((end - start) // step) + 1)]
+        except (KeyError, ValueError) as e:
+            return _error(f"invalid parameters: {e}")
+
+        async with gate:
+            work = latency + latency_per_kread * cost * len(timestamps) / 1000
+            await asyncio.sleep(work * random.uniform(0.8, 1.2))
+
+        metric = {'__name__': 'stub'}
+        if instant:
+            result = {'resultType': 'vector', 'result': [{'metric': metric, 'value': [timestamps[0], '1']}]}
+        else:
+            values = [[t, str(round(1 + math.sin(t / 60), 6))] for t in timestamps]
+            result = {'resultType': 'matrix', 'result': [{'metric': metric, 'values': values}]}
+        return web.json_response({'status': 'success', 'data': result})
+
+    app = web.Application()
+    for path in ('/api/v1/query', '/api/v1/query_range'):
+        app.router.add_route('GET', path, handle)
+        app.router.add_route('POST', path, handle)
+    return app
+
+
+async def start_stub(host='127.0.0.1', port=0, **options):
+    """Start the stub in the running event loop. Returns (runner, base_url); call runner.cleanup() to stop."""
+    runner = web.AppRunner(create_app(**options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_host, bound_port = runner.addresses[0][:2]
+    return runner, f"http://{bound_host}:{bound_port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9091)
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help='Base seconds per request')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY)
+    args = parser.parse_args()
+    web.run_app(create_app(latency=args.latency, max_concurrency=args.max_concurrency), host=args.host, port=args.port)
@@ -0,0 +1,38 @@
+"""Fixture planning against the committed dashboards and rule files"""
+
+import io
+import random
+import unittest
+
+from dashboard_utils import DASHBOARDS_DIR, RULES_DIR, dashboard_files
+from metric_fixtures import Scale, plan_families, scrape_targets, write_family
+from metric_references import MetricUsage, collect_references
+from native_histograms import NATIVE_RULES_FILE
+from recording_rules import load_dashboards
+
+HISTOGRAM = 'http_server_request_duration_seconds'
+
+
+class PlanFamiliesTest(unittest.TestCase):
+    def test_bare_native_name_joins_its_classic_family(self):
+        references = {name: MetricUsage(name) for name in (HISTOGRAM, f"{HISTOGRAM}_bucket", f"{HISTOGRAM}_count")}
+        families = plan_families(references)
+        self.assertEqual(list(families), [HISTOGRAM])
+        self.assertEqual(families[HISTOGRAM].kind, 'histogram')
+
+    def test_fixtures_keep_bucket_series_with_native_rules(self):
+        self.assertTrue(NATIVE_RULES_FILE.exists())
+        references = collect_references(load_dashboards(dashboard_files(DASHBOARDS_DIR)), RULES_DIR)
+        self.assertIn(HISTOGRAM, references)
+        family = plan_families(references)[HISTOGRAM]
+        self.assertEqual(family.kind, 'histogram')
+
+        scale = Scale(hours=1 / 60, instances=1)
+        out = io.StringIO()
+        write_family(out, family, scrape_targets(scale), scale, 1_700_000_000, random.Random(0))
+        self.assertIn(f"{HISTOGRAM}_bucket{{", out.getvalue())
+        self.assertIn(f"{HISTOGRAM}_count{{", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
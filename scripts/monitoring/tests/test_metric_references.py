@@ -0,0 +1,40 @@
+"""Folding recorded series back into the metrics their rules read"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from dashboard_utils import write_yaml
+from metric_references import collect_references
+
+RULES = {'groups': [{'name': 'test', 'rules': [
+    {'record': 'slo:sli_errors:rate5m', 'expr': 'sum(rate(http_requests_total{code=~"5.."}[5m]))',
+     'labels': {'slo': 'api-availability'}},
+    {'record': 'instance:http_requests:rate1m', 'expr': 'sum(rate(http_requests_total[1m])) by (code, instance)'},
+]}]}
+
+LEGENDS = ('sum(label_replace(label_replace(instance:http_requests:rate1m, "legend", "2xx", "code", "2.."), '
+           '"legend", "5xx", "code", "5..")) by (legend)')
+
+
+def dashboard(*exprs):
+    return {'panels': [{'id': i, 'type': 'timeseries', 'targets': [{'refId': 'A', 'expr': expr}]}
+                       for i, expr in enumerate(exprs, 1)]}
+
+
+class CollectReferencesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules_dir = Path(tempfile.mkdtemp())
+        write_yaml(RULES, self.rules_dir / 'rules.yml')
+
+    def test_rule_labels_are_not_scraped_labels(self):
+        references = collect_references({'d': dashboard('sum(slo:sli_errors:rate5m) by (slo)')}, self.rules_dir)
+        self.assertNotIn('slo', references['http_requests_total'].labels)
+
+    def test_label_replace_targets_are_not_scraped_labels(self):
+        references = collect_references({'d': dashboard(LEGENDS)}, self.rules_dir)
+        self.assertNotIn('legend', references['http_requests_total'].labels)
+
+
+if __name__ == '__main__':
+    unittest.main()
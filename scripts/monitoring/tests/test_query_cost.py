@@ -0,0 +1,26 @@
+"""Query budgets per generator mode"""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from dashboard_utils import write_yaml
+from query_cost import budget_for, load_budgets
+
+
+class LoadBudgetsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(tempfile.mkdtemp()) / 'budgets.yml'
+        write_yaml({'default': 400, 'dashboards': {'a': 600, 'b': 700}, 'text-sections': {'a': 900}}, self.path)
+
+    def test_variant_overrides_only_its_dashboards(self):
+        budgets = load_budgets(self.path, variant='text-sections')
+        self.assertEqual((budget_for('a', budgets), budget_for('b', budgets), budget_for('c', budgets)),
+                         (900, 700, 400))
+
+    def test_without_variant_overrides_are_ignored(self):
+        self.assertEqual(budget_for('a', load_budgets(self.path)), 600)
+
+
+if __name__ == '__main__':
+    unittest.main()
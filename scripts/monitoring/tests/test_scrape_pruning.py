@@ -0,0 +1,55 @@
+"""Keep rules spliced into a hand-written prometheus.yml"""
+
+import unittest
+
+import yaml
+
+from scrape_pruning import KEEP_RULE_MARKER, splice_keep_rules
+
+CONFIG = '''global:
+    scrape_interval: 15s
+
+scrape_configs:
+    # The API itself
+    - job_name: "api"
+      static_configs:
+          - targets: ["host:7002"]
+
+    - job_name: "proxy"
+      static_configs:
+          - targets: ["host:9092"]
+      metric_relabel_configs:
+          - source_labels: ["__name__"]
+            regex: "go_.*"
+            action: "drop"
+'''
+
+
+def keep_rules(text):
+    return {job['job_name']: [r for r in job.get('metric_relabel_configs', []) if r['action'] == 'keep']
+            for job in yaml.safe_load(text)['scrape_configs']}
+
+
+class SpliceKeepRulesTest(unittest.TestCase):
+    def test_adds_rules_without_touching_the_rest(self):
+        text = splice_keep_rules(CONFIG, {'api': 'a|b', 'proxy': 'c'})
+        self.assertEqual(keep_rules(text), {
+            'api': [{'source_labels': ['__name__'], 'regex': 'a|b', 'action': 'keep'}],
+            'proxy': [{'source_labels': ['__name__'], 'regex': 'c', 'action': 'keep'}],
+        })
+        self.assertEqual(yaml.safe_load(text)['scrape_configs'][1]['metric_relabel_configs'][0]['action'], 'drop')
+        # Every original line survives in order, comments included
+        lines = iter(text.split('\n'))
+        self.assertTrue(all(line in lines for line in CONFIG.split('\n')))
+        self.assertEqual(text.count(KEEP_RULE_MARKER), 2)
+
+    def test_replaces_its_own_rule_in_place(self):
+        first = splice_keep_rules(CONFIG, {'api': 'a', 'proxy': 'c'})
+        second = splice_keep_rules(first, {'api': 'a|b', 'proxy': 'c'})
+        self.assertEqual(keep_rules(second)['api'][0]['regex'], 'a|b')
+        self.assertEqual(second.count(KEEP_RULE_MARKER), 2)
+        self.assertEqual(splice_keep_rules(second, {'api': 'a|b', 'proxy': 'c'}), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+"""SLO rule windows and what they read"""
+
+import unittest
+
+import promql
+from slo_rules import HOURLY_INTERVAL, HOURLY_WINDOW, SLI_WINDOW, load_slos, rules_document
+
+
+class RulesDocumentTest(unittest.TestCase):
+    def setUp(self):
+        period, slos = load_slos()
+        self.groups = {group['name']: group for group in rules_document(slos, period)['groups']}
+
+    def test_long_windows_read_hourly_rates(self):
+        for rule in self.groups['bookstore-slo-long-windows']['rules']:
+            names = promql.metric_names(promql.parse(rule['expr']))
+            self.assertEqual(set(names), {f"slo:sli_errors:rate{HOURLY_WINDOW}", f"slo:sli_requests:rate{HOURLY_WINDOW}"})
+
+    def test_hourly_rates_are_recorded_coarsely(self):
+        hourly = self.groups['bookstore-slo-hourly']
+        self.assertEqual(hourly['interval'], HOURLY_INTERVAL)
+        for rule in hourly['rules']:
+            self.assertIn(f"rate{SLI_WINDOW}[{HOURLY_WINDOW}]", rule['expr'])
+
+
+if __name__ == '__main__':
+    unittest.main()